@@ -0,0 +1,127 @@
+import os
+import errno
+import fcntl
+import uuid
+from shutil import copyfileobj, copystat
+from concurrent.futures import ThreadPoolExecutor
+from tqdm import tqdm
+
+# Linux ioctl cloning a file's extents (btrfs, xfs, ...)
+FICLONE = 0x40049409
+# Errors of a link/reflink that a plain copy or rename avoids: other device, no support on the filesystem, link limit
+FALLBACK_ERRNOS = (errno.EXDEV, errno.EPERM, errno.EOPNOTSUPP, errno.ENOTTY, errno.EINVAL, errno.EMLINK)
+
+
+def scan_images(directory, extensions, recursive=False):
+    """
+    Names in directory containing one of extensions, listed in a single pass in os.listdir order so that seeded
+    shuffles are unchanged. With recursive set, images one level down are returned as 'sub/name'.
+    """
+    images = []
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if recursive and entry.is_dir():
+                images.extend(entry.name + "/" + f for f in scan_images(entry.path, extensions))
+            elif any(ext in entry.name for ext in extensions):
+                images.append(entry.name)
+    return images
+
+
+def reflink(src, dst):
+    with open(src, 'rb') as fsrc, open(dst, 'xb') as fdst:
+        try:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+        except OSError:
+            os.remove(dst)
+            raise
+
+
+def copy_file(src, dst):
+    """copy2 that raises FileExistsError instead of overwriting dst."""
+    with open(src, 'rb') as fsrc, open(dst, 'xb') as fdst:
+        copyfileobj(fsrc, fdst)
+    copystat(src, dst)
+
+
+def same_file(src, dst):
+    """Whether dst already holds src: the same inode (a link) or a file of the same size (a finished copy)."""
+    try:
+        st_src, st_dst = os.stat(src), os.stat(dst)
+    except FileNotFoundError:
+        return False
+    return os.path.samestat(st_src, st_dst) or st_src.st_size == st_dst.st_size
+
+
+def materialize(src, dst, mode):
+    """Creates dst from src with mode, falling back to a copy across devices or without hard links/reflinks."""
+    try:
+        if mode == 'hardlink':
+            os.link(src, dst)
+        elif mode == 'reflink':
+            reflink(src, dst)
+        elif mode == 'symlink':
+            os.symlink(os.path.abspath(src), dst)
+        else:
+            copy_file(src, dst)
+    except OSError as e:
+        if isinstance(e, FileExistsError) or e.errno not in FALLBACK_ERRNOS:
+            raise
+        copy_file(src, dst)
+
+
+def publish(tmp, dst, replace):
+    """
+    Gives the finished file tmp the name dst, so that dst is either complete or absent. A dst created meanwhile by
+    another thread is kept unless replace is set.
+    """
+    if replace:
+        os.replace(tmp, dst)
+        return
+    try:
+        os.link(tmp, dst, follow_symlinks=False)
+    except FileExistsError:
+        pass
+    except OSError as e:
+        if e.errno not in FALLBACK_ERRNOS:
+            raise
+        os.replace(tmp, dst)
+
+
+def link_file(src, dst_dir, mode='hardlink'):
+    """
+    Materializes src in dst_dir without duplicating the data when the filesystem allows it.
+    The file is built under a temporary name and then published, so an interrupted run never leaves a partial dst.
+    An existing dst is kept if it is src or has its size, otherwise it is replaced.
+    """
+    dst = os.path.join(dst_dir, os.path.basename(src))
+    if same_file(src, dst):
+        return dst
+    tmp = os.path.join(dst_dir, '.%s.tmp' % uuid.uuid4().hex)
+    try:
+        materialize(src, tmp, mode)
+        publish(tmp, dst, replace=os.path.lexists(dst))
+    finally:
+        if os.path.lexists(tmp):
+            os.unlink(tmp)
+    return dst
+
+
+def link_files(pairs, mode='hardlink', workers=16):
+    """Runs link_file over (src, dst_dir) pairs on a thread pool; the work is syscall-bound."""
+    for dst_dir in set(dst_dir for _, dst_dir in pairs):
+        os.makedirs(dst_dir, exist_ok=True)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(tqdm(pool.map(lambda pair: link_file(pair[0], pair[1], mode), pairs), total=len(pairs)))
+
+
+def write_csv(path, lines):
+    """Writes the CSV lines (each ending with a newline) in one call."""
+    with open(path, "w+") as csv_file:
+        csv_file.write("".join(lines))
+
+
+def add_link_args(parser):
+    parser.add_argument('--link', default='hardlink', choices=['hardlink', 'reflink', 'symlink', 'copy'],
+                        help='how images are materialized in the train/val folders')
+    parser.add_argument('--workers', default=16, type=int, help='threads for the file operations')
+    return parser
@@ -1,39 +1,22 @@
-import os
 import numpy as np
 import pandas as pd
 import random
 from tqdm import tqdm
 import argparse
-import cv2
+from dataset_utils import scan_images, write_csv
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.JPG')
 
 
 def main(csv_dest,base_images,middle_path,name,test_type):
 
-    csv_file = open(csv_dest + name + ".csv","w+")
-   
     mode = "test"
     print("Creating test set...")
-    test_images = []
-    for samp in os.listdir(base_images + middle_path + name):
-        
-        if os.path.isdir(base_images + middle_path + name + "/" + samp):
-            print(samp)
-            for subsamp in os.listdir(base_images + middle_path + name + "/" + samp):
-                if ".png" not in subsamp and ".jpg" not in subsamp and ".JPG" not in subsamp:
-                    print(subsamp)
-                    continue
-                line = mode + "," + test_type + ",/" + middle_path + name + "/" + samp + "/" + subsamp + "\n"
-                test_images.append(line)
-        else:
-
-            if ".png" not in samp and ".jpg" not in samp and ".JPG" not in samp:
-                continue
-            line = mode + "," + test_type + ",/" + middle_path + name + "/" + samp + "\n"
-            test_images.append(line)
-    
+    # Images directly in the folder and one level down, listed in a single pass
+    test_images = [mode + "," + test_type + ",/" + middle_path + name + "/" + image + "\n"
+                   for image in scan_images(base_images + middle_path + name, IMAGE_EXTENSIONS, recursive=True)]
 
-    for test_image in test_images:
-        csv_file.write(test_image)
+    write_csv(csv_dest + name + ".csv", test_images)
 
 
 if __name__ == "__main__":
@@ -1,14 +1,14 @@
-import os
 import numpy as np
 import pandas as pd
 import random
 from tqdm import tqdm
 import argparse
-import cv2
-from shutil import copy2
+from dataset_utils import scan_images, link_files, write_csv, add_link_args
 
+IMAGE_EXTENSIONS = ('.png', '.jpg')
 
-def main(csv_dest,base_images):
+
+def main(csv_dest,base_images,link='hardlink',workers=16):
 
     # print("Loading original images...")
     # train_images = []
@@ -24,61 +24,46 @@ def main(csv_dest,base_images):
     # csv_file = open(csv_dest + "human_aided.csv","w+")
     # blur_levels = [2,4,6,8,10,12,14,16]
 
-    csv_file = open(csv_dest + "no_blur.csv","w+")
+    csv_lines = []
+    links = []
     blur_levels = [0,2,4,6,8,10,12,14,16]
 
+    # Every blur level holds the same file names, so base_images is listed once
+    base_files = scan_images(base_images, IMAGE_EXTENSIONS)
     for b in blur_levels:
         if b == 0:
             img_source = "Original"
         else:
             img_source = str(b)
         # img_source = "unblurred"
-        for f in os.listdir(base_images):
-
-            if ".png" not in f and ".jpg" not in f:
-                continue
+        for f in base_files:
 
             if 'real' in f:
                 if b == 0:
-                    copy2(data_path + img_source + "/" + f,train_real_loc)
+                    links.append((data_path + img_source + "/" + f,train_real_loc))
                 spoof = "Real"
             else:
                 if b == 0:
-                    copy2(data_path + img_source + "/" + f,train_fake_loc)
+                    links.append((data_path + img_source + "/" + f,train_fake_loc))
                 spoof = "Synthetic"
 
-            csv_file.write(mode + "," + spoof + ",/" + img_source + "/" + f + "\n")
+            csv_lines.append(mode + "," + spoof + ",/" + img_source + "/" + f + "\n")
         
         
     mode = "test"
     print("Creating validation set...")
 
     print("Collecting SREFI images...")
-    srefi_images = []
     img_source = "SREFI"
-    for srefi in os.listdir(data_path + img_source):
-        if ".png" not in srefi and ".jpg" not in srefi:
-            continue
-        line = mode + ",Synthetic,/" + img_source + "/" + srefi + "\n"
-        srefi_images.append(line)
+    srefi_images = [mode + ",Synthetic,/" + img_source + "/" + srefi + "\n" for srefi in scan_images(data_path + img_source, IMAGE_EXTENSIONS)]
     
     print("Collecting StyleGAN images...")
-    sg2_images = []
     img_source = "SG2"
-    for sg2 in os.listdir(data_path + img_source):
-        if ".png" not in sg2 and ".jpg" not in sg2:
-            continue
-        line = mode + ",Synthetic,/" + img_source + "/" + sg2 + "\n"
-        sg2_images.append(line)
+    sg2_images = [mode + ",Synthetic,/" + img_source + "/" + sg2 + "\n" for sg2 in scan_images(data_path + img_source, IMAGE_EXTENSIONS)]
         
     print("Collecting BXGrid images...")
-    real_images = []
     img_source = "ND-Real"
-    for real in os.listdir(data_path + img_source):
-        if ".png" not in real and ".jpg" not in real:
-            continue
-        line = mode + ",Real,/" + img_source + "/" + real + "\n"
-        real_images.append(line)
+    real_images = [mode + ",Real,/" + img_source + "/" + real + "\n" for real in scan_images(data_path + img_source, IMAGE_EXTENSIONS)]
     
     random.seed(42)
     random.shuffle(srefi_images)
@@ -90,18 +75,20 @@ def main(csv_dest,base_images):
     srefi_shrunk = srefi_images[:5000]
     sg2_shrunk = sg2_images[:5000]
 
-    for real in real_shrunk:
-        csv_file.write(real)
-        copy2(data_path + "/ND-Real/" + real.split("/")[-1].replace("\n",""),val_real_loc)
-    for spoof in srefi_shrunk:  
-        csv_file.write(spoof)
-        copy2(data_path + "/SREFI/" + spoof.split("/")[-1].replace("\n",""),val_fake_loc)
-    for spoof in sg2_shrunk:  
-        csv_file.write(spoof)
-        copy2(data_path + "/SG2/" + spoof.split("/")[-1].replace("\n",""),val_fake_loc)
+    csv_lines += real_shrunk + srefi_shrunk + sg2_shrunk
+    links += [(data_path + "/ND-Real/" + real.split("/")[-1].replace("\n",""),val_real_loc) for real in real_shrunk]
+    links += [(data_path + "/SREFI/" + spoof.split("/")[-1].replace("\n",""),val_fake_loc) for spoof in srefi_shrunk]
+    links += [(data_path + "/SG2/" + spoof.split("/")[-1].replace("\n",""),val_fake_loc) for spoof in sg2_shrunk]
+
+    write_csv(csv_dest + "no_blur.csv", csv_lines)
+    print("Linking", len(links), "images...")
+    link_files(links, link, workers)
 
 if __name__ == "__main__":
 
+    parser = add_link_args(argparse.ArgumentParser())
+    args = parser.parse_args()
+
     base_images = "/scratch365/aboyd3/DataSynFace/BlurredImages/aligned/10/"
     csv_dest = "/scratch365/aboyd3/SynFace/csvs/"
 
@@ -115,4 +102,4 @@ if __name__ == "__main__":
     # loo_attacks = ['artificial','contacts','contacts+print','disease','postmortem','print','synthetic']
     
     # for attack in loo_attacks:
-    main(csv_dest,base_images)
\ No newline at end of file
+    main(csv_dest,base_images,args.link,args.workers)
\ No newline at end of file
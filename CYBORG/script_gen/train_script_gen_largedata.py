@@ -1,12 +1,10 @@
-import os
 import numpy as np
 import pandas as pd
 import random
-from tqdm import tqdm
 import argparse
-import cv2
-from shutil import copy2
-from tqdm import tqdm
+from dataset_utils import scan_images, link_files, add_link_args
+
+IMAGE_EXTENSIONS = ('.png', '.jpg')
 
 
 def image_in_list(image,array):
@@ -17,7 +15,7 @@ def image_in_list(image,array):
     return False
 
 
-def main(csv_dest):
+def main(csv_dest,link='hardlink',workers=16):
 
     multiplier = 6
     # csv_file = open(csv_dest + "large_dataset_" + str(multiplier) + "x.csv","w+")
@@ -25,57 +23,35 @@ def main(csv_dest):
     num_real = 0
     num_spoof = 0
     img_source = "Original"
-    used_images_real = []
-    used_images_spoof = []
-    for f in os.listdir("/scratch365/aboyd3/DataSynFace/BlurredImages/aligned/10/"):
-
-        if ".png" not in f and ".jpg" not in f:
-            continue
+    links = []
+    for f in scan_images("/scratch365/aboyd3/DataSynFace/BlurredImages/aligned/10/", IMAGE_EXTENSIONS):
 
         if 'real' in f:
             # if b == 0:
-            copy2("/scratch365/aboyd3/DataSynFace/BlurredImages/aligned/" + img_source + "/" + f,train_real_loc)
-            spoof = "Real"
+            links.append(("/scratch365/aboyd3/DataSynFace/BlurredImages/aligned/" + img_source + "/" + f,train_real_loc))
             num_real += 1
-            used_images_real.append(cv2.imread("/scratch365/aboyd3/DataSynFace/BlurredImages/aligned/Original/" + f,cv2.IMREAD_GRAYSCALE))
         else:
             # if b == 0:
-            copy2("/scratch365/aboyd3/DataSynFace/BlurredImages/aligned/" + img_source + "/" + f,train_fake_loc)
-            spoof = "Synthetic"
+            links.append(("/scratch365/aboyd3/DataSynFace/BlurredImages/aligned/" + img_source + "/" + f,train_fake_loc))
             num_spoof += 1
-            used_images_spoof.append(cv2.imread("/scratch365/aboyd3/DataSynFace/BlurredImages/aligned/Original/" + f,cv2.IMREAD_GRAYSCALE))
 
         # csv_file.write(mode + "," + spoof + ",/" + img_source + "/" + f + "\n")
         
     mode = "test"
     print("Creating validation set...")
 
-    print("Collecting SREFI images...")
-    srefi_images = []
+    # Each source directory is listed once and reused for the validation and the large training subsets
+    print("Listing SREFI, StyleGAN and BXGrid images...")
+    srefi_files = scan_images(data_path + "SREFI", IMAGE_EXTENSIONS)
+    sg2_files = scan_images(data_path + "SG2", IMAGE_EXTENSIONS)
+    real_files = scan_images(data_path + "ND-Real", IMAGE_EXTENSIONS)
+
     img_source = "SREFI"
-    for srefi in os.listdir(data_path + img_source):
-        if ".png" not in srefi and ".jpg" not in srefi:
-            continue
-        line = mode + ",Synthetic,/" + img_source + "/" + srefi + "\n"
-        srefi_images.append(line)
-    
-    print("Collecting StyleGAN images...")
-    sg2_images = []
+    srefi_images = [mode + ",Synthetic,/" + img_source + "/" + srefi + "\n" for srefi in srefi_files]
     img_source = "SG2"
-    for sg2 in os.listdir(data_path + img_source):
-        if ".png" not in sg2 and ".jpg" not in sg2:
-            continue
-        line = mode + ",Synthetic,/" + img_source + "/" + sg2 + "\n"
-        sg2_images.append(line)
-        
-    print("Collecting BXGrid images...")
-    real_images = []
+    sg2_images = [mode + ",Synthetic,/" + img_source + "/" + sg2 + "\n" for sg2 in sg2_files]
     img_source = "ND-Real"
-    for real in os.listdir(data_path + img_source):
-        if ".png" not in real and ".jpg" not in real:
-            continue
-        line = mode + ",Real,/" + img_source + "/" + real + "\n"
-        real_images.append(line)
+    real_images = [mode + ",Real,/" + img_source + "/" + real + "\n" for real in real_files]
     
     random.seed(42)
     random.shuffle(srefi_images)
@@ -88,48 +64,24 @@ def main(csv_dest):
     sg2_shrunk = sg2_images[:5000]
 
     print("Collecting large set of StyleGAN images...")
-    sg2_50k_images = []
     img_source = "SG2_extended"
-    for sg2 in tqdm(os.listdir(data_path + img_source)):
-        if "._" in sg2:
-            continue
-        if ".png" not in sg2 and ".jpg" not in sg2:
-            continue
-        
-        # image = cv2.imread(data_path + img_source + "/" + sg2,cv2.IMREAD_GRAYSCALE)
-        # if image_in_list(image,used_images_spoof):
-        #     continue
-        line = mode + ",Synthetic,/" + img_source + "/" + sg2 + "\n"
-        if line not in sg2_shrunk:
-            sg2_50k_images.append(line)
+    sg2_shrunk_set = set(sg2_shrunk)
+    # The large subsets skip macOS '._' files, unlike the validation subsets above
+    sg2_50k_images = [line for line in (mode + ",Synthetic,/" + img_source + "/" + sg2 + "\n" for sg2 in scan_images(data_path + img_source, IMAGE_EXTENSIONS)
+                                        if "._" not in sg2)
+                      if line not in sg2_shrunk_set]
 
     print("Collecting SREFI images...")
-    srefi_50k_images = []
     img_source = "SREFI"
-    for srefi in tqdm(os.listdir(data_path + img_source)):
-        if "._" in srefi:
-            continue
-        if ".png" not in srefi and ".jpg" not in srefi:
-            continue
-        # image = cv2.imread(data_path + img_source + "/" + srefi,cv2.IMREAD_GRAYSCALE)
-        # if image_in_list(image,used_images_spoof):
-        #     continue
-        line = mode + ",Synthetic,/" + img_source + "/" + srefi + "\n"
-        if line not in srefi_shrunk:
-            srefi_50k_images.append(line)
+    srefi_shrunk_set = set(srefi_shrunk)
+    srefi_50k_images = [line for line in (mode + ",Synthetic,/" + img_source + "/" + srefi + "\n" for srefi in srefi_files if "._" not in srefi)
+                        if line not in srefi_shrunk_set]
 
     print("Collecting BXGrid images...")
-    real_images_large = []
     img_source = "ND-Real"
-    for real in tqdm(os.listdir(data_path + img_source)):
-        if ".png" not in real and ".jpg" not in real:
-            continue
-        # image = cv2.imread(data_path + img_source + "/" + real,cv2.IMREAD_GRAYSCALE)
-        # if image_in_list(image,used_images_real):
-        #     continue
-        line = mode + ",Real,/" + img_source + "/" + real + "\n"
-        if line not in real_shrunk:
-            real_images_large.append(line)
+    real_shrunk_set = set(real_shrunk)
+    real_images_large = [line for line in (mode + ",Real,/" + img_source + "/" + real + "\n" for real in real_files)
+                         if line not in real_shrunk_set]
     
     print(len(real_images_large))
     random.seed(42)
@@ -144,29 +96,22 @@ def main(csv_dest):
     srefi_50k_shrunk = srefi_50k_images[:int(((multiplier-1)/2)*num_spoof)]
     sg2_50k_shrunk = sg2_50k_images[:int(((multiplier-1)/2)*num_spoof)]
 
-    for real in celeba_shrunk:
-        # csv_file.write(real.replace("test","train"))
-        # copy2(data_path + "/celeba-hq/" + real.split("/")[-1].replace("\n",""),train_real_loc)
-        copy2(data_path + "/ND-Real/" + real.split("/")[-1].replace("\n",""),train_real_loc)
-    for spoof in srefi_50k_shrunk:  
-        # csv_file.write(spoof.replace("test","train"))
-        copy2(data_path + "/SREFI/" + spoof.split("/")[-1].replace("\n",""),train_fake_loc)
-    for spoof in sg2_50k_shrunk:  
-        # csv_file.write(spoof.replace("test","train"))
-        copy2(data_path + "/SG2_extended/" + spoof.split("/")[-1].replace("\n",""),train_fake_loc)
-
-    for real in real_shrunk:
-        # csv_file.write(real)
-        copy2(data_path + "/ND-Real/" + real.split("/")[-1].replace("\n",""),val_real_loc)
-    for spoof in srefi_shrunk:  
-        # csv_file.write(spoof)
-        copy2(data_path + "/SREFI/" + spoof.split("/")[-1].replace("\n",""),val_fake_loc)
-    for spoof in sg2_shrunk:  
-        # csv_file.write(spoof)
-        copy2(data_path + "/SG2/" + spoof.split("/")[-1].replace("\n",""),val_fake_loc)
+    links += [(data_path + "/ND-Real/" + real.split("/")[-1].replace("\n",""),train_real_loc) for real in celeba_shrunk]
+    links += [(data_path + "/SREFI/" + spoof.split("/")[-1].replace("\n",""),train_fake_loc) for spoof in srefi_50k_shrunk]
+    links += [(data_path + "/SG2_extended/" + spoof.split("/")[-1].replace("\n",""),train_fake_loc) for spoof in sg2_50k_shrunk]
+
+    links += [(data_path + "/ND-Real/" + real.split("/")[-1].replace("\n",""),val_real_loc) for real in real_shrunk]
+    links += [(data_path + "/SREFI/" + spoof.split("/")[-1].replace("\n",""),val_fake_loc) for spoof in srefi_shrunk]
+    links += [(data_path + "/SG2/" + spoof.split("/")[-1].replace("\n",""),val_fake_loc) for spoof in sg2_shrunk]
+
+    print("Linking", len(links), "images...")
+    link_files(links, link, workers)
 
 if __name__ == "__main__":
 
+    parser = add_link_args(argparse.ArgumentParser())
+    args = parser.parse_args()
+
     csv_dest = "/scratch365/aboyd3/SynFace/csvs/"
 
     data_path = "/scratch365/aboyd3/DataSynFace/BlurredImages/aligned/"
@@ -179,4 +124,4 @@ if __name__ == "__main__":
     # loo_attacks = ['artificial','contacts','contacts+print','disease','postmortem','print','synthetic']
     
     # for attack in loo_attacks:
-    main(csv_dest)
\ No newline at end of file
+    main(csv_dest,args.link,args.workers)
\ No newline at end of file
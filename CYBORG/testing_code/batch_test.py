@@ -0,0 +1,105 @@
+import os
+import csv
+import glob
+import argparse
+import torch
+import torch.nn as nn
+import torch.utils.data as data_utl
+from PIL import Image
+from tqdm import tqdm
+
+from detector import build_model, get_transform
+
+
+class imageList(data_utl.Dataset):
+    """Images decoded and pre-processed inside the DataLoader workers."""
+
+    def __init__(self, imageFiles, transform):
+        self.imageFiles = imageFiles
+        self.transform = transform
+
+    def __getitem__(self, index):
+        imgFile = self.imageFiles[index]
+        image = Image.open(imgFile).convert('RGB')
+        tranformImage = self.transform(image)
+        image.close()
+        return tranformImage[0:3,:,:], imgFile
+
+    def __len__(self):
+        return len(self.imageFiles)
+
+
+def read_image_list(args):
+    """Test entries of the CSV, or every image of imageFolder if no CSV is given."""
+    if not args.csv:
+        return sorted(glob.glob(os.path.join(args.imageFolder, '*.png')) + glob.glob(os.path.join(args.imageFolder, '*.jpg')))
+    imageFiles = []
+    with open(args.csv, 'r') as imageCSV:
+        for entry in imageCSV:
+            tokens = entry.strip().split(",")
+            if tokens[0] != 'test':
+                continue
+            imageFiles.append(args.imageFolder + tokens[-1])
+    return imageFiles
+
+
+def read_scored(output_scores):
+    """Images already scored in a previous (possibly interrupted) run. Drops a trailing partial line."""
+    if not os.path.exists(output_scores):
+        return set()
+    with open(output_scores, 'r', newline='') as fin:
+        content = fin.read()
+    if content and not content.endswith('\n'):
+        content = content[:content.rfind('\n') + 1]
+        with open(output_scores, 'w', newline='') as fout:
+            fout.write(content)
+    rows = list(csv.reader(content.splitlines()))
+    return set(row[0] for row in rows[1:] if len(row) == 2)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-imageFolder', default='../Data/',type=str)
+    parser.add_argument('-modelPath',  default='../local_results/final_model.pth',type=str)
+    parser.add_argument('-csv',  default="../csvs/test.csv",type=str, help='empty to score every image in imageFolder')
+    parser.add_argument('-output_scores',  default='../local_results/output_scores.csv',type=str)
+    parser.add_argument('-network',  default="densenet",type=str)
+    parser.add_argument('-batchSize', default=64, type=int)
+    parser.add_argument('-numWorkers', default=4, type=int)
+    parser.add_argument('-numThreads', default=0, type=int, help='intra-op CPU threads, 0 keeps the torch default')
+    parser.add_argument('-device', default='cuda' if torch.cuda.is_available() else 'cpu', type=str)
+    args = parser.parse_args()
+
+    device = torch.device(args.device)
+    if args.numThreads > 0:
+        torch.set_num_threads(args.numThreads)
+
+    output_dir = os.path.dirname(args.output_scores)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+
+    model = build_model(args.network, args.modelPath, device)
+    sigmoid = nn.Sigmoid()
+
+    # Resume from a partial output file
+    scored = read_scored(args.output_scores)
+    imageFiles = [f for f in read_image_list(args) if f not in scored]
+    print("Already scored:", len(scored), "remaining:", len(imageFiles))
+
+    dataset = imageList(imageFiles, get_transform(args.network))
+    loader = data_utl.DataLoader(dataset, batch_size=args.batchSize, shuffle=False, num_workers=args.numWorkers,
+                                 pin_memory=(device.type == 'cuda'))
+
+    # Scores are streamed to the CSV batch by batch
+    write_header = not os.path.exists(args.output_scores) or os.path.getsize(args.output_scores) == 0
+    with open(args.output_scores, 'a', newline='') as fout:
+        writer = csv.writer(fout)
+        if write_header:
+            writer.writerow(['filename', 'score'])
+        for images, imgFiles in tqdm(loader):
+            images = images.to(device, non_blocking=True)
+            with torch.inference_mode():
+                output = model(images)
+            PAScore = sigmoid(output)[:, 1].cpu().numpy()
+            writer.writerows([imgFile, float(score)] for imgFile, score in zip(imgFiles, PAScore))
+            fout.flush()
@@ -0,0 +1,64 @@
+import os
+import sys
+import torch
+import torch.nn as nn
+import torchvision.models as models
+import torchvision.transforms as transforms
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# Input resolution of each detector architecture
+IMAGE_SIZES = {'resnet': 224, 'inception': 299, 'xception': 299, 'densenet': 224}
+
+
+def build_model(network, modelPath=None, device='cpu', strict=True):
+    """
+    Detector architecture with its trained weights, in eval mode on device.
+    Accepts both training checkpoints ({'state_dict': ...}) and bare state dicts.
+    """
+    if network == "resnet":
+        model = models.resnet50(pretrained=False)
+        num_ftrs = model.fc.in_features
+        model.fc = nn.Linear(num_ftrs, 2)
+    elif network == "inception":
+        model = models.inception_v3(pretrained=False, aux_logits=False, init_weights=False)
+        num_ftrs = model.fc.in_features
+        model.fc = nn.Linear(num_ftrs, 2)
+    elif network == "xception":
+        # Imported here so the torchvision detectors do not depend on the xception weights setup
+        from xception.network.models import model_selection
+        model, *_ = model_selection(modelname='xception', num_out_classes=2)
+    else: # else DenseNet
+        model = models.densenet121(pretrained=False)
+        num_ftrs = model.classifier.in_features
+        model.classifier = nn.Linear(num_ftrs, 2)
+
+    if modelPath:
+        weights = torch.load(modelPath, map_location='cpu')
+        if 'state_dict' in weights:
+            weights = weights['state_dict']
+        model.load_state_dict(weights, strict=strict)
+
+    model = model.to(device)
+    model.eval()
+    return model
+
+
+def image_size(network):
+    return IMAGE_SIZES.get(network, 224)
+
+
+def get_transform(network):
+    """Pre-processing used in training for the given network."""
+    im_size = image_size(network)
+    if network == "xception":
+        return transforms.Compose([
+                    transforms.Resize([im_size, im_size]),
+                    transforms.ToTensor(),
+                    transforms.Normalize([0.5]*3, [0.5]*3)
+                ])
+    return transforms.Compose([
+                transforms.Resize([im_size, im_size]),
+                transforms.ToTensor(),
+                transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
+            ])
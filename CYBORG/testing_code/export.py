@@ -0,0 +1,179 @@
+import os
+import time
+import argparse
+import copy
+import torch
+import torch.nn as nn
+import torch.utils.data as data_utl
+
+from detector import build_model, get_transform, image_size
+from batch_test import imageList
+
+# Class assignment used in training
+CLASS_ASSGN = {'Real': 0, 'Synthetic': 1}
+
+
+def read_labeled_list(csvPath, imageFolder, split, limit=0):
+    """
+    (imageFile, label) pairs of a CSV split. With limit set, the entries are taken with a fixed
+    stride so that the subset covers every class of a CSV sorted by class.
+    """
+    entries = []
+    with open(csvPath, 'r') as imageCSV:
+        for entry in imageCSV:
+            tokens = entry.strip().split(",")
+            if tokens[0] != split or tokens[1] not in CLASS_ASSGN:
+                continue
+            entries.append((imageFolder + tokens[-1], CLASS_ASSGN[tokens[1]]))
+    if limit and len(entries) > limit:
+        stride = len(entries) / limit
+        entries = [entries[int(i * stride)] for i in range(limit)]
+    return entries
+
+
+def make_loader(entries, network, batchSize, numWorkers):
+    dataset = imageList([imageFile for imageFile, _ in entries], get_transform(network))
+    return data_utl.DataLoader(dataset, batch_size=batchSize, shuffle=False, num_workers=numWorkers)
+
+
+def set_quantized_engine():
+    """fbgemm on x86, qnnpack on ARM."""
+    engines = torch.backends.quantized.supported_engines
+    torch.backends.quantized.engine = 'fbgemm' if 'fbgemm' in engines else 'qnnpack'
+    return torch.backends.quantized.engine
+
+
+def quantize_dynamic(model):
+    """int8 weights for the linear heads, activations quantized on the fly. No calibration needed."""
+    set_quantized_engine()
+    return torch.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+
+
+def quantize_static(model, calib_loader, example):
+    """
+    Post-training static int8 quantization (FX graph mode) of the whole network,
+    with activation ranges observed on calib_loader.
+    """
+    from torch.ao.quantization import get_default_qconfig
+    from torch.ao.quantization.quantize_fx import prepare_fx, convert_fx
+
+    engine = set_quantized_engine()
+    try:
+        from torch.ao.quantization import get_default_qconfig_mapping
+        qconfig = get_default_qconfig_mapping(engine)
+    except ImportError:
+        qconfig = {'': get_default_qconfig(engine)}
+
+    prepared = prepare_fx(copy.deepcopy(model).eval(), qconfig, (example,))
+    with torch.inference_mode():
+        for images, _ in calib_loader:
+            prepared(images)
+    return convert_fx(prepared)
+
+
+def export_torchscript(model, example, path):
+    with torch.no_grad():
+        scripted = torch.jit.freeze(torch.jit.trace(model, example))
+    torch.jit.save(scripted, path)
+
+
+def export_onnx(model, example, path):
+    torch.onnx.export(model, example, path, input_names=['input'], output_names=['logits'],
+                      dynamic_axes={'input': {0: 'batch'}, 'logits': {0: 'batch'}}, opset_version=13)
+
+
+def load_exported(path, exportFormat):
+    """Callable taking a float batch and returning logits, for either export format."""
+    if exportFormat == 'onnx':
+        import onnxruntime
+        session = onnxruntime.InferenceSession(path, providers=['CPUExecutionProvider'])
+        return lambda images: torch.from_numpy(session.run(None, {'input': images.numpy()})[0])
+    return torch.jit.load(path, map_location='cpu')
+
+
+def evaluate(model, loader, labels):
+    """Accuracy, P(Synthetic) scores and the throughput in images/s."""
+    sigmoid = nn.Sigmoid()
+    scores = []
+    elapsed = 0
+    with torch.inference_mode():
+        for images, _ in loader:
+            start_time = time.perf_counter()
+            output = model(images)
+            elapsed += time.perf_counter() - start_time
+            scores.append(sigmoid(output)[:, 1])
+    scores = torch.cat(scores)
+    accuracy = ((scores > 0.5).long() == labels).float().mean().item()
+    return accuracy, scores, len(labels) / elapsed
+
+
+def latency(model, example, iters):
+    """Average wall time of one forward pass in ms, after warm-up."""
+    with torch.inference_mode():
+        for i in range(3):
+            model(example)
+        start_time = time.perf_counter()
+        for i in range(iters):
+            model(example)
+    return 1000 * (time.perf_counter() - start_time) / iters
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-imageFolder', default='../Data/',type=str)
+    parser.add_argument('-modelPath',  default='../local_results/final_model.pth',type=str)
+    parser.add_argument('-csv',  default="../csvs/original.csv",type=str)
+    parser.add_argument('-network',  default="densenet",type=str)
+    parser.add_argument('-format', default='torchscript', choices=['torchscript', 'onnx'], type=str)
+    parser.add_argument('-quantize', default='none', choices=['none', 'dynamic', 'static'], type=str)
+    parser.add_argument('-output', default='', type=str, help='defaults to the model path with the format suffix')
+    parser.add_argument('-calibSamples', default=256, type=int, help='train entries of the CSV used for static calibration')
+    parser.add_argument('-evalSamples', default=512, type=int, help='test entries of the CSV used for the benchmark, 0 for all')
+    parser.add_argument('-batchSize', default=32, type=int)
+    parser.add_argument('-numWorkers', default=4, type=int)
+    parser.add_argument('-numThreads', default=0, type=int, help='intra-op CPU threads, 0 keeps the torch default')
+    parser.add_argument('-benchmark', action='store_true', help='compare accuracy, latency and throughput against the fp32 model')
+    args = parser.parse_args()
+
+    if args.numThreads > 0:
+        torch.set_num_threads(args.numThreads)
+    if args.format == 'onnx' and args.quantize != 'none':
+        parser.error('quantized models can only be exported to TorchScript')
+
+    # Export runs on CPU, which is where the quantized kernels are
+    model = build_model(args.network, args.modelPath, 'cpu')
+    im_size = image_size(args.network)
+    example = torch.randn(1, 3, im_size, im_size)
+
+    exported = model
+    if args.quantize == 'dynamic':
+        exported = quantize_dynamic(model)
+    elif args.quantize == 'static':
+        calibEntries = read_labeled_list(args.csv, args.imageFolder, 'train', args.calibSamples)
+        print("Calibrating on", len(calibEntries), "images")
+        exported = quantize_static(model, make_loader(calibEntries, args.network, args.batchSize, args.numWorkers), example)
+
+    suffix = ('' if args.quantize == 'none' else '_' + args.quantize + '_int8') + ('.onnx' if args.format == 'onnx' else '.pt')
+    output = args.output or os.path.splitext(args.modelPath)[0] + suffix
+    if args.format == 'onnx':
+        export_onnx(exported, example, output)
+    else:
+        export_torchscript(exported, example, output)
+    print("Exported", args.network, "to", output)
+
+    if args.benchmark:
+        evalEntries = read_labeled_list(args.csv, args.imageFolder, 'test', args.evalSamples)
+        labels = torch.tensor([label for _, label in evalEntries])
+        loader = make_loader(evalEntries, args.network, args.batchSize, args.numWorkers)
+        exportedModel = load_exported(output, args.format)
+
+        results = {}
+        for name, m in [('fp32 eager', model), ('exported', exportedModel)]:
+            # Latency first, which also warms up the TorchScript profiling runs
+            single_ms = latency(m, example, 20)
+            accuracy, scores, throughput = evaluate(m, loader, labels)
+            results[name] = scores
+            print("{:>10}: accuracy {:.4f}  latency {:.2f} ms/image  throughput {:.1f} images/s (batch {})".format(
+                name, accuracy, single_ms, throughput, args.batchSize))
+        delta = (results['exported'] - results['fp32 eager']).abs()
+        print("Score difference on", len(evalEntries), "images: mean {:.2e} max {:.2e}".format(delta.mean().item(), delta.max().item()))
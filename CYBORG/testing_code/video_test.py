@@ -0,0 +1,202 @@
+import os
+import sys
+import csv
+import glob
+import math
+import argparse
+import numpy as np
+import torch
+import torch.nn as nn
+from PIL import Image
+from tqdm import tqdm
+
+from detector import build_model, get_transform
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv', '.webm')
+
+
+def uniform_frames(videoPath, stride):
+    """Every stride-th frame. Skipped frames are only grabbed, not converted."""
+    import cv2
+    cap = cv2.VideoCapture(videoPath)
+    index = 0
+    while cap.grab():
+        if index % stride == 0:
+            ret, frame = cap.retrieve()
+            if not ret:
+                break
+            yield index, frame
+        index += 1
+    cap.release()
+
+
+def keyframes(videoPath):
+    """Intra-coded frames only. The decoder skips every other frame, which requires PyAV."""
+    import av
+    with av.open(videoPath) as container:
+        stream = container.streams.video[0]
+        stream.codec_context.skip_frame = 'NONKEY'
+        for frame in container.decode(stream):
+            # Indexed by presentation timestamp, frame numbers are not known when frames are skipped
+            yield frame.pts, frame.to_ndarray(format='bgr24')
+
+
+def scene_change_frames(videoPath, stride, threshold):
+    """
+    Frames that differ from the last kept one, checked every stride-th frame.
+    The difference is the mean absolute difference of 64x64 grayscale thumbnails, in [0, 255].
+    """
+    import cv2
+    last = None
+    for index, frame in uniform_frames(videoPath, stride):
+        thumb = cv2.resize(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), (64, 64), interpolation=cv2.INTER_AREA).astype(np.float32)
+        if last is None or np.abs(thumb - last).mean() > threshold:
+            last = thumb
+            yield index, frame
+
+
+def sample_frames(videoPath, args):
+    if args.sampling == 'keyframe':
+        return keyframes(videoPath)
+    if args.sampling == 'scene':
+        return scene_change_frames(videoPath, args.stride, args.sceneThreshold)
+    return uniform_frames(videoPath, args.stride)
+
+
+def face_crop(landmarkModel, frame, margin):
+    """
+    Square RGB crop around the most confident SCRFD detection, enlarged by margin,
+    or None if no face is found.
+    """
+    bboxes, _ = landmarkModel.det_model.detect(frame, max_num=0, metric='default')
+    if bboxes.shape[0] == 0:
+        return None
+    x1, y1, x2, y2, _ = bboxes[np.argmax(bboxes[:, 4])]
+    cx, cy = (x1 + x2) / 2, (y1 + y2) / 2
+    half = max(x2 - x1, y2 - y1) * margin / 2
+    h, w = frame.shape[:2]
+    left, top = max(int(cx - half), 0), max(int(cy - half), 0)
+    right, bottom = min(int(cx + half), w), min(int(cy + half), h)
+    if right <= left or bottom <= top:
+        return None
+    return Image.fromarray(np.ascontiguousarray(frame[top:bottom, left:right, ::-1]))
+
+
+def aggregate(scores, method):
+    """Video score from the frame scores, along the last axis."""
+    scores = np.asarray(scores)
+    if method == 'median':
+        return np.median(scores, axis=-1)
+    if method == 'topk':
+        # Mean of the most suspicious quarter of the frames
+        k = max(1, int(math.ceil(scores.shape[-1] / 4)))
+        return np.sort(scores, axis=-1)[..., -k:].mean(axis=-1)
+    return scores.mean(axis=-1)
+
+
+def decided(scores, method, threshold, z, minFrames, numResamples=1000):
+    """
+    True once the confidence interval of the aggregated score lies entirely on one side of threshold.
+    The interval is the normal one for the mean, and a percentile bootstrap with the same coverage for median and topk.
+    """
+    if len(scores) < minFrames:
+        return False
+    scores = np.asarray(scores)
+    if method == 'mean':
+        bound = z * scores.std(ddof=1) / math.sqrt(len(scores))
+        low, high = scores.mean() - bound, scores.mean() + bound
+    else:
+        # Fixed seed, so that a video always stops after the same batch
+        resamples = scores[np.random.RandomState(0).randint(len(scores), size=(numResamples, len(scores)))]
+        tail = 0.5 * math.erfc(z / math.sqrt(2))
+        low, high = np.quantile(aggregate(resamples, method), [tail, 1 - tail])
+    return low > threshold or high < threshold
+
+
+def score_video(videoPath, model, transform, landmarkModel, device, args):
+    """Scores sampled face crops in batches. Returns (frame scores, number of decoded frames, early exit)."""
+    sigmoid = nn.Sigmoid()
+    scores, batch = [], []
+    decoded = 0
+
+    def flush():
+        images = torch.stack([transform(crop) for crop in batch]).to(device, non_blocking=True)
+        with torch.inference_mode():
+            scores.extend(sigmoid(model(images))[:, 1].cpu().tolist())
+        del batch[:]
+
+    for _, frame in sample_frames(videoPath, args):
+        decoded += 1
+        crop = face_crop(landmarkModel, frame, args.margin)
+        if crop is not None:
+            batch.append(crop)
+        if len(batch) == args.batchSize:
+            flush()
+            if args.earlyExit and decided(scores, args.aggregate, args.threshold, args.z, args.minFrames):
+                return scores, decoded, True
+        if args.maxFrames and decoded >= args.maxFrames:
+            break
+    if batch:
+        flush()
+    return scores, decoded, False
+
+
+def list_videos(videos):
+    if os.path.isdir(videos):
+        return sorted(f for f in glob.glob(os.path.join(videos, '*')) if f.lower().endswith(VIDEO_EXTENSIONS))
+    if videos.lower().endswith(VIDEO_EXTENSIONS):
+        return [videos]
+    # Text file with one video path per line
+    with open(videos, 'r') as f:
+        return [l.strip() for l in f if l.strip()]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-videos', required=True, type=str, help='video file, folder of videos or text file listing them')
+    parser.add_argument('-modelPath',  default='../local_results/final_model.pth',type=str)
+    parser.add_argument('-network',  default="densenet",type=str)
+    parser.add_argument('-output_scores',  default='../local_results/video_scores.csv',type=str)
+    parser.add_argument('-faceswapRoot', default='../../MobileFaceSwap', type=str, help='MobileFaceSwap checkout with checkpoints/landmarks')
+    parser.add_argument('-sampling', default='uniform', choices=['uniform', 'keyframe', 'scene'], type=str)
+    parser.add_argument('-stride', default=10, type=int, help='frame step for uniform sampling and scene-change checks')
+    parser.add_argument('-sceneThreshold', default=20.0, type=float, help='mean absolute thumbnail difference for a new scene')
+    parser.add_argument('-maxFrames', default=0, type=int, help='maximum sampled frames per video, 0 for no limit')
+    parser.add_argument('-margin', default=1.3, type=float, help='face box enlargement of the crops')
+    parser.add_argument('-detSize', default=640, type=int)
+    parser.add_argument('-batchSize', default=32, type=int)
+    parser.add_argument('-aggregate', default='mean', choices=['mean', 'median', 'topk'], type=str)
+    parser.add_argument('-threshold', default=0.5, type=float, help='video is Synthetic if the aggregated score exceeds it')
+    parser.add_argument('-earlyExit', action='store_true', help='stop sampling once the aggregated score is confidently on one side of threshold')
+    parser.add_argument('-z', default=2.58, type=float, help='confidence interval width for the early exit, in standard errors')
+    parser.add_argument('-minFrames', default=16, type=int, help='scored faces required before an early exit')
+    parser.add_argument('-device', default='cuda' if torch.cuda.is_available() else 'cpu', type=str)
+    args = parser.parse_args()
+
+    device = torch.device(args.device)
+
+    # SCRFD face detector of MobileFaceSwap
+    sys.path.append(os.path.abspath(args.faceswapRoot))
+    from utils.prepare_data import LandmarkModel
+    landmarkModel = LandmarkModel(name='landmarks', root=os.path.join(args.faceswapRoot, 'checkpoints'))
+    landmarkModel.prepare(ctx_id=0 if device.type == 'cuda' else -1, det_thresh=0.6, det_size=(args.detSize, args.detSize))
+
+    model = build_model(args.network, args.modelPath, device)
+    transform = get_transform(args.network)
+
+    output_dir = os.path.dirname(args.output_scores)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+
+    with open(args.output_scores, 'w', newline='') as fout:
+        writer = csv.writer(fout)
+        writer.writerow(['video', 'score', 'verdict', 'faces_scored', 'frames_decoded', 'early_exit'])
+        for videoPath in tqdm(list_videos(args.videos)):
+            scores, decoded, early = score_video(videoPath, model, transform, landmarkModel, device, args)
+            if not scores:
+                writer.writerow([videoPath, '', 'NoFace', 0, decoded, False])
+                continue
+            score = float(aggregate(scores, args.aggregate))
+            verdict = 'Synthetic' if score > args.threshold else 'Real'
+            writer.writerow([videoPath, score, verdict, len(scores), decoded, early])
+            fout.flush()
@@ -2,13 +2,74 @@ import pickle
 import itertools
 import numpy as np
 import matplotlib.pyplot as plt
-from sklearn.metrics import roc_curve
 from sklearn.metrics import confusion_matrix
-import pylab as pl
 import csv
 import os
 
 
+class scoreMetrics:
+    """
+    Incremental accumulator of bona fide (label 0) and attack (label 1) scores.
+    update() can be called batch by batch; all measures are computed from one sort of the scores.
+    """
+    def __init__(self):
+        self.labels = []
+        self.scores = []
+        self._roc = None
+
+    def update(self, true_label, predict_score):
+        self.labels.append(np.asarray(true_label).ravel())
+        self.scores.append(np.asarray(predict_score, dtype=np.float64).ravel())
+        self._roc = None
+
+    def arrays(self):
+        if len(self.scores) > 1:
+            self.labels = [np.concatenate(self.labels)]
+            self.scores = [np.concatenate(self.scores)]
+        return self.labels[0], self.scores[0]
+
+    def roc(self):
+        """(fprs, tprs, thresholds) as returned by sklearn.metrics.roc_curve with attacks as positives."""
+        if self._roc is None:
+            labels, scores = self.arrays()
+            order = np.argsort(scores, kind='mergesort')[::-1]
+            scores = scores[order]
+            # Cumulative counts at the last position of every distinct score
+            distinct = np.r_[np.flatnonzero(np.diff(scores)), scores.size - 1]
+            tps = np.cumsum(labels[order] == 1)[distinct]
+            fps = distinct + 1 - tps
+            thresholds = scores[distinct]
+            # Drop collinear points, as roc_curve(drop_intermediate=True)
+            keep = np.flatnonzero(np.r_[True, np.logical_or(np.diff(fps, 2), np.diff(tps, 2)), True])
+            fps = np.r_[0, fps[keep]]
+            tps = np.r_[0, tps[keep]]
+            thresholds = np.r_[np.inf, thresholds[keep]]
+            self._roc = (fps / fps[-1], tps / tps[-1], thresholds)
+        return self._roc
+
+    def tdr_at_fdr(self, fpr):
+        """TDR interpolated at fpr, and the last threshold whose FDR is below fpr."""
+        fprs, tprs, thresholds = self.roc()
+        index = np.searchsorted(fprs, fpr, side='left')
+        threshold = thresholds[index - 1] if index > 0 else 0
+        return np.interp(fpr, fprs, tprs), threshold
+
+    def acer(self, threshold=None):
+        """
+        APCER, BPCER, ACER and threshold, with APCER = P(attack < threshold) and BPCER = P(bona fide >= threshold).
+        Without a threshold, the one minimizing ACER over every distinct score is used.
+        """
+        labels, scores = self.arrays()
+        spoof = np.sort(scores[labels == 1])
+        live = np.sort(scores[labels == 0])
+        thresholds = np.unique(scores) if threshold is None else np.atleast_1d(threshold)
+        APCER = np.searchsorted(spoof, thresholds, side='left') / spoof.size
+        BPCER = (live.size - np.searchsorted(live, thresholds, side='left')) / live.size
+        ACER = (APCER + BPCER) / 2
+        best = np.argmin(ACER)
+        return APCER[best], BPCER[best], ACER[best], thresholds[best]
+
+
 class evaluation:
     def __init__(self):
         return None
@@ -45,15 +106,11 @@ class evaluation:
         plt.savefig(os.path.join(path,method +'_ConfMatrix.jpg'))
 
     def get_threshold(self, fprs, thresholds, fpr):
-    # Getting threshold for particular fpr
-       threshold = 0
-       for x in range(0, fprs.size):
-         if fprs[x] >= fpr:
-             break
-         threshold = thresholds[x]
-       return threshold
+        # Getting threshold for particular fpr
+        index = np.searchsorted(fprs, fpr, side='left')
+        return thresholds[index - 1] if index > 0 else 0
 
-    def get_result(self, method,imgNames, true_label,predict_score,path, minThreshold = -1):
+    def get_result(self, method,imgNames, true_label,predict_score,path, minThreshold = -1, plot=True):
 
         # Getting predicted scores
         predict = np.array(predict_score)
@@ -61,114 +118,91 @@ class evaluation:
             predict =  predict[:, 1]
         elif(len(predict.shape)==3):
             predict = predict[:, :, 1]
+        true_label = np.asarray(true_label)
 
         # Normalization of scores in [0,1]
-        predictScore = (predict-min(predict))/ (max(predict) - min(predict))
-        print('Max Score:'+ str(max(predict)))
-        print('Min Score:'+ str(min(predict)))
+        predictScore = (predict-np.min(predict))/ (np.max(predict) - np.min(predict))
+        print('Max Score:'+ str(np.max(predict)))
+        print('Min Score:'+ str(np.min(predict)))
 
         # Saving image or video name with match score
         if imgNames != 'None':
-            imgNameScore=[]
-            for i in range(len(imgNames)):
-                imgNameScore.append([imgNames[i], true_label[i], predictScore[i]])
             with open(os.path.join(path, method + '_Match_Scores.csv'), 'w', newline='') as fout:
                 writer = csv.writer(fout)
-                writer.writerows(imgNameScore)
-
-        # Histogram plot
-        live = []
-        [live.append(predictScore[i]) for i in range(len(true_label)) if (true_label[i] == 0)]
-        spoof = []
-        [spoof.append(predictScore[j]) for j in range(len(true_label)) if (true_label[j] == 1)]
-        bins = np.linspace(np.min(np.array(spoof + live)), np.max(np.array(spoof + live)), 60)
-        plt.figure()
-        plt.hist(live, bins, alpha=0.5, label='Bonafide', density=True, edgecolor='black', facecolor='g')
-        plt.hist(spoof, bins, alpha=0.5, label='PA', density=True, edgecolor='black',facecolor='r' )
-        plt.legend(loc='upper right', fontsize=15)
-        plt.xlabel('Scores')
-        plt.ylabel('Frequency')
-        plt.savefig(os.path.join(path, method +"_Histogram.jpg"))
-
-        # Plot ROC curves in semilog scale
-        (fprs, tprs, thresholds) = roc_curve(true_label, predictScore)
-        plt.figure()
-        plt.semilogx(fprs, tprs, label=method)
-        plt.grid(True, which="major")
-        plt.legend(loc='lower right', fontsize=15)
-        plt.yticks(np.arange(0, 1.1, 0.1))
-        plt.xticks([0.001, 0.01, 0.1, 1])
-        plt.xlabel('False Detection Rate')
-        plt.ylabel('True Detection Rate')
-        plt.xlim((0.0005, 1.01))
-        plt.ylim((0, 1.02))
-        plt.plot([0.002, 0.002], [0, 1], color='#A0A0A0', linestyle='dashed')
-        plt.plot([0.001, 0.001], [0, 1], color='#A0A0A0', linestyle='dashed')
-        plt.plot([0.01, 0.01], [0, 1], color='#A0A0A0', linestyle='dashed')
-        plt.savefig(os.path.join(path,method +"_ROC.jpg"))
-
-        #Plot Raw ROC curves
-        plt.figure()
-        plt.plot(fprs, tprs)
-        plt.grid(True, which="major")
-        plt.legend(method, loc='lower right', fontsize=15)
-        plt.yticks(np.arange(0, 1.1, 0.1))
-        plt.xticks([0.01, 0.1, 1])
-        plt.xlabel('False Detection Rate')
-        plt.ylabel('True Detection Rate')
-        plt.xlim((0.0005, 1.01))
-        plt.ylim((0, 1.02))
-        plt.savefig(os.path.join(path,method +"_RawROC.jpg"))
+                writer.writerows(zip(imgNames, true_label.tolist(), predictScore.tolist()))
+
+        metrics = scoreMetrics()
+        metrics.update(true_label, predictScore)
+        (fprs, tprs, thresholds) = metrics.roc()
+        live = predictScore[true_label == 0]
+        spoof = predictScore[true_label == 1]
+
+        if plot:
+            # Histogram plot
+            bins = np.linspace(np.min(predictScore), np.max(predictScore), 60)
+            plt.figure()
+            plt.hist(live, bins, alpha=0.5, label='Bonafide', density=True, edgecolor='black', facecolor='g')
+            plt.hist(spoof, bins, alpha=0.5, label='PA', density=True, edgecolor='black',facecolor='r' )
+            plt.legend(loc='upper right', fontsize=15)
+            plt.xlabel('Scores')
+            plt.ylabel('Frequency')
+            plt.savefig(os.path.join(path, method +"_Histogram.jpg"))
+
+            # Plot ROC curves in semilog scale
+            plt.figure()
+            plt.semilogx(fprs, tprs, label=method)
+            plt.grid(True, which="major")
+            plt.legend(loc='lower right', fontsize=15)
+            plt.yticks(np.arange(0, 1.1, 0.1))
+            plt.xticks([0.001, 0.01, 0.1, 1])
+            plt.xlabel('False Detection Rate')
+            plt.ylabel('True Detection Rate')
+            plt.xlim((0.0005, 1.01))
+            plt.ylim((0, 1.02))
+            plt.plot([0.002, 0.002], [0, 1], color='#A0A0A0', linestyle='dashed')
+            plt.plot([0.001, 0.001], [0, 1], color='#A0A0A0', linestyle='dashed')
+            plt.plot([0.01, 0.01], [0, 1], color='#A0A0A0', linestyle='dashed')
+            plt.savefig(os.path.join(path,method +"_ROC.jpg"))
+
+            #Plot Raw ROC curves
+            plt.figure()
+            plt.plot(fprs, tprs)
+            plt.grid(True, which="major")
+            plt.legend(method, loc='lower right', fontsize=15)
+            plt.yticks(np.arange(0, 1.1, 0.1))
+            plt.xticks([0.01, 0.1, 1])
+            plt.xlabel('False Detection Rate')
+            plt.ylabel('True Detection Rate')
+            plt.xlim((0.0005, 1.01))
+            plt.ylim((0, 1.02))
+            plt.savefig(os.path.join(path,method +"_RawROC.jpg"))
 
         # Calculation of TDR at 0.2% , 0.1% and  5% FDR
         with open(os.path.join(path , method +'_TDR-ACER.csv'), mode='w+') as fout:
             fprArray = [0.002,0.001, 0.01, 0.05]
             for fpr in fprArray:
-                tpr = np.interp(fpr, fprs, tprs)
-                threshold = self.get_threshold(fprs, thresholds, fpr)
+                tpr, threshold = metrics.tdr_at_fdr(fpr)
                 fout.write("TDR @ FDR, threshold: %f @ %f ,%f\n" % (tpr, fpr, threshold))
                 print("TDR @ FDR, threshold: %f @ %f ,%f " % (tpr, fpr, threshold))
 
-        # Calculation of APCER, BPCER and ACER
-            if minThreshold == -1:
-                minACER= 1000
-                for thresh in np.arange(0,1,0.025):
-                    APCER = np.count_nonzero(np.less(spoof,thresh))/len(spoof)
-                    BPCER = np.count_nonzero(np.greater_equal(live,thresh))/len(live)
-                    ACER = (APCER + BPCER)/2
-                    if ACER < minACER:
-                        minThreshold = thresh
-                        minAPCER = APCER
-                        minBPCER = BPCER
-                        minACER = ACER
-                fout.write("APCER and BPCER @ ACER, threshold: %f and %f @ %f, %f\n" % (minAPCER, minBPCER, minACER, minThreshold))
-                print("APCER and BPCER @ ACER, threshold: %f and %f @ %f, %f\n" % (minAPCER, minBPCER, minACER, minThreshold))
-            else:
-                APCER = np.count_nonzero(np.less(spoof, minThreshold)) / len(spoof)
-                BPCER = np.count_nonzero(np.greater_equal(live, minThreshold)) / len(live)
-                ACER = (APCER + BPCER) / 2
-                fout.write("APCER and BPCER @ ACER, threshold: %f and %f @ %f, %f\n" % (APCER, BPCER, ACER, minThreshold))
-                print("APCER and BPCER @ ACER, threshold: %f and %f @ %f, %f\n" % (APCER, BPCER, ACER, minThreshold))
-
-
+        # Calculation of APCER, BPCER and ACER, searched over every score when no threshold is given
+            APCER, BPCER, ACER, minThreshold = metrics.acer(None if minThreshold == -1 else minThreshold)
+            fout.write("APCER and BPCER @ ACER, threshold: %f and %f @ %f, %f\n" % (APCER, BPCER, ACER, minThreshold))
+            print("APCER and BPCER @ ACER, threshold: %f and %f @ %f, %f\n" % (APCER, BPCER, ACER, minThreshold))
 
         # Calculation of Confusion matrix
         #threshold = self.get_threshold(fprs, thresholds, 0.002)
-        predict = predictScore >= minThreshold
-        predict_label =[]
-        [predict_label.append(int(predict[i])) for i in range(len(predict))]
+        predict_label = (predictScore >= minThreshold).astype(int)
         conf_matrix = confusion_matrix(true_label, predict_label)   # 0 for live and 1 for spoof
         print(conf_matrix)
 
         # Plot non-normalized confusion matrix
-        np.set_printoptions(precision=2)
-        class_names = ['0', '1']
-        self.plot_confusion_matrix(conf_matrix, method,path, classes=class_names,normalize=False)
+        if plot:
+            np.set_printoptions(precision=2)
+            class_names = ['0', '1']
+            self.plot_confusion_matrix(conf_matrix, path, classes=class_names, normalize=False, method=method)
 
         # Saving evaluation measures
         pickle.dump((fprs,tprs,minThreshold,tpr,fpr,conf_matrix), open(os.path.join(path,method +".pickle"), "wb"))
-        errorIndex=[]
-        [errorIndex.append(i) for i in range(len(true_label)) if true_label[i] != predict_label[i]]
+        errorIndex = np.flatnonzero(true_label != predict_label).tolist()
         return errorIndex, predictScore, minThreshold
-
-
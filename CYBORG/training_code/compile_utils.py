@@ -0,0 +1,16 @@
+import torch
+
+
+def script_model(model, device):
+    """TorchScript version of model, with oneDNN fusion on CPU when the torch version supports it."""
+    if device.type == 'cpu' and hasattr(torch.jit, 'enable_onednn_fusion'):
+        torch.jit.enable_onednn_fusion(True)
+    return torch.jit.script(model)
+
+
+def class_logits(outputs):
+    """Logits of a model output. A scripted Inception3 always returns InceptionOutputs(logits, aux_logits),
+    also in eval mode and without aux logits, where the eager module returns the logits tensor."""
+    if isinstance(outputs, tuple):
+        return outputs[0]
+    return outputs
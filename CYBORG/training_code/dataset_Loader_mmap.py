@@ -0,0 +1,153 @@
+import os
+import json
+import hashlib
+import numpy as np
+import torch
+import torch.utils.data as data_utl
+from PIL import Image
+from tqdm import tqdm
+
+# Normalization applied at load time, so one cache serves every network with the same image size
+NORMALIZATION = {
+    'xception': ([0.5]*3, [0.5]*3),
+    'default': ([0.485, 0.456, 0.406], [0.229, 0.224, 0.225]),
+}
+
+
+def cache_key(split_file, root, train_test, c2i, map_location, map_size, im_size):
+    # Key on the CSV content and every parameter that changes the stored bytes
+    h = hashlib.sha1()
+    with open(split_file, 'rb') as f:
+        h.update(f.read())
+    params = [os.path.abspath(root), train_test, sorted(c2i.items()), map_location, map_size, im_size]
+    h.update(json.dumps(params).encode())
+    return h.hexdigest()[:16]
+
+
+def build_cache(split_file, root, train_test, c2i, cache_dir, map_location=None, map_size=7, im_size=224):
+    """
+    One-time preprocessing of a CSV split into memory-mapped uint8 shards.
+    Writes <key>.images.npy ([N, 3, im_size, im_size]), <key>.maps.npy ([N, map_size, map_size])
+    and the <key>.json index, which is written last and marks the cache as complete.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    key = cache_key(split_file, root, train_test, c2i, map_location, map_size, im_size)
+    index_path = os.path.join(cache_dir, key + '.json')
+    if os.path.exists(index_path):
+        return index_path
+
+    # Reading data from CSV file
+    class_to_id = dict(c2i)
+    entries = []
+    with open(split_file, 'r') as f:
+        for l in f.readlines():
+            v = l.strip().split(',')
+            if train_test == v[0]:
+                c = v[1]
+                if c not in class_to_id:
+                    class_to_id[c] = len(class_to_id)
+                entries.append([v[2], class_to_id[c]])
+
+    n = len(entries)
+    images = np.lib.format.open_memmap(os.path.join(cache_dir, key + '.images.npy'), mode='w+',
+                                       dtype=np.uint8, shape=(n, 3, im_size, im_size))
+    maps = np.lib.format.open_memmap(os.path.join(cache_dir, key + '.maps.npy'), mode='w+',
+                                     dtype=np.uint8, shape=(n, map_size, map_size))
+    has_map = []
+
+    print("Building cache for:", train_test, "->", key)
+    for i, (image_name, cls) in enumerate(tqdm(entries)):
+        img = Image.open(root + image_name).convert('RGB')
+        images[i] = np.asarray(img.resize((im_size, im_size), Image.BILINEAR)).transpose(2, 0, 1)
+        img.close()
+
+        map_path = None if map_location is None else map_location + image_name.split("/")[-1]
+        if train_test == 'train' and map_path is not None and os.path.exists(map_path):
+            human_map = Image.open(map_path).convert('L')
+            maps[i] = np.asarray(human_map.resize((map_size, map_size), Image.BILINEAR))
+            human_map.close()
+            has_map.append(True)
+        else:
+            has_map.append(False)
+
+    images.flush()
+    maps.flush()
+    del images, maps
+
+    index = {'key': key, 'entries': entries, 'has_map': has_map, 'class_to_id': class_to_id,
+             'im_size': im_size, 'map_size': map_size}
+    with open(index_path + '.tmp', 'w') as f:
+        json.dump(index, f)
+    os.replace(index_path + '.tmp', index_path)
+    return index_path
+
+
+class datasetLoader(data_utl.Dataset):
+    """
+    Drop-in replacement for dataset_Loader_cam/dataset_Loader_largeset backed by a memory-mapped cache.
+    With map_location set, returns (img, cls, imageName, hmap) like dataset_Loader_cam,
+    otherwise (img, cls, imageName) like dataset_Loader_largeset.
+    """
+
+    def __init__(self, split_file, root, train_test, random=True, c2i={}, map_location=None, map_size=7, im_size=224,
+                 network='densenet', cache_dir='../cache/', return_uint8=False):
+        index_path = build_cache(split_file, root, train_test, c2i, cache_dir, map_location, map_size, im_size)
+        with open(index_path, 'r') as f:
+            index = json.load(f)
+
+        self.class_to_id = index['class_to_id']
+        self.id_to_class = [k for k, _ in sorted(self.class_to_id.items(), key=lambda kv: kv[1])]
+        self.data = [[root + image_name, cls] for image_name, cls in index['entries']]
+        self.has_map = index['has_map']
+        self.with_maps = map_location is not None
+        # uint8 output is left for dataset_Loader_uint8.BatchTransform to normalize on the device
+        self.return_uint8 = return_uint8
+        print("Class assignments:", self.class_to_id)
+
+        mean, std = NORMALIZATION['xception' if network == 'xception' else 'default']
+        self.mean = torch.tensor(mean).view(3, 1, 1)
+        self.std = torch.tensor(std).view(3, 1, 1)
+
+        self.images_path = os.path.join(os.path.dirname(index_path), index['key'] + '.images.npy')
+        self.maps_path = os.path.join(os.path.dirname(index_path), index['key'] + '.maps.npy')
+        # Opened lazily so that every DataLoader worker maps the files itself instead of pickling them
+        self.images = None
+        self.maps = None
+
+        self.split_file = split_file
+        self.root = root
+        self.random = random
+        self.train_test = train_test
+
+    def _open(self):
+        # Copy-on-write mapping: writable zero-copy views, pages are shared between processes
+        self.images = np.load(self.images_path, mmap_mode='c')
+        self.maps = np.load(self.maps_path, mmap_mode='c')
+
+    def uint8_item(self, index):
+        """Zero-copy uint8 view of the stored image, [3, im_size, im_size]."""
+        if self.images is None:
+            self._open()
+        return torch.from_numpy(self.images[index])
+
+    def __getitem__(self, index):
+        imagePath, cls = self.data[index]
+        imageName = imagePath.split('/')[-1]
+
+        img = self.uint8_item(index)
+        if not self.return_uint8:
+            img = (img.float() / 255 - self.mean) / self.std
+
+        if not self.with_maps:
+            return img, cls, imageName
+
+        if self.has_map[index]:
+            hmap = torch.from_numpy(self.maps[index]).float()
+            hmap = hmap - torch.min(hmap)
+            hmap = hmap / torch.max(hmap)
+        else:
+            hmap = 0
+        return img, cls, imageName, hmap
+
+    def __len__(self):
+        return len(self.data)
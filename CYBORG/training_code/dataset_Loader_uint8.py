@@ -0,0 +1,113 @@
+import os
+import numpy as np
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+import torch.utils.data as data_utl
+from PIL import Image
+import torchvision.transforms as transforms
+
+from dataset_Loader_mmap import NORMALIZATION
+
+
+class datasetLoader(data_utl.Dataset):
+    """
+    Lazily decoding variant of dataset_Loader_cam/dataset_Loader_largeset for multi-worker loading.
+    __init__ only reads the CSV; each worker decodes and resizes its own images and returns uint8 tensors,
+    which are converted and normalized in batches on the training side by BatchTransform.
+    With map_location set, returns (img, cls, imageName, hmap), otherwise (img, cls, imageName).
+    """
+
+    def __init__(self, split_file, root, train_test, random=True, c2i={}, map_location=None, map_size=7, im_size=224,
+                 network='densenet', decode_size=None):
+        self.class_to_id = c2i
+        self.id_to_class = []
+        self.map_location = map_location
+        self.map_size = map_size
+        self.image_size = im_size
+        # Images must share a size to be collated; the resize to im_size can be left to BatchTransform
+        self.decode_size = decode_size or im_size
+
+        # Class assignment
+        for i in range(len(c2i.keys())):
+            for k in c2i.keys():
+                if c2i[k] == i:
+                    self.id_to_class.append(k)
+        cid = len(self.id_to_class)
+
+        self.map_transform = transforms.Compose([
+            transforms.Resize([self.map_size, self.map_size]),
+            transforms.ToTensor(),
+        ])
+
+        # Reading data from CSV file, no decoding here
+        self.data = []
+        print("Reading in data for:", train_test)
+        with open(split_file, 'r') as f:
+            for l in f:
+                v = l.strip().split(',')
+                if train_test == v[0]:
+                    c = v[1]
+                    if c not in self.class_to_id:
+                        self.class_to_id[c] = cid
+                        self.id_to_class.append(c)
+                        cid += 1
+                    self.data.append([root + v[2], self.class_to_id[c]])
+        print("Class assignments:", self.class_to_id)
+
+        self.split_file = split_file
+        self.root = root
+        self.random = random
+        self.train_test = train_test
+
+    def __getitem__(self, index):
+        imagePath, cls = self.data[index]
+        imageName = imagePath.split('/')[-1]
+
+        img = Image.open(imagePath).convert('RGB')
+        img_resized = img.resize((self.decode_size, self.decode_size), Image.BILINEAR)
+        img.close()
+        img = torch.from_numpy(np.array(img_resized)).permute(2, 0, 1)
+
+        if self.map_location is None:
+            return img, cls, imageName
+
+        if self.train_test == 'train' and os.path.exists(self.map_location + imageName):
+            human_map = Image.open(self.map_location + imageName)
+            hmap = torch.squeeze(self.map_transform(human_map).type(torch.float))
+            hmap = hmap - torch.min(hmap)
+            hmap = hmap / torch.max(hmap)
+            human_map.close()
+        else:
+            hmap = 0
+        return img, cls, imageName, hmap
+
+    def __len__(self):
+        return len(self.data)
+
+
+class BatchTransform(nn.Module):
+    """Batched uint8 -> normalized float conversion (and resize if needed), run on the training device."""
+
+    def __init__(self, im_size=224, network='densenet'):
+        super(BatchTransform, self).__init__()
+        self.image_size = im_size
+        mean, std = NORMALIZATION['xception' if network == 'xception' else 'default']
+        self.register_buffer('mean', torch.tensor(mean).view(1, 3, 1, 1))
+        self.register_buffer('std', torch.tensor(std).view(1, 3, 1, 1))
+
+    def forward(self, x):
+        x = x.float() / 255
+        if x.shape[-1] != self.image_size or x.shape[-2] != self.image_size:
+            x = F.interpolate(x, size=(self.image_size, self.image_size), mode='bilinear', align_corners=False,
+                              antialias=True)
+        return (x - self.mean) / self.std
+
+
+def loader_kwargs(num_workers):
+    """DataLoader settings that overlap decoding with compute."""
+    kwargs = {'num_workers': num_workers, 'pin_memory': True}
+    if num_workers > 0:
+        kwargs['persistent_workers'] = True
+        kwargs['prefetch_factor'] = 4
+    return kwargs
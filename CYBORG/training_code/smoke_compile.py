@@ -0,0 +1,65 @@
+import os
+import sys
+import argparse
+import torch
+import torch.nn as nn
+import torchvision.models as models
+from compile_utils import script_model, class_logits
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '../xception/network'))
+from xception import xception
+
+
+# Smoke run of train_cam.py -compile script: builds every -network choice with random weights (the pretrained
+# weights are not needed to check scripting), scripts it and runs one train and one test step on random batches.
+def build_network(network, nClasses):
+    if network == "resnet":
+        model = models.resnet50()
+        model.fc = nn.Linear(model.fc.in_features, nClasses)
+        return model, 224
+    elif network == "inception":
+        model = models.inception_v3(aux_logits=False, init_weights=False)
+        model.fc = nn.Linear(model.fc.in_features, nClasses)
+        return model, 299
+    elif network == "xception":
+        # Same network as model_selection('xception') without the ImageNet checkpoint
+        model = xception(pretrained=False)
+        model.last_linear = nn.Linear(model.last_linear.in_features, nClasses)
+        return model, 299
+    model = models.densenet121()
+    model.classifier = nn.Linear(model.classifier.in_features, nClasses)
+    return model, 224
+
+
+parser = argparse.ArgumentParser()
+parser.add_argument('-networks', nargs='+', default=['densenet', 'resnet', 'inception', 'xception'])
+parser.add_argument('-batchSize', type=int, default=2)
+parser.add_argument('-nClasses', default=2, type=int)
+parser.add_argument('-device', default='cuda' if torch.cuda.is_available() else 'cpu', type=str)
+args = parser.parse_args()
+
+device = torch.device(args.device)
+criterion = nn.CrossEntropyLoss()
+failures = []
+for network in args.networks:
+    model, im_size = build_network(network, args.nClasses)
+    net = script_model(model.to(device), device)
+    data = torch.randn(args.batchSize, 3, im_size, im_size, device=device)
+    cls = torch.randint(args.nClasses, [args.batchSize], device=device)
+    try:
+        net.train()
+        outputs = class_logits(net(data))
+        criterion(outputs, cls).backward()
+        net.eval()
+        with torch.no_grad():
+            outputs = class_logits(net(data))
+            criterion(outputs, cls)
+        pred = torch.max(outputs, dim=1)[1]
+        assert outputs.shape == (args.batchSize, args.nClasses) and pred.shape == cls.shape
+        print(network, 'OK')
+    except Exception as e:
+        print(network, 'FAILED:', e)
+        failures.append(network)
+
+if failures:
+    sys.exit('-compile script fails for: ' + ', '.join(failures))
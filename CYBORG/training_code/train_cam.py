@@ -2,6 +2,7 @@ import os
 import sys
 import argparse
 import json
+import time
 from Evaluation import evaluation
 import matplotlib.pyplot as plt
 import numpy as np
@@ -10,6 +11,8 @@ import torch
 import torch.nn as nn
 import torch.optim as optim
 from dataset_Loader_cam import datasetLoader
+from dataset_Loader_uint8 import BatchTransform, loader_kwargs
+from compile_utils import script_model, class_logits
 from tqdm import tqdm
 sys.path.append("../")
 # sys.path.append("./")
@@ -27,21 +30,50 @@ parser.add_argument('-heatmaps', required=False, default= '../Data/train/heatmap
 parser.add_argument('-alpha', required=False, default=0.5,type=float)
 parser.add_argument('-network', default= 'densenet',type=str)
 parser.add_argument('-nClasses', default= 2,type=int)
+parser.add_argument('-cacheDir', required=False, default= '',type=str, help='memory-mapped dataset cache, disabled if empty')
+parser.add_argument('-lazyDecode', action='store_true', help='load uint8 images and normalize them in batches on the device')
+parser.add_argument('-numWorkers', default= 0,type=int)
+parser.add_argument('-device', default= 'cuda' if torch.cuda.is_available() else 'cpu',type=str)
+parser.add_argument('-bf16', action='store_true', help='bfloat16 autocast for the forward pass (CPU or CUDA)')
+parser.add_argument('-channelsLast', action='store_true', help='channels_last memory format for the model and the batches')
+parser.add_argument('-accumSteps', default= 1,type=int, help='batches accumulated per optimizer step')
+parser.add_argument('-compile', default= 'none',choices=['none','inductor','script'],type=str,
+                    help='torch.compile (torch>=2.0) or TorchScript; script skips the CAM hooks so it needs -alpha 1')
 
 args = parser.parse_args()
-device = torch.device('cuda')
+
+# Memory-mapped cache of preprocessed images (built on first use), or uint8 images decoded in the workers
+dataset_kwargs = {}
+if args.cacheDir:
+    from dataset_Loader_mmap import datasetLoader
+    dataset_kwargs = {'cache_dir': args.cacheDir, 'return_uint8': args.lazyDecode}
+elif args.lazyDecode:
+    from dataset_Loader_uint8 import datasetLoader
+
+device = torch.device(args.device)
 
 print(args)
 
 
 activation = {}
-def getActivation(name):
+def getActivation(name, clone=False):
   # the hook signature
   def hook(model, input, output):
-    activation[name] = output
+    # densenet runs an in-place ReLU on its features right after this hook, so keep a copy
+    activation[name] = output.clone() if clone else output
   return hook
 
 
+def batchCams(features, params, pred):
+  # CAMs of the predicted classes for the whole batch, min/max normalized per sample: [B, h, w]
+  bz, nc, h, w = features.shape
+  weight = params[pred]
+  cams = torch.einsum('bc,bcn->bn', weight, features.reshape(bz, nc, h*w))
+  cams = cams - torch.min(cams, dim=1, keepdim=True)[0]
+  cams = cams / torch.max(cams, dim=1, keepdim=True)[0]
+  return cams.reshape(bz, h, w)
+
+
 # Definition of model architecture
 if args.network == "resnet":
     im_size = 224
@@ -50,7 +82,7 @@ if args.network == "resnet":
     num_ftrs = model.fc.in_features
     model.fc = nn.Linear(num_ftrs, args.nClasses)
     model = model.to(device)
-    model.layer4[-1].conv3.register_forward_hook(getActivation('features'))
+    hook = model.layer4[-1].conv3.register_forward_hook(getActivation('features'))
 elif args.network == "inception":
     im_size = 299
     map_size = 8
@@ -58,12 +90,12 @@ elif args.network == "inception":
     num_ftrs = model.fc.in_features
     model.fc = nn.Linear(num_ftrs, args.nClasses)
     model = model.to(device)  
-    model.Mixed_7c.register_forward_hook(getActivation('features'))
+    hook = model.Mixed_7c.register_forward_hook(getActivation('features'))
 elif args.network == "xception":
     im_size = 299
     map_size = 10
     model, *_ = model_selection(modelname='xception', num_out_classes=2)
-    model.model.conv4.register_forward_hook(getActivation('features'))
+    hook = model.model.conv4.register_forward_hook(getActivation('features'))
     model = model.to(device)
 else:
     im_size = 224
@@ -72,9 +104,28 @@ else:
     num_ftrs = model.classifier.in_features
     model.classifier = nn.Linear(num_ftrs, args.nClasses)
     model = model.to(device)
+    hook = model.features.register_forward_hook(getActivation('features', clone=True))
+
+if args.channelsLast:
+    model = model.to(memory_format=torch.channels_last)
 
 print(model)
 
+# Compiled/scripted module used for the forward passes; states are saved from model itself
+net = model
+if args.compile == 'inductor':
+    if not hasattr(torch, 'compile'):
+        sys.exit("torch.compile requires torch>=2.0, use -compile script or none")
+    net = torch.compile(model)
+elif args.compile == 'script':
+    if args.alpha != 1.0:
+        sys.exit("TorchScript does not run the CAM forward hooks, -compile script requires -alpha 1")
+    hook.remove()
+    net = script_model(model, device)
+
+# Conversion and normalization of uint8 batches on the device
+batch_transform = BatchTransform(im_size, args.network).to(device) if args.lazyDecode else None
+
 # Create destination folder
 os.makedirs(args.outputPath,exist_ok=True)
 
@@ -98,10 +149,10 @@ if os.path.exists(result_path + "/DesNet121_Histogram.jpg") and os.path.exists(l
 class_assgn = {'Real':0,'Synthetic':1}
 
 # Dataloader for train and test data
-dataseta = datasetLoader(args.csvPath,args.datasetPath,train_test='train',c2i=class_assgn,map_location=args.heatmaps,map_size=map_size,im_size=im_size,network=args.network)
-dl = torch.utils.data.DataLoader(dataseta, batch_size=args.batchSize, shuffle=True, num_workers=0, pin_memory=True)
-dataset = datasetLoader(args.csvPath,args.datasetPath, train_test='test', c2i=dataseta.class_to_id,map_location=args.heatmaps,map_size=map_size,im_size=im_size,network=args.network)
-test = torch.utils.data.DataLoader(dataset, batch_size=args.batchSize, shuffle=True, num_workers=0, pin_memory=True)
+dataseta = datasetLoader(args.csvPath,args.datasetPath,train_test='train',c2i=class_assgn,map_location=args.heatmaps,map_size=map_size,im_size=im_size,network=args.network,**dataset_kwargs)
+dl = torch.utils.data.DataLoader(dataseta, batch_size=args.batchSize, shuffle=True, **loader_kwargs(args.numWorkers))
+dataset = datasetLoader(args.csvPath,args.datasetPath, train_test='test', c2i=dataseta.class_to_id,map_location=args.heatmaps,map_size=map_size,im_size=im_size,network=args.network,**dataset_kwargs)
+test = torch.utils.data.DataLoader(dataset, batch_size=args.batchSize, shuffle=True, **loader_kwargs(args.numWorkers))
 dataloader = {'train': dl, 'test':test}
 
 
@@ -117,7 +168,7 @@ criterion_hmap = nn.MSELoss()
 with open(os.path.join(log_path,'params.json'), 'w') as out:
     hyper = vars(args)
     json.dump(hyper, out)
-log = {'iterations':[], 'epoch':[], 'validation':[], 'train_acc':[], 'val_acc':[]}
+log = {'iterations':[], 'epoch':[], 'validation':[], 'train_acc':[], 'val_acc':[], 'train_throughput':[], 'test_throughput':[]}
 
     
 
@@ -145,11 +196,11 @@ for epoch in range(args.nEpochs):
     for phase in ['train', 'test']:
         train = (phase=='train')
         if phase == 'train':
-            model.train()
+            net.train()
             if args.network == "xception":
                 model.model.train()
         else:
-            model.eval()
+            net.eval()
             if args.network == "xception":
                 model.model.eval()
             
@@ -160,27 +211,33 @@ for epoch in range(args.nEpochs):
         testPredScore = []
         testTrueLabel = []
         imgNames=[]
+        start_time = time.time()
         with torch.set_grad_enabled(train):
             for batch_idx, (data, cls, imageName, hmap) in enumerate(tqdm(dataloader[phase])):
 
                 # Data and ground truth
-                data = data.to(device)
+                data = data.to(device, non_blocking=True)
+                if batch_transform is not None:
+                    data = batch_transform(data)
+                if args.channelsLast:
+                    data = data.contiguous(memory_format=torch.channels_last)
                 cls = cls.to(device)
                 hmap = hmap.to(device)
                 
-                outputs = model(data)
+                with torch.autocast(device_type=device.type, dtype=torch.bfloat16, enabled=args.bf16):
+                    outputs = class_logits(net(data))
+                    class_loss = criterion(outputs, cls)
 
                 # Prediction of accuracy
                 pred = torch.max(outputs,dim=1)[1]
                 corr = torch.sum((pred == cls).int())
                 acc += corr.item()
                 tot += data.size(0)
-                class_loss = criterion(outputs, cls)                       
 
                 # Running model over data
                 if phase == 'train' and alpha != 1:
                     if args.network == "densenet":
-                        features = model.features(data)
+                        features = activation['features']
                         params = list(model.classifier.parameters())[0]
                     elif args.network == "inception":
                         features = activation['features']
@@ -195,18 +252,8 @@ for epoch in range(args.nEpochs):
                         print("INVALID ARCHITECTURE:",args.network)
                         sys.exit()
 
-                    bz, nc, h, w = features.shape
-
-                    beforeDot =  features.reshape((bz, nc, h*w))
-                    cams = []
-                    for ids,bd in enumerate(beforeDot):
-                        weight = params[pred[ids]]
-                        cam = torch.matmul(weight, bd)
-                        cam_img = cam.reshape(h, w)
-                        cam_img = cam_img - torch.min(cam_img)
-                        cam_img = cam_img / torch.max(cam_img)
-                        cams.append(cam_img)
-                    cams = torch.stack(cams)
+                    # CAM loss in fp32 also under autocast
+                    cams = batchCams(features.float(), params, pred)
                     hmap_loss = criterion_hmap(cams,hmap)
                 else:
                     hmap_loss = 0
@@ -218,14 +265,15 @@ for epoch in range(args.nEpochs):
                     else:
                         loss = class_loss
                     train_step += 1
-                    solver.zero_grad()
-                    loss.backward()
-                    solver.step()
+                    (loss / args.accumSteps).backward()
+                    if (batch_idx + 1) % args.accumSteps == 0 or batch_idx + 1 == len(dataloader[phase]):
+                        solver.step()
+                        solver.zero_grad()
                     log['iterations'].append(loss.item())
                 elif phase == 'test':
                     loss = class_loss
                     val_step += 1
-                    temp = outputs.detach().cpu().numpy()
+                    temp = outputs.detach().float().cpu().numpy()
                     scores = np.stack((temp[:,0], np.amax(temp[:,1:args.nClasses], axis=1)), axis=-1)
                     testPredScore.extend(scores)
                     testTrueLabel.extend((cls.detach().cpu().numpy()>0)*1)
@@ -234,6 +282,10 @@ for epoch in range(args.nEpochs):
                 tloss += loss.item()
                 c += 1
 
+        throughput = tot / (time.time() - start_time)
+        log[phase + '_throughput'].append(throughput)
+        print('Epoch: ', epoch, phase, 'throughput: %.1f images/s' % throughput)
+
         # Logging of train and test results
         if phase == 'train':
             log['epoch'].append(tloss/c)
@@ -286,6 +338,6 @@ plt.savefig(os.path.join(result_path,'model_Loss.jpg'))
 
 # Evaluation of test set utilizing the trained model
 obvResult = evaluation()
-errorIndex, predictScore, threshold = obvResult.get_result(testImgNames, testTrueLabels, testPredScores, result_path)
+errorIndex, predictScore, threshold = obvResult.get_result('DesNet121', testImgNames, testTrueLabels, testPredScores, result_path)
 
 
@@ -9,6 +9,7 @@ import torch
 import torch.nn as nn
 import torch.optim as optim
 from dataset_Loader_largeset import datasetLoader
+from dataset_Loader_uint8 import BatchTransform, loader_kwargs
 from tqdm import tqdm
 import sys
 sys.path.append("../")
@@ -25,8 +26,20 @@ parser.add_argument('-datasetPath', required=False, default= '../Data/train/orig
 parser.add_argument('-outputPath', required=False, default= '../model_output_local/cvpr_test_largemodels/',type=str)
 parser.add_argument('-network', default= 'densenet',type=str)
 parser.add_argument('-nClasses', default= 2,type=int)
+parser.add_argument('-cacheDir', required=False, default= '',type=str, help='memory-mapped dataset cache, disabled if empty')
+parser.add_argument('-lazyDecode', action='store_true', help='load uint8 images and normalize them in batches on the device')
+parser.add_argument('-numWorkers', default= 0,type=int)
 
 args = parser.parse_args()
+
+# Memory-mapped cache of preprocessed images (built on first use), or uint8 images decoded in the workers
+dataset_kwargs = {}
+if args.cacheDir:
+    from dataset_Loader_mmap import datasetLoader
+    dataset_kwargs = {'cache_dir': args.cacheDir, 'return_uint8': args.lazyDecode}
+elif args.lazyDecode:
+    from dataset_Loader_uint8 import datasetLoader
+
 device = torch.device('cuda')
 
 print(args)
@@ -58,6 +71,9 @@ else:
 
 print(model)
 
+# Conversion and normalization of uint8 batches on the device
+batch_transform = BatchTransform(im_size, args.network).to(device) if args.lazyDecode else None
+
 # Creation of Log folder: used to save the trained model
 log_path = os.path.join(args.outputPath, 'Logs')
 if not os.path.exists(log_path):
@@ -78,10 +94,10 @@ if os.path.exists(result_path + "/DesNet121_Histogram.jpg") and os.path.exists(l
 class_assgn = {'Real':0,'Synthetic':1}
 
 # Dataloader for train and test data
-dataseta = datasetLoader(args.csvPath,args.datasetPath,train_test='train',c2i=class_assgn,im_size=im_size,network=args.network)
-dl = torch.utils.data.DataLoader(dataseta, batch_size=args.batchSize, shuffle=True, num_workers=0, pin_memory=True)
-dataset = datasetLoader(args.csvPath,args.datasetPath, train_test='test', c2i=dataseta.class_to_id,im_size=im_size,network=args.network)
-test = torch.utils.data.DataLoader(dataset, batch_size=args.batchSize, shuffle=True, num_workers=0, pin_memory=True)
+dataseta = datasetLoader(args.csvPath,args.datasetPath,train_test='train',c2i=class_assgn,im_size=im_size,network=args.network,**dataset_kwargs)
+dl = torch.utils.data.DataLoader(dataseta, batch_size=args.batchSize, shuffle=True, **loader_kwargs(args.numWorkers))
+dataset = datasetLoader(args.csvPath,args.datasetPath, train_test='test', c2i=dataseta.class_to_id,im_size=im_size,network=args.network,**dataset_kwargs)
+test = torch.utils.data.DataLoader(dataset, batch_size=args.batchSize, shuffle=True, **loader_kwargs(args.numWorkers))
 dataloader = {'train': dl, 'test':test}
 
 lr = 0.005
@@ -126,7 +142,9 @@ for epoch in range(args.nEpochs):
             for data, cls, imageName in tqdm(dataloader[phase]):
 
                 # Data and ground truth
-                data = data.to(device)
+                data = data.to(device, non_blocking=True)
+                if batch_transform is not None:
+                    data = batch_transform(data)
                 cls = cls.to(device)
 
                 # Running model over data
@@ -207,6 +225,6 @@ plt.savefig(os.path.join(result_path,'model_Loss.jpg'))
 
 # Evaluation of test set utilizing the trained model
 obvResult = evaluation()
-errorIndex, predictScore, threshold = obvResult.get_result(testImgNames, testTrueLabels, testPredScores, result_path)
+errorIndex, predictScore, threshold = obvResult.get_result('DesNet121', testImgNames, testTrueLabels, testPredScores, result_path)
 
 
@@ -0,0 +1,161 @@
+import torch
+import argparse
+import os
+import time
+import datetime
+from torchvision.utils import save_image
+import torch.nn as nn
+
+from data_loader import get_loader
+from utils import *
+from model import Generator, PerturbationGenerator
+
+def train(config, G, P, device):
+    """Train the perturbation generator against a frozen StarGAN generator."""
+    celeba_loader = get_loader(config.celeba_image_dir, config.attr_path, config.selected_attrs,
+                               config.celeba_crop_size, config.image_size, config.batch_size,
+                               'CelebA', 'train', config.num_workers)
+
+    criterion = nn.MSELoss().to(device)
+    optimizer = torch.optim.Adam(P.parameters(), config.p_lr, [config.beta1, config.beta2])
+
+    data_iter = iter(celeba_loader)
+    start_time = time.time()
+    for i in range(config.num_iters):
+        try:
+            x_real, c_org = next(data_iter)
+        except StopIteration:
+            data_iter = iter(celeba_loader)
+            x_real, c_org = next(data_iter)
+
+        x_real = x_real.to(device)
+        c_trg_list = create_labels(c_org, config.c_dim, 'CelebA', config.selected_attrs, device)
+
+        # Stack all target domains along the batch dimension.
+        J = len(c_trg_list)
+        c_rep = torch.cat(c_trg_list, dim=0)
+        with torch.no_grad():
+            gen_noattack, _ = G(x_real.repeat(J, 1, 1, 1), c_rep)
+
+        x_adv, pert = P(x_real)
+        gen, _ = G(x_adv.repeat(J, 1, 1, 1), c_rep)
+
+        # Same objective as the per-image attacks: push the output away from the clean translation.
+        loss = -criterion(gen, gen_noattack)
+
+        optimizer.zero_grad()
+        loss.backward()
+        optimizer.step()
+
+        if (i + 1) % config.log_step == 0:
+            et = time.time() - start_time
+            et = str(datetime.timedelta(seconds=et))[:-7]
+            print("Elapsed [{}], Iteration [{}/{}], P/loss: {:.4f}".format(et, i + 1, config.num_iters, loss.item()))
+
+        if (i + 1) % config.model_save_step == 0 or (i + 1) == config.num_iters:
+            P_path = os.path.join(config.pert_save_dir, '{}-P.ckpt'.format(i + 1))
+            torch.save(P.state_dict(), P_path)
+            print('Saved perturbation generator into {}...'.format(P_path))
+
+def test(config, G, P, device):
+    """Protect held-out images with one forward pass and measure disruption and latency."""
+    celeba_loader = get_loader(config.celeba_image_dir, config.attr_path, config.selected_attrs,
+                               config.celeba_crop_size, config.image_size, config.batch_size,
+                               'CelebA', 'test', config.num_workers)
+
+    P_path = os.path.join(config.pert_save_dir, '{}-P.ckpt'.format(config.num_iters))
+    P.load_state_dict(torch.load(P_path, map_location=lambda storage, loc: storage))
+    P.eval()
+
+    l2_error, protect_time = 0.0, 0.0
+    n_samples, n_dist, n_images = 0, 0, 0
+    with torch.no_grad():
+        for i, (x_real, c_org) in enumerate(celeba_loader):
+            x_real = x_real.to(device)
+            c_trg_list = create_labels(c_org, config.c_dim, 'CelebA', config.selected_attrs, device)
+
+            start_time = time.time()
+            x_adv, pert = P(x_real)
+            if device.type == 'cuda':
+                torch.cuda.synchronize()
+            protect_time += time.time() - start_time
+            n_images += x_real.size(0)
+
+            x_fake_list = [x_real, x_adv]
+            for c_trg in c_trg_list:
+                gen_noattack, _ = G(x_real, c_trg)
+                gen, _ = G(x_adv, c_trg)
+                x_fake_list.append(gen_noattack)
+                x_fake_list.append(gen)
+
+                l2_per_image = (gen - gen_noattack).pow(2).flatten(1).mean(1)
+                l2_error += l2_per_image.sum().item()
+                n_dist += int((l2_per_image > 0.05).sum())
+                n_samples += x_real.size(0)
+
+            if i < 50:
+                x_concat = torch.cat(x_fake_list, dim=3)
+                result_path = os.path.join(config.result_dir, '{}-images.jpg'.format(i + 1))
+                save_image(denorm(x_concat.data.cpu()), result_path, nrow=1, padding=0)
+
+    print('{} images. L2 error: {}. n_dist: {}. protection latency: {:.2f} ms/image'.format(
+        n_samples, l2_error / n_samples, float(n_dist) / n_samples, 1000 * protect_time / n_images))
+
+def main():
+    parser = argparse.ArgumentParser()
+
+    # Model configuration.
+    parser.add_argument('--c_dim', type=int, default=5, help='dimension of domain labels (1st dataset)')
+    parser.add_argument('--celeba_crop_size', type=int, default=178, help='crop size for the CelebA dataset')
+    parser.add_argument('--image_size', type=int, default=256, help='image resolution')
+    parser.add_argument('--g_conv_dim', type=int, default=64, help='number of conv filters in the first layer of G')
+    parser.add_argument('--g_repeat_num', type=int, default=6, help='number of residual blocks in G')
+    parser.add_argument('--p_conv_dim', type=int, default=32, help='number of conv filters in the first layer of P')
+    parser.add_argument('--p_repeat_num', type=int, default=2, help='number of residual blocks in P')
+    parser.add_argument('--space', type=str, default='linf', choices=['linf', 'lab'], help='perturbation space')
+    parser.add_argument('--epsilon', type=float, default=0.05, help='perturbation bound')
+
+    # Training configuration.
+    parser.add_argument('--batch_size', type=int, default=8, help='mini-batch size')
+    parser.add_argument('--num_iters', type=int, default=20000, help='number of training iterations for P')
+    parser.add_argument('--p_lr', type=float, default=0.0001, help='learning rate for P')
+    parser.add_argument('--beta1', type=float, default=0.5, help='beta1 for Adam optimizer')
+    parser.add_argument('--beta2', type=float, default=0.999, help='beta2 for Adam optimizer')
+    parser.add_argument('--test_iters', type=int, default=200000, help='StarGAN model step')
+    parser.add_argument('--selected_attrs', '--list', nargs='+', help='selected attributes for the CelebA dataset',
+                        default=['Black_Hair', 'Blond_Hair', 'Brown_Hair', 'Male', 'Young'])
+
+    parser.add_argument('--num_workers', type=int, default=0)
+    parser.add_argument('--mode', type=str, default='train', choices=['train', 'test'])
+    parser.add_argument('--log_step', type=int, default=10)
+    parser.add_argument('--model_save_step', type=int, default=1000)
+
+    parser.add_argument('--celeba_image_dir', type=str, default='/home/kjh/dev/capstone/disrupting-deepfakes/stargan/data/celeba/images')
+    parser.add_argument('--attr_path', type=str, default='/home/kjh/dev/capstone/disrupting-deepfakes/stargan/data/celeba/list_attr_celeba.txt')
+    parser.add_argument('--model_save_dir', type=str, default='/home/kjh/dev/capstone/disrupting-deepfakes/stargan/stargan_celeba_256/models')
+    parser.add_argument('--pert_save_dir', type=str, default='/home/kjh/dev/capstone/AntiForgery/pert_models')
+    parser.add_argument('--result_dir', type=str, default='/home/kjh/dev/capstone/AntiForgery/results_amortized')
+
+    config = parser.parse_args()
+    os.makedirs(config.result_dir, exist_ok=True)
+    os.makedirs(config.pert_save_dir, exist_ok=True)
+
+    device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+
+    # Frozen StarGAN generator.
+    G = Generator(config.g_conv_dim, config.c_dim, config.g_repeat_num).to(device)
+    print('Loading the trained models from step {}...'.format(config.test_iters))
+    G_path = os.path.join(config.model_save_dir, '{}-G.ckpt'.format(config.test_iters))
+    load_model_weights(G, G_path)
+    for p in G.parameters():
+        p.requires_grad = False
+
+    P = PerturbationGenerator(config.p_conv_dim, config.p_repeat_num, config.epsilon, config.space).to(device)
+
+    if config.mode == 'train':
+        train(config, G, P, device)
+    elif config.mode == 'test':
+        test(config, G, P, device)
+
+if __name__ == '__main__':
+    main()
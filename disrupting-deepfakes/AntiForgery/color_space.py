@@ -1,106 +1,103 @@
 import torch
 
-# Converts a Tensor into an image array (numpy)
-# |imtype|: the desired type of the converted numpy array
 # Color conversion code
-def rgb2xyz(rgb):  # rgb from [0,1]
-    # xyz_from_rgb = np.array([[0.412453, 0.357580, 0.180423],
-    # [0.212671, 0.715160, 0.072169],
-    # [0.019334, 0.119193, 0.950227]])
-
-    mask = (rgb > .04045).type(torch.FloatTensor)
-    if (rgb.is_cuda):
-        mask = mask.cuda()
-
-    rgb = (((rgb + .055) / 1.055) ** 2.4) * mask + rgb / 12.92 * (1 - mask)
-
-    x = .412453 * rgb[:, 0, :, :] + .357580 * rgb[:, 1, :, :] + .180423 * rgb[:, 2, :, :]
-    y = .212671 * rgb[:, 0, :, :] + .715160 * rgb[:, 1, :, :] + .072169 * rgb[:, 2, :, :]
-    z = .019334 * rgb[:, 0, :, :] + .119193 * rgb[:, 1, :, :] + .950227 * rgb[:, 2, :, :]
-    out = torch.cat((x[:, None, :, :], y[:, None, :, :], z[:, None, :, :]), dim=1)
+# All conversions take tensors with channels at dim -3 ([..., 3, H, W]), stay on the input device
+# and are differentiable. Linear steps are a single 3x3 einsum, piecewise steps use torch.where.
+
+_XYZ_FROM_RGB = ((.412453, .357580, .180423),
+                 (.212671, .715160, .072169),
+                 (.019334, .119193, .950227))
+
+_RGB_FROM_XYZ = ((3.24048134, -1.53715152, -0.49853633),
+                 (-0.96925495, 1.87599, .04155593),
+                 (.05564664, -.20404134, 1.05731107))
+
+# 0.95047, 1., 1.08883 # white
+_WHITE = (0.95047, 1., 1.08883)
+
+# f(x), f(y), f(z) -> L, a, b
+_LAB_FROM_F = ((0., 116., 0.),
+               (500., -500., 0.),
+               (0., 200., -200.))
+_LAB_OFFSET = (-16., 0., 0.)
+
+# L, a, b -> f(x), f(y), f(z)
+_F_FROM_LAB = ((1. / 116., 1. / 500., 0.),
+               (1. / 116., 0., 0.),
+               (1. / 116., 0., -1. / 200.))
+_F_OFFSET = (16. / 116., 16. / 116., 16. / 116.)
+_F_MIN = (-float('inf'), -float('inf'), 0.)
+
+# Normalization of rgb2lab/lab2rgb: L -> (L - 50) / 100, ab -> ab / 110
+_LAB_SCALE = (100., 110., 110.)
+_LAB_CENTER = (50., 0., 0.)
+
+# Normalization folded into the Lab matrices, so rgb2lab/lab2rgb need no extra elementwise pass.
+_LAB_RS_FROM_F = tuple(tuple(v / _LAB_SCALE[i] for v in row) for i, row in enumerate(_LAB_FROM_F))
+_LAB_RS_OFFSET = tuple((_LAB_OFFSET[i] - _LAB_CENTER[i]) / _LAB_SCALE[i] for i in range(3))
+_F_FROM_LAB_RS = tuple(tuple(v * _LAB_SCALE[j] for j, v in enumerate(row)) for row in _F_FROM_LAB)
+_F_RS_OFFSET = tuple(sum(v * _LAB_CENTER[j] for j, v in enumerate(row)) + _F_OFFSET[i]
+                     for i, row in enumerate(_F_FROM_LAB))
+
+_cache = {}
+
+def _const(name, value, ref):
+    """Constant tensor on the device and dtype of ref, created once per device and dtype."""
+    key = (name, ref.device, ref.dtype)
+    if key not in _cache:
+        _cache[key] = torch.tensor(value, dtype=ref.dtype, device=ref.device)
+    return _cache[key]
+
+def _channel(name, value, ref):
+    """Per-channel constant broadcastable against [..., 3, H, W]."""
+    return _const(name, value, ref)[:, None, None]
+
+def _matmul(name, mat, x):
+    return torch.einsum('ij,...jhw->...ihw', _const(name, mat, x), x)
 
-    # if(torch.sum(torch.isnan(out))>0):
-    # print('rgb2xyz')
-    # embed()
-    return out
+def rgb2xyz(rgb):  # rgb from [0,1]
+    # Clamping inside each branch keeps gradients finite where the branch is not selected.
+    rgb = torch.where(rgb > .04045,
+                      ((rgb.clamp(min=.04045) + .055) / 1.055) ** 2.4,
+                      rgb / 12.92)
+    return _matmul('xyz_from_rgb', _XYZ_FROM_RGB, rgb)
 
 def xyz2rgb(xyz):
-    # array([[ 3.24048134, -1.53715152, -0.49853633],
-    #        [-0.96925495,  1.87599   ,  0.04155593],
-    #        [ 0.05564664, -0.20404134,  1.05731107]])
-
-    r = 3.24048134 * xyz[:, 0, :, :] - 1.53715152 * xyz[:, 1, :, :] - 0.49853633 * xyz[:, 2, :, :]
-    g = -0.96925495 * xyz[:, 0, :, :] + 1.87599 * xyz[:, 1, :, :] + .04155593 * xyz[:, 2, :, :]
-    b = .05564664 * xyz[:, 0, :, :] - .20404134 * xyz[:, 1, :, :] + 1.05731107 * xyz[:, 2, :, :]
+    rgb = _matmul('rgb_from_xyz', _RGB_FROM_XYZ, xyz)
+    rgb = rgb.clamp(min=0)  # sometimes reaches a small negative number, which causes NaNs
 
-    rgb = torch.cat((r[:, None, :, :], g[:, None, :, :], b[:, None, :, :]), dim=1)
-    rgb = torch.max(rgb, torch.zeros_like(rgb))  # sometimes reaches a small negative number, which causes NaNs
+    return torch.where(rgb > .0031308,
+                       1.055 * (rgb.clamp(min=.0031308) ** (1. / 2.4)) - 0.055,
+                       12.92 * rgb)
 
-    mask = (rgb > .0031308).type(torch.FloatTensor)
-    if (rgb.is_cuda):
-        mask = mask.cuda()
+def _xyz2f(xyz):
+    xyz_scale = xyz / _channel('white', _WHITE, xyz)
+    return torch.where(xyz_scale > .008856,
+                       xyz_scale.clamp(min=.008856) ** (1 / 3.),
+                       7.787 * xyz_scale + 16. / 116.)
 
-    rgb = (1.055 * (rgb ** (1. / 2.4)) - 0.055) * mask + 12.92 * rgb * (1 - mask)
-
-    # if(torch.sum(torch.isnan(rgb))>0):
-    # print('xyz2rgb')
-    # embed()
-    return rgb
+def _f2xyz(f):
+    out = torch.where(f > .2068966,
+                      f ** 3.,
+                      (f - 16. / 116.) / 7.787)
+    return out * _channel('white', _WHITE, f)
 
 def xyz2lab(xyz):
-    # 0.95047, 1., 1.08883 # white
-    sc = torch.Tensor((0.95047, 1., 1.08883))[None, :, None, None]
-    if (xyz.is_cuda):
-        sc = sc.cuda()
-
-    xyz_scale = xyz / sc
+    lab = _matmul('lab_from_f', _LAB_FROM_F, _xyz2f(xyz))
+    return lab + _channel('lab_offset', _LAB_OFFSET, lab)
 
-    mask = (xyz_scale > .008856).type(torch.FloatTensor)
-    if (xyz_scale.is_cuda):
-        mask = mask.cuda()
-
-    xyz_int = xyz_scale ** (1 / 3.) * mask + (7.787 * xyz_scale + 16. / 116.) * (1 - mask)
-
-    L = 116. * xyz_int[:, 1, :, :] - 16.
-    a = 500. * (xyz_int[:, 0, :, :] - xyz_int[:, 1, :, :])
-    b = 200. * (xyz_int[:, 1, :, :] - xyz_int[:, 2, :, :])
-    out = torch.cat((L[:, None, :, :], a[:, None, :, :], b[:, None, :, :]), dim=1)
-
-    return out
+def _f2clamped(f):
+    # Only z is clamped at zero.
+    return torch.maximum(f, _channel('f_min', _F_MIN, f))
 
 def lab2xyz(lab):
-    y_int = (lab[:, 0, :, :] + 16.) / 116.
-    x_int = (lab[:, 1, :, :] / 500.) + y_int
-    z_int = y_int - (lab[:, 2, :, :] / 200.)
-    if (z_int.is_cuda):
-        z_int = torch.max(torch.Tensor((0,)).cuda(), z_int)
-    else:
-        z_int = torch.max(torch.Tensor((0,)), z_int)
-
-    out = torch.cat((x_int[:, None, :, :], y_int[:, None, :, :], z_int[:, None, :, :]), dim=1)
-    mask = (out > .2068966).type(torch.FloatTensor)
-    if (out.is_cuda):
-        mask = mask.cuda()
-
-    out = (out ** 3.) * mask + (out - 16. / 116.) / 7.787 * (1 - mask)
-
-    sc = torch.Tensor((0.95047, 1., 1.08883))[None, :, None, None]
-    sc = sc.to(out.device)
-
-    out = out * sc
-    return out
+    f = _matmul('f_from_lab', _F_FROM_LAB, lab) + _channel('f_offset', _F_OFFSET, lab)
+    return _f2xyz(_f2clamped(f))
 
 def rgb2lab(rgb):
-    lab = xyz2lab(rgb2xyz(rgb))
-    l_rs = (lab[:, [0], :, :] - 50.) / 100.
-    ab_rs = lab[:, 1:, :, :] / 110.
-    out = torch.cat((l_rs, ab_rs), dim=1)
-    return out
+    lab_rs = _matmul('lab_rs_from_f', _LAB_RS_FROM_F, _xyz2f(rgb2xyz(rgb)))
+    return lab_rs + _channel('lab_rs_offset', _LAB_RS_OFFSET, lab_rs)
 
 def lab2rgb(lab_rs, opt=None):
-    # l = lab_rs[:,[0],:,:]*opt.l_norm + opt.l_cent
-    l = lab_rs[:, [0], :, :] * 100. + 50.
-    ab = lab_rs[:, 1:, :, :] * 110.
-    lab = torch.cat((l, ab), dim=1)
-    out = xyz2rgb(lab2xyz(lab))
-    return out
\ No newline at end of file
+    f = _matmul('f_from_lab_rs', _F_FROM_LAB_RS, lab_rs) + _channel('f_rs_offset', _F_RS_OFFSET, lab_rs)
+    return xyz2rgb(_f2xyz(_f2clamped(f)))
@@ -0,0 +1,52 @@
+import argparse
+import time
+import torch
+
+from color_space import rgb2lab, lab2rgb
+
+def bench(fn, iters, device):
+    """Average wall time of fn in milliseconds, after one warm-up call."""
+    fn()
+    if device.type == 'cuda':
+        torch.cuda.synchronize()
+    start_time = time.time()
+    for i in range(iters):
+        fn()
+    if device.type == 'cuda':
+        torch.cuda.synchronize()
+    return 1000 * (time.time() - start_time) / iters
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--device', type=str, default='cuda' if torch.cuda.is_available() else 'cpu')
+    parser.add_argument('--batch_sizes', type=int, nargs='+', default=[1, 8])
+    parser.add_argument('--image_sizes', type=int, nargs='+', default=[128, 256])
+    parser.add_argument('--iters', type=int, default=50)
+    config = parser.parse_args()
+
+    device = torch.device(config.device)
+
+    for batch_size in config.batch_sizes:
+        for image_size in config.image_sizes:
+            rgb = torch.rand(batch_size, 3, image_size, image_size, device=device)
+
+            def forward():
+                with torch.no_grad():
+                    lab2rgb(rgb2lab(rgb))
+
+            # Same pattern as one Lab attack iteration: perturb a/b, convert back, backprop.
+            def forward_backward():
+                pert = torch.zeros(batch_size, 2, image_size, image_size, device=device, requires_grad=True)
+                lab = rgb2lab(rgb)
+                out = lab2rgb(torch.cat((lab[:, :1], lab[:, 1:] + pert), dim=1))
+                out.sum().backward()
+
+            with torch.no_grad():
+                err = (lab2rgb(rgb2lab(rgb)) - rgb).abs().max().item()
+
+            print('device {} batch {} size {}: roundtrip {:.3f} ms, roundtrip+backward {:.3f} ms, max error {:.2e}'.format(
+                device, batch_size, image_size, bench(forward, config.iters, device),
+                bench(forward_backward, config.iters, device), err))
+
+if __name__ == '__main__':
+    main()
@@ -55,11 +55,13 @@ def main():
                                config.celeba_crop_size, config.image_size, config.batch_size,
                                'CelebA', config.mode, config.num_workers)
 
+    device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+
     # starganconfig.
     G = Generator(config.g_conv_dim, config.c_dim, config.g_repeat_num)
     D = Discriminator(config.image_size, config.d_conv_dim, config.c_dim, config.d_repeat_num)
-    G.cuda()
-    D.cuda()
+    G.to(device)
+    D.to(device)
     # load weights
     print('Loading the trained models from step {}...'.format(config.resume_iters))
     G_path = os.path.join(config.model_save_dir, '{}-G.ckpt'.format(config.resume_iters))
@@ -72,8 +74,8 @@ def main():
     n_samples, n_dist = 0, 0
     for i, (x_real, c_org) in enumerate(celeba_loader):
         # Prepare input images and target domain labels.
-        x_real = x_real.cuda()
-        c_trg_list = create_labels(c_org, config.c_dim, 'CelebA', config.selected_attrs)
+        x_real = x_real.to(device)
+        c_trg_list = create_labels(c_org, config.c_dim, 'CelebA', config.selected_attrs, device)
 
         x_fake_list = [x_real]
 
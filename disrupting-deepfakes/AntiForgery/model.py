@@ -4,6 +4,8 @@ import torch.nn.functional as F
 import numpy as np
 import sys
 
+from color_space import rgb2lab, lab2rgb
+
 
 class ResidualBlock(nn.Module):
     """Residual Block with instance normalization."""
@@ -163,6 +165,69 @@ class AvgBlurGenerator(nn.Module):
         return self.main(x), x[:,:3]
 
 
+class PerturbationResidualBlock(nn.Module):
+    """Residual Block with instance normalization that always uses the statistics of the current image."""
+    def __init__(self, dim_in, dim_out):
+        super(PerturbationResidualBlock, self).__init__()
+        self.main = nn.Sequential(
+            nn.Conv2d(dim_in, dim_out, kernel_size=3, stride=1, padding=1, bias=False),
+            nn.InstanceNorm2d(dim_out, affine=True, track_running_stats=False),
+            nn.ReLU(inplace=True),
+            nn.Conv2d(dim_out, dim_out, kernel_size=3, stride=1, padding=1, bias=False),
+            nn.InstanceNorm2d(dim_out, affine=True, track_running_stats=False))
+
+    def forward(self, x):
+        return x + self.main(x)
+
+
+class PerturbationGenerator(nn.Module):
+    """Perturbation generator network. Protects an image with a single forward pass."""
+    def __init__(self, conv_dim=32, repeat_num=2, epsilon=0.05, space='linf'):
+        super(PerturbationGenerator, self).__init__()
+        self.epsilon = epsilon
+        self.space = space
+
+        # L_inf perturbs all RGB channels, Lab perturbs only the a/b chroma channels.
+        out_dim = 3 if space == 'linf' else 2
+
+        layers = []
+        layers.append(nn.Conv2d(3, conv_dim, kernel_size=3, stride=1, padding=1, bias=False))
+        layers.append(nn.InstanceNorm2d(conv_dim, affine=True))
+        layers.append(nn.ReLU(inplace=True))
+
+        # Down-sampling layer.
+        layers.append(nn.Conv2d(conv_dim, conv_dim*2, kernel_size=4, stride=2, padding=1, bias=False))
+        layers.append(nn.InstanceNorm2d(conv_dim*2, affine=True))
+        layers.append(nn.ReLU(inplace=True))
+
+        # Bottleneck layers.
+        for i in range(repeat_num):
+            layers.append(PerturbationResidualBlock(dim_in=conv_dim*2, dim_out=conv_dim*2))
+
+        # Up-sampling layer.
+        layers.append(nn.ConvTranspose2d(conv_dim*2, conv_dim, kernel_size=4, stride=2, padding=1, bias=False))
+        layers.append(nn.InstanceNorm2d(conv_dim, affine=True))
+        layers.append(nn.ReLU(inplace=True))
+
+        layers.append(nn.Conv2d(conv_dim, out_dim, kernel_size=3, stride=1, padding=1, bias=False))
+        layers.append(nn.Tanh())
+        self.main = nn.Sequential(*layers)
+
+    def forward(self, x):
+        """Input in [-1, 1]. Returns the protected image in [-1, 1] and the perturbation."""
+        # Tanh bounds the perturbation by epsilon without any projection step.
+        pert = self.epsilon * self.main(x)
+
+        if self.space == 'linf':
+            x_adv = torch.clamp(x + pert, min=-1, max=1)
+        else:
+            x_lab = rgb2lab(torch.clamp((x + 1) / 2, min=0, max=1))
+            x_lab = torch.cat([x_lab[:, :1], x_lab[:, 1:] + pert], dim=1)
+            x_adv = torch.clamp(lab2rgb(x_lab), min=0, max=1) * 2 - 1
+
+        return x_adv, pert
+
+
 def avg_smoothing_filter(channels, kernel_size):
     kernel = torch.ones((channels, 1, kernel_size, kernel_size)) / (kernel_size * kernel_size)
     return kernel
\ No newline at end of file
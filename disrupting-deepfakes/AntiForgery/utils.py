@@ -30,7 +30,7 @@ def label2onehot(labels, dim):
     out[np.arange(batch_size), labels.long()] = 1
     return out
 
-def create_labels(c_org, c_dim=5, dataset='CelebA', selected_attrs=None):
+def create_labels(c_org, c_dim=5, dataset='CelebA', selected_attrs=None, device='cuda'):
     """Generate target domain labels for debugging and testing."""
     # Get hair color indices.
     if dataset == 'CelebA':
@@ -53,7 +53,7 @@ def create_labels(c_org, c_dim=5, dataset='CelebA', selected_attrs=None):
         elif dataset == 'RaFD':
             c_trg = label2onehot(torch.ones(c_org.size(0)) * i, c_dim)
 
-        c_trg_list.append(c_trg.cuda())
+        c_trg_list.append(c_trg.to(device))
     return c_trg_list
 
 def random_transform(img):
@@ -84,36 +84,46 @@ def compare(img1,img2):
 
     return ssim, psnr
 
-def lab_attack(X_nat, c_trg, model, epsilon=0.05, iter = 100):
+def lab_perturb(X_lab, pert_a, epsilon=0.05):
+    """Add a clamped a/b perturbation to a Lab image and return the normalized RGB input in [-1, 1]."""
+    pert = torch.clamp(pert_a, min=-epsilon, max=epsilon)
+    X_lab_adv = torch.cat((X_lab[:, :1, :, :], X_lab[:, 1:, :, :] + pert), dim=1)
+    return (lab2rgb(X_lab_adv) - 0.5) / 0.5
 
-    criterion = nn.MSELoss().cuda()
-    pert_a = torch.zeros(X_nat.shape[0], 2, X_nat.shape[2], X_nat.shape[3]).cuda().requires_grad_()
+def lab_attack(X_nat, c_trg, model, epsilon=0.05, iter = 100):
+    """
+    Lab-space attack on the a/b channels, cycling through the target domains: iteration i attacks domain i % len(c_trg).
+    The clean translations of all domains are computed once in one batch, and everything stays on the device of X_nat.
+    """
+    criterion = nn.MSELoss()
+    J = len(c_trg)
 
-    optimizer = torch.optim.Adam([pert_a], lr=1e-4, betas=(0.9, 0.999))
+    # The clean translations and the clean Lab image do not change across iterations.
+    with torch.no_grad():
+        gen_noattack, gen_feats_noattack = model(X_nat.repeat(J, 1, 1, 1), torch.cat(c_trg, dim=0))
+        gen_noattack = gen_noattack.chunk(J, dim=0)
+        X_lab = rgb2lab(denorm(X_nat.clone()))
 
-    r = torch.ones_like(pert_a)
+    pert_a = torch.zeros(X_nat.shape[0], 2, X_nat.shape[2], X_nat.shape[3], device=X_nat.device).requires_grad_()
 
-    X = denorm(X_nat.clone())
+    optimizer = torch.optim.Adam([pert_a], lr=1e-4, betas=(0.9, 0.999))
 
     for i in range(iter):
-        X_lab = rgb2lab(X).cuda()
-        pert = torch.clamp(pert_a, min=-epsilon, max=epsilon)
-        X_lab[:, 1:, :, :] = X_lab[:, 1:, :, :] + pert
-        X_new = T.Normalize(mean=[0.5, 0.5, 0.5], std=[0.5, 0.5, 0.5])(lab2rgb(X_lab))
+        X_new = lab_perturb(X_lab, pert_a, epsilon)
 
         #X_new = random_transform(X_new)
 
-        with torch.no_grad():
-            gen_noattack, gen_feats_noattack = model(X_nat, c_trg[i%len(c_trg)])
-
-        gen_stargan, gen_feats_stargan = model(X_new, c_trg[i%5])
+        gen_stargan, gen_feats_stargan = model(X_new, c_trg[i % J])
 
-        loss = -criterion(gen_stargan, gen_noattack)
+        loss = -criterion(gen_stargan, gen_noattack[i % J])
 
         optimizer.zero_grad()
         loss.backward()
         optimizer.step()
 
-    return X_new, X_new - X
+    with torch.no_grad():
+        X_new = lab_perturb(X_lab, pert_a, epsilon)
+
+    return X_new, X_new - X_nat
 
 
@@ -294,6 +294,76 @@ class LinfPGDAttack(object):
 
         return X, eta
 
+class UniversalPGDAttack(object):
+    def __init__(self, model=None, device=None, epsilon=0.05, a=0.005, num_perturbs=1, image_size=128):
+        """
+        Universal (image-agnostic) attack
+        epsilon: magnitude of attack
+        a: step size
+        num_perturbs: number of universal perturbations in the set
+        """
+        self.model = model
+        self.epsilon = epsilon
+        self.a = a
+        self.loss_fn = nn.MSELoss().to(device)
+        self.device = device
+        self.num_perturbs = num_perturbs
+
+        # One perturbation per set member, shared by every image
+        self.deltas = torch.tensor(np.random.uniform(-self.epsilon, self.epsilon,
+            (num_perturbs, 3, image_size, image_size)).astype('float32')).to(self.device)
+        self.step = 0
+
+    def train_step(self, X_nat, c_trg):
+        """
+        One sign-gradient step of a single set member on a minibatch, jointly over all target domains.
+        Members are updated round-robin so that each one sees different minibatches.
+        """
+        idx = self.step % self.num_perturbs
+        J = len(c_trg)
+
+        # Stack the domains along the batch dimension so each step is a single forward/backward
+        X_rep = X_nat.repeat(J, 1, 1, 1)
+        c_rep = torch.cat(c_trg, dim=0)
+
+        with torch.no_grad():
+            y, _ = self.model(X_rep, c_rep)
+
+        delta = self.deltas[idx].clone().requires_grad_()
+        X = torch.clamp(X_rep + delta, min=-1, max=1)
+        output, feats = self.model(X, c_rep)
+
+        self.model.zero_grad()
+        loss = self.loss_fn(output, y)
+        loss.backward()
+
+        delta_adv = delta.detach() + self.a * delta.grad.sign()
+        self.deltas[idx] = torch.clamp(delta_adv, min=-self.epsilon, max=self.epsilon)
+        self.step += 1
+
+        return loss.item()
+
+    def perturb(self, X_nat, idx=None):
+        """
+        Protect a batch with a single addition. Without idx, every image draws a random set member.
+        """
+        if idx is None:
+            idx = torch.randint(self.num_perturbs, (X_nat.size(0),), device=self.deltas.device)
+        eta = self.deltas[idx]
+        X = torch.clamp(X_nat + eta, min=-1, max=1)
+
+        return X, X - X_nat
+
+    def save(self, path):
+        torch.save({'deltas': self.deltas.cpu(), 'epsilon': self.epsilon, 'step': self.step}, path)
+
+    def load(self, path):
+        state = torch.load(path, map_location=lambda storage, loc: storage)
+        self.deltas = state['deltas'].to(self.device)
+        self.num_perturbs = self.deltas.size(0)
+        self.epsilon = state['epsilon']
+        self.step = state['step']
+
 def clip_tensor(X, Y, Z):
     # Clip X with Y min and Z max
     X_np = X.data.cpu().numpy()
@@ -26,14 +26,17 @@ def main(config):
     celeba_loader = None
     rafd_loader = None
 
+    # Universal perturbations are trained on the train split and evaluated on held-out images.
+    loader_mode = 'train' if config.mode in ['train', 'train_universal'] else 'test'
+
     if config.dataset in ['CelebA', 'Both']:
         celeba_loader = get_loader(config.celeba_image_dir, config.attr_path, config.selected_attrs,
                                    config.celeba_crop_size, config.image_size, config.batch_size,
-                                   'CelebA', config.mode, config.num_workers)
+                                   'CelebA', loader_mode, config.num_workers)
     if config.dataset in ['RaFD', 'Both']:
         rafd_loader = get_loader(config.rafd_image_dir, None, None,
                                  config.rafd_crop_size, config.image_size, config.batch_size,
-                                 'RaFD', config.mode, config.num_workers)
+                                 'RaFD', loader_mode, config.num_workers)
     
 
     # Solver for training and testing StarGAN.
@@ -61,6 +64,10 @@ def main(config):
             # solver.test_attack_cond()
         elif config.dataset in ['Both']:
             solver.test_multi()
+    elif config.mode == 'train_universal':
+        solver.train_universal()
+    elif config.mode == 'test_universal':
+        solver.test_universal()
 
 
 if __name__ == '__main__':
@@ -97,9 +104,15 @@ if __name__ == '__main__':
     # Test configuration.
     parser.add_argument('--test_iters', type=int, default=200000, help='test model from this step')
 
+    # Universal perturbation configuration.
+    parser.add_argument('--universal_epsilon', type=float, default=0.05, help='L_inf bound of the universal perturbations')
+    parser.add_argument('--universal_step', type=float, default=0.005, help='step size for universal perturbation training')
+    parser.add_argument('--universal_num', type=int, default=1, help='number of universal perturbations in the set')
+    parser.add_argument('--universal_iters', type=int, default=10000, help='number of minibatch updates for universal perturbations')
+
     # Miscellaneous.
     parser.add_argument('--num_workers', type=int, default=1)
-    parser.add_argument('--mode', type=str, default='train', choices=['train', 'test'])
+    parser.add_argument('--mode', type=str, default='train', choices=['train', 'test', 'train_universal', 'test_universal'])
     parser.add_argument('--use_tensorboard', type=str2bool, default=False)
 
     # Directories.
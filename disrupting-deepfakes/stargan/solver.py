@@ -59,6 +59,12 @@ class Solver(object):
         # Test configurations.
         self.test_iters = config.test_iters
 
+        # Universal perturbation configurations.
+        self.universal_epsilon = config.universal_epsilon
+        self.universal_step = config.universal_step
+        self.universal_num = config.universal_num
+        self.universal_iters = config.universal_iters
+
         # Miscellaneous.
         self.use_tensorboard = config.use_tensorboard
         self.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
@@ -1022,37 +1028,37 @@ class Solver(object):
 
         # Mapping of feature layers to indices
         layer_dict = {0: 2, 1: 5, 2: 8, 3: 9, 4: 10, 5: 11, 6: 12, 7: 13, 8: 14, 9: 17, 10: 20, 11: None}
+        num_layers = len(layer_dict)    # 11 layers + output
 
-        for layer_num_orig in range(12):    # 11 layers + output
-            # Load the trained generator.
-            self.restore_model(self.test_iters)
-            
-            # Set data loader.
-            if self.dataset == 'CelebA':
-                data_loader = self.celeba_loader
-            elif self.dataset == 'RaFD':
-                data_loader = self.rafd_loader
+        # Load the trained generator.
+        self.restore_model(self.test_iters)
+        
+        # Set data loader.
+        if self.dataset == 'CelebA':
+            data_loader = self.celeba_loader
+        elif self.dataset == 'RaFD':
+            data_loader = self.rafd_loader
 
-            # Initialize Metrics
-            l1_error, l2_error, min_dist, l0_error = 0.0, 0.0, 0.0, 0.0
-            n_dist, n_samples = 0, 0
+        # Initialize Metrics (one entry per layer)
+        l1_error, l2_error, min_dist, l0_error = [[0.0] * num_layers for _ in range(4)]
+        n_dist, n_samples = [0] * num_layers, [0] * num_layers
 
-            print('Layer', layer_num_orig)
-
-            for i, (x_real, c_org) in enumerate(data_loader):
-                # Prepare input images and target domain labels.
-                x_real = x_real.to(self.device)
-                c_trg_list = self.create_labels(c_org, self.c_dim, self.dataset, self.selected_attrs)
+        # Each image is loaded once and its clean forward is shared by every layer.
+        for i, (x_real, c_org) in enumerate(data_loader):
+            # Prepare input images and target domain labels.
+            x_real = x_real.to(self.device)
+            c_trg_list = self.create_labels(c_org, self.c_dim, self.dataset, self.selected_attrs)
 
-                layer_num = layer_dict[layer_num_orig]  # get layer number
-                pgd_attack = attacks.LinfPGDAttack(model=self.G, device=self.device, feat=layer_num)
+            # Translate images.
+            x_fake_lists = [[x_real] for _ in range(num_layers)]
 
-                # Translate images.
-                x_fake_list = [x_real]
+            for c_trg in c_trg_list:
+                with torch.no_grad():
+                    gen_noattack, gen_noattack_feats = self.G(x_real, c_trg)
 
-                for c_trg in c_trg_list:
-                    with torch.no_grad():
-                        gen_noattack, gen_noattack_feats = self.G(x_real, c_trg)
+                for layer_num_orig in range(num_layers):
+                    layer_num = layer_dict[layer_num_orig]  # get layer number
+                    pgd_attack = attacks.LinfPGDAttack(model=self.G, device=self.device, feat=layer_num)
 
                     # Attack
                     if layer_num == None:
@@ -1067,27 +1073,32 @@ class Solver(object):
                         gen, gen_feats = self.G(x_adv, c_trg)
 
                         # Add to lists
-                        x_fake_list.append(x_adv)
-                        x_fake_list.append(gen)
+                        x_fake_lists[layer_num_orig].append(x_adv)
+                        x_fake_lists[layer_num_orig].append(gen)
 
-                        l1_error += F.l1_loss(gen, gen_noattack)
-                        l2_error += F.mse_loss(gen, gen_noattack)
-                        l0_error += (gen - gen_noattack).norm(0)
-                        min_dist += (gen - gen_noattack).norm(float('-inf'))
+                        l1_error[layer_num_orig] += F.l1_loss(gen, gen_noattack)
+                        l2_error[layer_num_orig] += F.mse_loss(gen, gen_noattack)
+                        l0_error[layer_num_orig] += (gen - gen_noattack).norm(0)
+                        min_dist[layer_num_orig] += (gen - gen_noattack).norm(float('-inf'))
                         if F.mse_loss(gen, gen_noattack) > 0.05:
-                            n_dist += 1
-                        n_samples += 1
+                            n_dist[layer_num_orig] += 1
+                        n_samples[layer_num_orig] += 1
 
-                # Save the translated images.
-                x_concat = torch.cat(x_fake_list, dim=3)
+            # Save the translated images.
+            for layer_num_orig in range(num_layers):
+                x_concat = torch.cat(x_fake_lists[layer_num_orig], dim=3)
                 result_path = os.path.join(self.result_dir, '{}-{}-images.jpg'.format(layer_num_orig, i+1))
                 save_image(self.denorm(x_concat.data.cpu()), result_path, nrow=1, padding=0)
-                if i == 49:
-                    break
-            
-            # Print metrics
-            print('{} images. L1 error: {}. L2 error: {}. prop_dist: {}. L0 error: {}. L_-inf error: {}.'.format(n_samples, 
-            l1_error / n_samples, l2_error / n_samples, float(n_dist) / n_samples, l0_error / n_samples, min_dist / n_samples))
+            if i == 49:
+                break
+        
+        # Print metrics
+        for layer_num_orig in range(num_layers):
+            print('Layer', layer_num_orig)
+            print('{} images. L1 error: {}. L2 error: {}. prop_dist: {}. L0 error: {}. L_-inf error: {}.'.format(n_samples[layer_num_orig], 
+            l1_error[layer_num_orig] / n_samples[layer_num_orig], l2_error[layer_num_orig] / n_samples[layer_num_orig],
+            float(n_dist[layer_num_orig]) / n_samples[layer_num_orig], l0_error[layer_num_orig] / n_samples[layer_num_orig],
+            min_dist[layer_num_orig] / n_samples[layer_num_orig]))
 
     def test_attack_cond(self):
         """Class conditional transfer"""
@@ -1164,6 +1175,107 @@ class Solver(object):
         print('{} images. L1 error: {}. L2 error: {}. prop_dist: {}. L0 error: {}. L_-inf error: {}.'.format(n_samples, 
         l1_error / n_samples, l2_error / n_samples, float(n_dist) / n_samples, l0_error / n_samples, min_dist / n_samples))
 
+    def train_universal(self):
+        """Train a set of universal (image-agnostic) perturbations against a trained generator."""
+        # Load the trained generator. Only the perturbations are optimized.
+        self.restore_model(self.test_iters)
+        for p in self.G.parameters():
+            p.requires_grad = False
+
+        # Set data loader.
+        if self.dataset == 'CelebA':
+            data_loader = self.celeba_loader
+        elif self.dataset == 'RaFD':
+            data_loader = self.rafd_loader
+
+        universal_attack = attacks.UniversalPGDAttack(model=self.G, device=self.device, epsilon=self.universal_epsilon,
+                                                      a=self.universal_step, num_perturbs=self.universal_num,
+                                                      image_size=self.image_size)
+
+        # Start training.
+        print('Start training universal perturbations...')
+        data_iter = iter(data_loader)
+        start_time = time.time()
+        for i in range(self.universal_iters):
+            # Fetch real images and labels.
+            try:
+                x_real, c_org = next(data_iter)
+            except:
+                data_iter = iter(data_loader)
+                x_real, c_org = next(data_iter)
+
+            x_real = x_real.to(self.device)
+            c_trg_list = self.create_labels(c_org, self.c_dim, self.dataset, self.selected_attrs)
+
+            loss = universal_attack.train_step(x_real, c_trg_list)
+
+            # Print out training information.
+            if (i+1) % self.log_step == 0:
+                et = time.time() - start_time
+                et = str(datetime.timedelta(seconds=et))[:-7]
+                print("Elapsed [{}], Iteration [{}/{}], U/loss: {:.4f}".format(et, i+1, self.universal_iters, loss))
+
+            # Save perturbation checkpoints.
+            if (i+1) % self.model_save_step == 0 or (i+1) == self.universal_iters:
+                U_path = os.path.join(self.model_save_dir, '{}-U.ckpt'.format(i+1))
+                universal_attack.save(U_path)
+                print('Saved universal perturbations into {}...'.format(U_path))
+
+    def test_universal(self):
+        """Disruption of held-out images by trained universal perturbations."""
+        # Load the trained generator and perturbations.
+        self.restore_model(self.test_iters)
+
+        # Set data loader.
+        if self.dataset == 'CelebA':
+            data_loader = self.celeba_loader
+        elif self.dataset == 'RaFD':
+            data_loader = self.rafd_loader
+
+        universal_attack = attacks.UniversalPGDAttack(model=self.G, device=self.device, image_size=self.image_size)
+        U_path = os.path.join(self.model_save_dir, '{}-U.ckpt'.format(self.universal_iters))
+        universal_attack.load(U_path)
+
+        # Initialize Metrics
+        l1_error, l2_error, min_dist, l0_error = 0.0, 0.0, 0.0, 0.0
+        n_dist, n_samples = 0, 0
+
+        with torch.no_grad():
+            for i, (x_real, c_org) in enumerate(data_loader):
+                # Prepare input images and target domain labels.
+                x_real = x_real.to(self.device)
+                c_trg_list = self.create_labels(c_org, self.c_dim, self.dataset, self.selected_attrs)
+
+                # Protection is a single addition.
+                x_adv, perturb = universal_attack.perturb(x_real)
+
+                # Translated images.
+                x_fake_list = [x_real, x_adv]
+
+                for c_trg in c_trg_list:
+                    gen_noattack, _ = self.G(x_real, c_trg)
+                    gen, _ = self.G(x_adv, c_trg)
+                    x_fake_list.append(gen)
+
+                    # Per-image errors so that disruption is counted per image for any batch size.
+                    l2_per_image = (gen - gen_noattack).pow(2).flatten(1).mean(1)
+                    l1_error += (gen - gen_noattack).abs().flatten(1).mean(1).sum()
+                    l2_error += l2_per_image.sum()
+                    l0_error += (gen - gen_noattack).flatten(1).norm(0, dim=1).sum()
+                    min_dist += (gen - gen_noattack).flatten(1).abs().min(1)[0].sum()
+                    n_dist += int((l2_per_image > 0.05).sum())
+                    n_samples += x_real.size(0)
+
+                # Save the translated images.
+                if i < 50:
+                    x_concat = torch.cat(x_fake_list, dim=3)
+                    result_path = os.path.join(self.result_dir, '{}-universal-images.jpg'.format(i+1))
+                    save_image(self.denorm(x_concat.data.cpu()), result_path, nrow=1, padding=0)
+
+        # Print metrics
+        print('{} images. L1 error: {}. L2 error: {}. prop_dist: {}. L0 error: {}. L_-inf error: {}.'.format(n_samples, 
+        l1_error / n_samples, l2_error / n_samples, float(n_dist) / n_samples, l0_error / n_samples, min_dist / n_samples))
+
     def test_multi(self):
         """Translate images using StarGAN trained on multiple datasets."""
         # Load the trained generator.
@@ -0,0 +1,155 @@
+from flask import Flask, request, jsonify
+import os
+import sys
+import time
+import queue
+import argparse
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import numpy as np
+import torch
+from PIL import Image
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(BASE_DIR, '../CYBORG/testing_code'))
+
+from detector import build_model, get_transform
+
+app = Flask(__name__)
+
+
+class MicroBatcher:
+    """
+    Groups concurrent requests into batches and scores every batch with all resident models at once.
+    A batch is started as soon as max_batch images are queued or max_wait_ms after its first image,
+    and the models run concurrently on a thread pool (torch releases the GIL in its kernels).
+    """
+
+    def __init__(self, models, device, max_batch=32, max_wait_ms=5):
+        self.models = models
+        self.device = device
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.requests = queue.Queue()
+        self.pool = ThreadPoolExecutor(max_workers=len(models))
+        self.worker = threading.Thread(target=self.run, daemon=True)
+        self.worker.start()
+
+    def submit(self, inputs):
+        """inputs: {model name: [3, H, W] tensor}. Returns a Future of {model name: P(Synthetic)}."""
+        future = Future()
+        self.requests.put((inputs, future))
+        return future
+
+    def collect(self):
+        batch = [self.requests.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self.requests.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return batch
+
+    def score(self, name, batch):
+        images = torch.stack([inputs[name] for inputs, _ in batch]).to(self.device, non_blocking=True)
+        with torch.inference_mode():
+            return torch.sigmoid(self.models[name](images))[:, 1].float().cpu().tolist()
+
+    def run(self):
+        while True:
+            batch = self.collect()
+            try:
+                jobs = {name: self.pool.submit(self.score, name, batch) for name in self.models}
+                scores = {name: job.result() for name, job in jobs.items()}
+                for i, (_, future) in enumerate(batch):
+                    future.set_result({name: scores[name][i] for name in self.models})
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+
+
+def load_models(specs, device):
+    """Models from 'network:checkpoint' specs, named by network (with a suffix for repeated networks)."""
+    global models, transforms, batcher
+    models, transforms = {}, {}
+    for spec in specs:
+        network, modelPath = spec.split(':', 1)
+        name = network
+        i = 1
+        while name in models:
+            i += 1
+            name = network + '_' + str(i)
+        models[name] = build_model(network, modelPath, device)
+        transforms[name] = get_transform(network)
+        print(f"Model loaded: {name} - {modelPath}")
+
+    # Warm-up so that the first request does not pay for lazy initialization
+    for name, model in models.items():
+        example = transforms[name](Image.new('RGB', (256, 256)))
+        with torch.inference_mode():
+            model(example.unsqueeze(0).to(device))
+
+    batcher = MicroBatcher(models, device, config.max_batch, config.max_wait_ms)
+
+
+latencies = deque(maxlen=1000)
+
+
+@app.route('/detect', methods=['POST'])
+def detect():
+    start_time = time.perf_counter()
+    files = request.files.getlist('image')
+    if not files:
+        return jsonify({'error': 'No image uploaded, use the "image" form field'}), 400
+
+    futures = []
+    for f in files:
+        try:
+            image = Image.open(f.stream).convert('RGB')
+        except Exception as e:
+            return jsonify({'error': 'Could not decode ' + f.filename, 'details': str(e)}), 400
+        futures.append(batcher.submit({name: transform(image) for name, transform in transforms.items()}))
+
+    results = []
+    for f, future in zip(files, futures):
+        scores = future.result()
+        ensemble = float(np.mean(list(scores.values())))
+        results.append({
+            'filename': f.filename,
+            'scores': scores,
+            'ensemble': ensemble,
+            'verdict': 'Synthetic' if ensemble > config.threshold else 'Real',
+        })
+
+    latency = 1000 * (time.perf_counter() - start_time)
+    latencies.append(latency)
+    return jsonify({'results': results, 'latency_ms': latency})
+
+
+@app.route('/health', methods=['GET'])
+def health():
+    stats = {}
+    if latencies:
+        stats = {'p50_ms': float(np.percentile(latencies, 50)), 'p95_ms': float(np.percentile(latencies, 95))}
+    return jsonify({'models': list(models.keys()), 'requests': len(latencies), **stats})
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--models', nargs='+', default=['densenet:../CYBORG/local_results/final_model.pth'],
+                        help='network:checkpoint pairs kept resident, e.g. densenet:a.pth xception:b.pth')
+    parser.add_argument('--device', type=str, default='cuda' if torch.cuda.is_available() else 'cpu')
+    parser.add_argument('--max_batch', type=int, default=32, help='maximum images per micro-batch')
+    parser.add_argument('--max_wait_ms', type=float, default=5, help='time a micro-batch waits for more requests')
+    parser.add_argument('--threshold', type=float, default=0.5)
+    parser.add_argument('--port', type=int, default=8000)
+    config = parser.parse_args()
+
+    load_models(config.models, torch.device(config.device))
+    app.run(host='0.0.0.0', port=config.port, threaded=True)
@@ -34,6 +34,11 @@ def main(args):
     target_img = target_img.unsqueeze(0)  # (1, C, H, W)
     target_features = lpips_model(target_img, resize_images=False, return_lpips=True)
 
+    # 생성기는 한 번만 로딩 (변환된 FP32 생성기는 캐시에서 언피클링 없이 mmap으로 로딩)
+    print(f"[INFO] Loading network: {args.network}")
+    from legacy import load_generator
+    G = load_generator(args.network, device)
+
     best_dist = float('inf')
     best_w = None
     w_list = []
@@ -49,17 +54,6 @@ def main(args):
                 w = torch.tensor(data['w'], device=device, dtype=torch.float32)
                 w_list.append(w)
 
-                # 이미지 생성은 하지 않고 LPIPS 특성으로 거리 계산
-                from training.networks import Generator
-                from legacy import load_network_pkl
-                with dnnlib_util.open_url(args.network) as f:
-                    net = load_network_pkl(f)['G_ema']
-                init_kwargs = net.init_kwargs
-                init_kwargs['synthesis_kwargs']['num_fp16_res'] = 0
-                init_kwargs['synthesis_kwargs']['conv_clamp'] = None
-                G = Generator(**init_kwargs).eval().requires_grad_(False).to(device).float()
-                G.load_state_dict(net.state_dict())
-
                 img = G.synthesis(w, noise_mode='const')
                 img = (img + 1) * 127.5
                 img = F.interpolate(img, size=(256, 256), mode='area')
@@ -80,7 +74,7 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--target", required=True, help="Path to target image (e.g. JPG)")
     parser.add_argument("--w_candidates", required=True, help="Directory containing .npz files")
-    parser.add_argument("--network", required=True, help="Path to original StyleGAN network .pkl")
+    parser.add_argument("--network", required=True, help="Path to original StyleGAN network .pkl or converted .safetensors")
     parser.add_argument("--outpath", required=True, help="Path to save closest .npz")
     parser.add_argument("--use_mps", action="store_true", help="Use Apple MPS backend")
     args = parser.parse_args()
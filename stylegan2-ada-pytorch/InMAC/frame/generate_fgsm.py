@@ -5,18 +5,9 @@ import PIL.Image
 import torch.nn.functional as F
 from torchvision.transforms import ToTensor
 
-from training.networks import Generator
 import dnnlib
 import legacy
 
-def force_fp32(module):
-    for param in module.parameters():
-        if param.dtype != torch.float32:
-            param.data = param.data.to(torch.float32)
-    for buf in module.buffers():
-        if buf.dtype != torch.float32:
-            buf.data = buf.data.to(torch.float32)
-
 def fgsm_attack(G, w, epsilon, target_img_tensor, vgg16, device):
     w_adv = w.clone().detach().requires_grad_(True)
     synth_img = G.synthesis(w_adv, noise_mode='const')
@@ -53,17 +44,7 @@ def main():
     device = torch.device('mps') if args.use_mps and torch.backends.mps.is_available() else torch.device('cpu')
 
     print(f'Loading network from {args.network}')
-    with dnnlib.util.open_url(args.network) as f:
-        data = legacy.load_network_pkl(f)
-        G_raw = data['G_ema']
-
-    init_kwargs = G_raw.init_kwargs
-    init_kwargs['synthesis_kwargs']['num_fp16_res'] = 0
-    init_kwargs['synthesis_kwargs']['conv_clamp'] = None
-    G = Generator(**init_kwargs).eval().requires_grad_(False).to(device)
-    G.load_state_dict(G_raw.state_dict())
-    G = G.float()
-    force_fp32(G)
+    G = legacy.load_generator(args.network, device)
 
     # Load target image
     target_tensor = load_target_tensor(args.target, G.img_resolution, device)
@@ -3,7 +3,6 @@
 """Project given image to the latent space of pretrained network pickle using W+ latent space on macOS/MPS with float32 conversion from original StyleGAN2-ADA models."""
 
 import sys
-import copy
 import os
 from time import perf_counter
 
@@ -16,22 +15,12 @@ import torch.nn.functional as F
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-import dnnlib
 import legacy
-from training.networks import Generator
-
-def force_fp32(module: torch.nn.Module):
-    for _, param in module.named_parameters(recurse=True):
-        if param.data.dtype != torch.float32:
-            param.data = param.data.to(torch.float32)
-    for _, buf in module.named_buffers(recurse=True):
-        if buf.dtype != torch.float32:
-            buf.data = buf.data.to(torch.float32)
 
 from projector import project  # Use original projector logic with single-vector init
 
 @click.command()
-@click.option('--network', 'network_pkl', help='Original network pickle filename (.pkl)', required=True)
+@click.option('--network', 'network_pkl', help='Original network pickle filename (.pkl) or converted .safetensors file', required=True)
 @click.option('--target', 'target_fname', help='Target image file to project to', required=True, metavar='FILE')
 @click.option('--num-steps', help='Number of optimization steps', type=int, default=1000)
 @click.option('--seed', help='Random seed', type=int, default=300)
@@ -46,18 +35,7 @@ def run_projection(network_pkl, target_fname, outdir, save_video, seed, num_step
 
     device = torch.device('mps') if use_mps and torch.backends.mps.is_available() else torch.device('cpu')
 
-    with dnnlib.util.open_url(network_pkl) as f:
-        data = legacy.load_network_pkl(f)
-        G_raw = data['G_ema']
-
-    init_kwargs = copy.deepcopy(G_raw.init_kwargs)
-    init_kwargs['synthesis_kwargs']['num_fp16_res'] = 0
-    init_kwargs['synthesis_kwargs']['conv_clamp'] = None
-
-    G = Generator(**init_kwargs)
-    G.load_state_dict(G_raw.state_dict())
-    G = G.eval().requires_grad_(False).to(device).float()
-    force_fp32(G)
+    G = legacy.load_generator(network_pkl, device)
 
     target_pil = PIL.Image.open(target_fname).convert('RGB')
     w, h = target_pil.size
@@ -8,7 +8,8 @@ import click
 import cv2
 import copy
 
-from training.networks import Generator
+from training.static_synthesis import StaticSynthesis
+from torch_utils import misc
 import dnnlib
 import legacy
 
@@ -44,8 +45,11 @@ def project(G, target, *, device, num_steps=500, w_init=None, initial_lr=0.05, b
 
     w_out = torch.zeros([num_steps] + list(w_opt.shape[1:]), dtype=torch.float32, device=device)
 
+    # Every step has the same shape, so the noise and activation memory is reused across steps
+    synthesis = StaticSynthesis(G, noise_mode=noise_mode)
+
     for step in range(num_steps):
-        synth_images = G.synthesis(w_opt, noise_mode=noise_mode)
+        synth_images = synthesis(w_opt)
         synth_images_resized = F.interpolate((synth_images + 1) * (255 / 2), size=(256, 256), mode='area')
         synth_features = vgg16(synth_images_resized, resize_images=False, return_lpips=True)
         dist = (target_features - synth_features).square().sum() * lpips_weight
@@ -79,7 +83,7 @@ def project(G, target, *, device, num_steps=500, w_init=None, initial_lr=0.05, b
     return w_out
 
 @click.command()
-@click.option('--network', required=True, help='Network pickle file')
+@click.option('--network', required=True, help='Network pickle file or converted .safetensors file')
 @click.option('--target', required=True, help='Target image file')
 @click.option('--w-init', required=True, help='Initial projected_w.npz path')
 @click.option('--num-steps', default=500, help='Refinement steps')
@@ -91,11 +95,14 @@ def project(G, target, *, device, num_steps=500, w_init=None, initial_lr=0.05, b
 @click.option('--outdir', required=True, help='Output directory')
 @click.option('--use-mps', is_flag=True, help='Use MPS backend')
 @click.option('--save-video', is_flag=True, default=False, help='Save refinement video')
-def run_refine(network, target, w_init, num_steps, initial_lr, betas, lpips_weight, reg_noise_weight, noise_mode, outdir, use_mps, save_video):
+@click.option('--retain-memory', is_flag=True, default=False, help='Keep freed CPU memory in the process instead of returning it to the OS')
+def run_refine(network, target, w_init, num_steps, initial_lr, betas, lpips_weight, reg_noise_weight, noise_mode, outdir, use_mps, save_video, retain_memory):
     device = torch.device('mps') if use_mps and torch.backends.mps.is_available() else torch.device('cpu')
+    if retain_memory and device.type == 'cpu' and not misc.retain_cpu_memory():
+        print('--retain-memory is only supported with glibc, ignored')
 
-    with dnnlib.util.open_url(network) as f:
-        G = legacy.load_network_pkl(f)['G_ema'].eval().to(device)
+    # Constructed from the current source code, which StaticSynthesis requires
+    G = legacy.load_generator(network, device)
 
     target_pil = PIL.Image.open(target).convert('RGB').resize((G.img_resolution, G.img_resolution), PIL.Image.LANCZOS)
     target_tensor = torch.tensor(np.array(target_pil).transpose(2,0,1), dtype=torch.float32, device=device)
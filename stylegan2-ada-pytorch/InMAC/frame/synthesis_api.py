@@ -0,0 +1,190 @@
+
+'''
+실행 방법
+SYNTH_NETWORK=weights/ffhq.safetensors uvicorn InMAC.frame.synthesis_api:app --host 0.0.0.0 --port 8001
+
+환경 변수
+SYNTH_NETWORK      네트워크 .pkl 또는 legacy.py로 변환한 .safetensors
+SYNTH_DEVICE       cuda / mps / cpu (기본값: 사용 가능한 장치)
+SYNTH_DTYPE        float32 / bfloat16 (기본값 float32)
+SYNTH_MAX_BATCH    한 번에 합성할 최대 이미지 수 (기본값 8)
+SYNTH_MAX_WAIT_MS  배치가 요청을 더 기다리는 시간 (기본값 10)
+'''
+
+import io
+import os
+import time
+import queue
+import asyncio
+import threading
+from collections import defaultdict, namedtuple
+from concurrent.futures import Future
+from typing import Optional
+
+import numpy as np
+import PIL.Image
+import torch
+from fastapi import FastAPI, File, Form, UploadFile
+from fastapi.responses import JSONResponse, Response
+
+import legacy
+
+app = FastAPI()
+
+_Request = namedtuple('_Request', ['z', 'c', 'truncation_psi', 'ws', 'noise_mode', 'future'])
+
+
+class SynthesisBatcher:
+    """
+    Coalesces the W and z requests of concurrent callers into batches of up to max_batch images.
+    A batch is started as soon as it is full or max_wait_ms after its first request, runs one
+    G.mapping per truncation value and one G.synthesis per noise mode, and scatters the images back.
+    """
+
+    def __init__(self, G, device, max_batch=8, max_wait_ms=10):
+        self.G = G
+        self.device = device
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.requests = queue.Queue()
+        self.num_batches = 0
+        self.num_images = 0
+        self.worker = threading.Thread(target=self.run, daemon=True)
+        self.worker.start()
+
+    def submit_z(self, z, c=None, truncation_psi=1, noise_mode='const'):
+        """z: [z_dim], c: [c_dim] or None. Returns a Future of the [H, W, C] uint8 image."""
+        future = Future()
+        if c is None:
+            c = torch.zeros([self.G.c_dim])
+        self.requests.put(_Request(z, c, truncation_psi, None, noise_mode, future))
+        return future
+
+    def submit_w(self, ws, noise_mode='const'):
+        """ws: [num_ws, w_dim], e.g. the output of projector.py. Returns a Future of the [H, W, C] uint8 image."""
+        future = Future()
+        self.requests.put(_Request(None, None, None, ws, noise_mode, future))
+        return future
+
+    def collect(self):
+        batch = [self.requests.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self.requests.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return batch
+
+    def synthesize(self, batch):
+        ws = [r.ws for r in batch]
+        by_psi = defaultdict(list)
+        for i, r in enumerate(batch):
+            if r.z is not None:
+                by_psi[r.truncation_psi].append(i)
+        for psi, idx in by_psi.items():
+            z = torch.stack([batch[i].z for i in idx]).to(self.device)
+            c = torch.stack([batch[i].c for i in idx]).to(self.device)
+            for i, w in zip(idx, self.G.mapping(z, c, truncation_psi=psi)):
+                ws[i] = w
+        # Outside of CUDA, batches run faster with one shared-weight convolution than with grouped per-image ones
+        fused_modconv = None if self.device.type == 'cuda' else len(ws) == 1
+        img = self.G.synthesis(torch.stack([w.to(self.device) for w in ws]), noise_mode=batch[0].noise_mode, fused_modconv=fused_modconv)
+        return (img.permute(0, 2, 3, 1) * 127.5 + 128).clamp(0, 255).to(torch.uint8).cpu().numpy()
+
+    def run(self):
+        while True:
+            batch = self.collect()
+            groups = defaultdict(list)
+            for r in batch:
+                groups[r.noise_mode].append(r)
+            for group in groups.values():
+                try:
+                    with torch.inference_mode():
+                        images = self.synthesize(group)
+                    for r, image in zip(group, images):
+                        r.future.set_result(image)
+                except Exception as e:
+                    for r in group:
+                        r.future.set_exception(e)
+            self.num_batches += 1
+            self.num_images += len(batch)
+
+
+def encode_png(image):
+    buf = io.BytesIO()
+    PIL.Image.fromarray(image, 'RGB').save(buf, format='png', compress_level=1)
+    return buf.getvalue()
+
+
+@app.on_event('startup')
+def startup():
+    global batcher
+    if 'SYNTH_DEVICE' in os.environ:
+        device = torch.device(os.environ['SYNTH_DEVICE'])
+    elif torch.cuda.is_available():
+        device = torch.device('cuda')
+    elif getattr(torch.backends, 'mps', None) is not None and torch.backends.mps.is_available():
+        device = torch.device('mps')
+    else:
+        device = torch.device('cpu')
+    network = os.environ.get('SYNTH_NETWORK', 'weights/ffhq.pkl')
+    dtype = getattr(torch, os.environ.get('SYNTH_DTYPE', 'float32'))
+    G = legacy.load_generator(network, device, dtype)
+    print(f'Generator loaded: {network} on {device} in {dtype}')
+
+    # Warm-up so that the first request does not pay for lazy initialization
+    with torch.inference_mode():
+        G.synthesis(torch.zeros([1, G.num_ws, G.w_dim], device=device), noise_mode='const')
+
+    batcher = SynthesisBatcher(G, device, int(os.environ.get('SYNTH_MAX_BATCH', 8)), float(os.environ.get('SYNTH_MAX_WAIT_MS', 10)))
+
+
+@app.post('/synthesize/z')
+async def synthesize_z(
+    seed: int = Form(...),
+    truncation_psi: float = Form(default=1),
+    class_idx: Optional[int] = Form(default=None),
+    noise_mode: str = Form(default='const')
+):
+    G = batcher.G
+    if noise_mode not in ['const', 'random', 'none']:
+        return JSONResponse(status_code=400, content={'error': 'noise_mode must be const, random or none'})
+    c = torch.zeros([G.c_dim])
+    if G.c_dim != 0:
+        if class_idx is None:
+            return JSONResponse(status_code=400, content={'error': 'class_idx is required for a conditional network'})
+        c[class_idx] = 1
+    # Same latent as generate.py for the seed
+    z = torch.from_numpy(np.random.RandomState(seed).randn(G.z_dim)).float()
+    image = await asyncio.wrap_future(batcher.submit_z(z, c, truncation_psi, noise_mode))
+    return Response(content=encode_png(image), media_type='image/png')
+
+
+@app.post('/synthesize/w')
+async def synthesize_w(
+    w: UploadFile = File(...),
+    noise_mode: str = Form(default='const')
+):
+    G = batcher.G
+    if noise_mode not in ['const', 'random', 'none']:
+        return JSONResponse(status_code=400, content={'error': 'noise_mode must be const, random or none'})
+    try:
+        ws = torch.from_numpy(np.load(io.BytesIO(await w.read()))['w']).float().reshape(-1, G.w_dim)
+    except Exception as e:
+        return JSONResponse(status_code=400, content={'error': 'w must be an .npz file with a "w" array', 'details': str(e)})
+    if ws.shape[0] == 1:
+        ws = ws.repeat(G.num_ws, 1)
+    if ws.shape[0] != G.num_ws:
+        return JSONResponse(status_code=400, content={'error': f'w must have 1 or {G.num_ws} vectors of size {G.w_dim}'})
+    image = await asyncio.wrap_future(batcher.submit_w(ws, noise_mode))
+    return Response(content=encode_png(image), media_type='image/png')
+
+
+@app.get('/health')
+def health():
+    mean_batch = batcher.num_images / batcher.num_batches if batcher.num_batches else 0
+    return {'resolution': batcher.G.img_resolution, 'batches': batcher.num_batches, 'images': batcher.num_images, 'mean_batch': mean_batch}
@@ -3,7 +3,6 @@
 """Project given image to the latent space of pretrained network pickle using W+ latent space on macOS/MPS with float32 conversion from original StyleGAN2-ADA models."""
 
 import sys
-import copy
 import os
 from time import perf_counter
 
@@ -18,17 +17,6 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 import dnnlib
 import legacy
-from training.networks import Generator
-
-def force_fp32(module: torch.nn.Module):
-    for name, param in module.named_parameters(recurse=True):
-        if param.data.dtype != torch.float32:
-            print(f"[FIX PARAM] {name} was {param.data.dtype}")
-            param.data = param.data.to(torch.float32)
-    for name, buf in module.named_buffers(recurse=True):
-        if buf.dtype != torch.float32:
-            print(f"[FIX BUFFER] {name} was {buf.dtype}")
-            buf.data = buf.data.to(torch.float32)
 
 def project(
     G,
@@ -52,8 +40,6 @@ def project(
             print(*args)
 
     G = G.eval().requires_grad_(False).to(device)
-    G = G.float()
-    force_fp32(G)
 
     logprint(f'Computing W+ midpoint and stddev using {w_avg_samples} samples...')
     z_samples = np.random.RandomState(123).randn(w_avg_samples, G.z_dim).astype(np.float32)
@@ -144,18 +130,7 @@ def run_projection(network_pkl, target_fname, outdir, save_video, seed, num_step
 
     device = torch.device('mps') if use_mps and torch.backends.mps.is_available() else torch.device('cpu')
 
-    with dnnlib.util.open_url(network_pkl) as f:
-        data = legacy.load_network_pkl(f)
-        G_raw = data['G_ema']
-
-    init_kwargs = copy.deepcopy(G_raw.init_kwargs)
-    init_kwargs['synthesis_kwargs']['num_fp16_res'] = 0
-    init_kwargs['synthesis_kwargs']['conv_clamp'] = None
-
-    G = Generator(**init_kwargs)
-    G.load_state_dict(G_raw.state_dict())
-    G = G.eval().requires_grad_(False).to(device).float()
-    force_fp32(G)
+    G = legacy.load_generator(network_pkl, device)
 
     target_pil = PIL.Image.open(target_fname).convert('RGB')
     w, h = target_pil.size
@@ -0,0 +1,152 @@
+# Copyright (c) 2021, NVIDIA CORPORATION.  All rights reserved.
+#
+# NVIDIA CORPORATION and its licensors retain all intellectual property
+# and proprietary rights in and to this software, related documentation
+# and any modifications thereto.  Any use, reproduction, disclosure or
+# distribution of this software and related documentation without an express
+# license agreement from NVIDIA CORPORATION is strictly prohibited.
+
+"""Check and benchmark the CPU implementations of the custom ops against the reference ones."""
+
+import itertools
+import time
+
+import click
+import torch
+
+from torch_utils.ops import bias_act
+from torch_utils.ops import upfirdn2d
+
+#----------------------------------------------------------------------------
+
+def _compare(fn, inputs, atol):
+    """Max abs difference of 'cpu' vs 'ref' in the output, the input gradients and the second-order gradients."""
+    errors = []
+    results = {}
+    for impl in ['ref', 'cpu']:
+        xs = [x.detach().clone().requires_grad_(x.requires_grad) for x in inputs]
+        y = fn(*xs, impl=impl)
+        dy = (torch.randn_like(y) if impl == 'ref' else results['ref'][1].detach()).requires_grad_(True)
+        grads = torch.autograd.grad(y, xs, dy, create_graph=True)
+        # Second order w.r.t. dy as well, since the gradient penalties differentiate through the incoming gradient.
+        loss = sum((g * g).sum() for g in grads)
+        ggrad = torch.autograd.grad(loss, xs + [dy], allow_unused=True) if loss.requires_grad else []
+        results[impl] = (y, dy, grads, ggrad)
+    ref, cpu = results['ref'], results['cpu']
+    errors.append((ref[0] - cpu[0]).abs().max().item())
+    errors += [(a - b).abs().max().item() for a, b in zip(ref[2], cpu[2])]
+    errors += [(a - b).abs().max().item() for a, b in zip(ref[3], cpu[3]) if a is not None and b is not None]
+    return max(errors) <= atol * max(1, ref[0].abs().max().item()), max(errors)
+
+def check_upfirdn2d(atol=1e-4):
+    filters = {
+        'box':      upfirdn2d.setup_filter([1, 1]),
+        '1331':     upfirdn2d.setup_filter([1, 3, 3, 1]),
+        '1331x2d':  upfirdn2d.setup_filter(torch.tensor([1., 3., 3., 1.]).ger(torch.tensor([1., 2., 1.]))),
+        'random2d': torch.randn([4, 3]),
+        'random1d': torch.randn([5]),
+        'none':     None,
+    }
+    failures = 0
+    for (name, f), up, down, padding, flip in itertools.product(filters.items(), [1, 2, [2, 1]], [1, 2, [1, 2]], [0, 1, [2, 1, 0, 3]], [False, True]):
+        x = torch.randn([2, 3, 9, 8], dtype=torch.float64, requires_grad=True)
+        ff = None if f is None else f.to(torch.float32)
+        fn = lambda x, impl: upfirdn2d.upfirdn2d(x.float(), ff, up=up, down=down, padding=padding, flip_filter=flip, gain=1.5, impl=impl)
+        try:
+            ok, err = _compare(fn, [x], atol)
+        except RuntimeError as e:
+            ok, err = False, str(e)
+        if not ok:
+            failures += 1
+            print(f'  upfirdn2d FAILED: filter={name} up={up} down={down} padding={padding} flip={flip}: {err}')
+    return failures
+
+def check_bias_act(atol=1e-4):
+    failures = 0
+    for act, gain, clamp, dim, has_bias in itertools.product(bias_act.activation_funcs.keys(), [None, 0.5, 2.0], [None, 0.3], [1, 3], [True, False]):
+        x = torch.randn([3, 4, 5, 6], requires_grad=True)
+        inputs = [x] + ([torch.randn([x.shape[dim]], requires_grad=True)] if has_bias else [])
+        fn = lambda x, b=None, impl='ref': bias_act.bias_act(x, b, dim=dim, act=act, gain=gain, clamp=clamp, impl=impl)
+        ok, err = _compare(fn, inputs, atol)
+        if not ok:
+            failures += 1
+            print(f'  bias_act FAILED: act={act} gain={gain} clamp={clamp} dim={dim} bias={has_bias}: {err}')
+    return failures
+
+#----------------------------------------------------------------------------
+
+def _time(fn, backward, iters):
+    """Average wall time of fn() in ms, including the backward pass if requested."""
+    def step():
+        y = fn()
+        if backward:
+            y.backward(torch.ones_like(y))
+    step()
+    start = time.perf_counter()
+    for _ in range(iters):
+        step()
+    return (time.perf_counter() - start) * 1000 / iters
+
+def bench_ops(resolutions, batch, iters, backward):
+    f = upfirdn2d.setup_filter([1, 3, 3, 1])
+    print(f'{"op":<26}{"res":>6}{"ch":>6}{"ref ms":>10}{"cpu ms":>10}{"speedup":>9}')
+    for res in resolutions:
+        # Channel counts of the synthesis network with the default channel_base and channel_max.
+        ch = min(32768 // res, 512)
+        x = torch.randn([batch, ch, res, res], requires_grad=backward)
+        img = torch.randn([batch, 3, res, res], requires_grad=backward)
+        x_up = torch.randn([batch, ch, res * 2 + 1, res * 2 + 1], requires_grad=backward) # transposed 3x3 conv output in conv2d_resample
+        b = torch.randn([ch], requires_grad=backward)
+        cases = {
+            'upsample2d (ToRGB skip)':  lambda impl: upfirdn2d.upsample2d(img, f, impl=impl),
+            'filter2d (conv up)':       lambda impl: upfirdn2d.filter2d(x_up, f, padding=1, gain=4, impl=impl),
+            'downsample2d (D skip)':    lambda impl: upfirdn2d.downsample2d(x, f, impl=impl),
+            'bias_act lrelu clamp':     lambda impl: bias_act.bias_act(x, b, act='lrelu', clamp=256, impl=impl),
+        }
+        for name, fn in cases.items():
+            t_ref = _time(lambda: fn('ref'), backward, iters)
+            t_cpu = _time(lambda: fn('cpu'), backward, iters)
+            print(f'{name:<26}{res:>6}{ch:>6}{t_ref:>10.2f}{t_cpu:>10.2f}{t_ref / t_cpu:>8.2f}x')
+
+#----------------------------------------------------------------------------
+
+@click.command()
+@click.option('--res', 'resolutions', help='Comma separated resolutions to benchmark', default='8,16,32,64,128,256,512,1024', show_default=True)
+@click.option('--batch', type=int, help='Batch size', default=1, show_default=True)
+@click.option('--iters', type=int, help='Timed iterations per op', default=10, show_default=True)
+@click.option('--backward', is_flag=True, help='Include the backward pass in the timings')
+@click.option('--threads', type=int, help='Intra-op CPU threads (default: torch default)')
+@click.option('--skip-check', is_flag=True, help='Only run the benchmark')
+def main(resolutions: str, batch: int, iters: int, backward: bool, threads: int, skip_check: bool):
+    """Check the 'cpu' implementations of upfirdn2d and bias_act against 'ref' and benchmark them per resolution.
+
+    Examples:
+
+    \b
+    # Correctness suite and forward timings
+    python bench_ops.py
+
+    \b
+    # Forward and backward timings, as in a projection step
+    python bench_ops.py --skip-check --backward --res=64,256,1024
+    """
+    torch.manual_seed(0)
+    if threads:
+        torch.set_num_threads(threads)
+
+    if not skip_check:
+        print('Checking outputs and gradients against the reference implementations...')
+        failures = check_upfirdn2d() + check_bias_act()
+        if failures:
+            raise click.ClickException(f'{failures} configurations do not match the reference')
+        print('All configurations match.')
+
+    print(f'Benchmarking on {torch.get_num_threads()} threads, batch {batch}{", with backward" if backward else ""}...')
+    bench_ops([int(r) for r in resolutions.split(',')], batch, iters, backward)
+
+#----------------------------------------------------------------------------
+
+if __name__ == "__main__":
+    main() # pylint: disable=no-value-for-parameter
+
+#----------------------------------------------------------------------------
@@ -17,6 +17,7 @@ import torch
 import dnnlib
 
 import legacy
+from training import dataset
 from metrics import metric_main
 from metrics import metric_utils
 from torch_utils import training_stats
@@ -88,7 +89,7 @@ class CommaSeparatedList(click.ParamType):
 @click.pass_context
 @click.option('network_pkl', '--network', help='Network pickle filename or URL', metavar='PATH', required=True)
 @click.option('--metrics', help='Comma-separated list or "none"', type=CommaSeparatedList(), default='fid50k_full', show_default=True)
-@click.option('--data', help='Dataset to evaluate metrics against (directory or zip) [default: same as training data]', metavar='PATH')
+@click.option('--data', help='Dataset to evaluate metrics against (directory, zip or raw shards) [default: same as training data]', metavar='PATH')
 @click.option('--mirror', help='Whether the dataset was augmented with x-flips during training [default: look up]', type=bool, metavar='BOOL')
 @click.option('--gpus', help='Number of GPUs to use', type=int, default=1, metavar='INT', show_default=True)
 @click.option('--verbose', help='Print optional information', type=bool, default=True, metavar='BOOL', show_default=True)
@@ -148,7 +149,7 @@ def calc_metrics(ctx, network_pkl, metrics, data, mirror, gpus, verbose):
 
     # Initialize dataset options.
     if data is not None:
-        args.dataset_kwargs = dnnlib.EasyDict(class_name='training.dataset.ImageFolderDataset', path=data)
+        args.dataset_kwargs = dnnlib.EasyDict(class_name=dataset.get_dataset_class_name(data), path=data)
     elif network_dict['training_set_kwargs'] is not None:
         args.dataset_kwargs = dnnlib.EasyDict(network_dict['training_set_kwargs'])
     else:
@@ -0,0 +1,77 @@
+# Copyright (c) 2021, NVIDIA CORPORATION.  All rights reserved.
+#
+# NVIDIA CORPORATION and its licensors retain all intellectual property
+# and proprietary rights in and to this software, related documentation
+# and any modifications thereto.  Any use, reproduction, disclosure or
+# distribution of this software and related documentation without an express
+# license agreement from NVIDIA CORPORATION is strictly prohibited.
+
+"""Check StaticSynthesis against G.synthesis on a randomly initialized generator."""
+
+import click
+import torch
+
+from training.networks import Generator
+from training.static_synthesis import StaticSynthesis
+
+#----------------------------------------------------------------------------
+
+def _max_error(G, synthesis, ws_list, **synthesis_kwargs):
+    """Max abs difference of the StaticSynthesis images vs G.synthesis over consecutive calls."""
+    errors = []
+    for ws in ws_list:
+        ref = G.synthesis(ws, **synthesis_kwargs)
+        errors.append((synthesis(ws) - ref).abs().max().item())
+    return max(errors)
+
+def check_static_synthesis(device, res, batch, calls, atol):
+    G = Generator(z_dim=512, c_dim=0, w_dim=512, img_resolution=res, img_channels=3).eval().requires_grad_(False).to(device)
+    # The strengths are initialized to zero, which would hide the noise from the comparison.
+    for name, param in G.synthesis.named_parameters():
+        if name.endswith('noise_strength'):
+            param.copy_(torch.rand([]))
+    ws_list = [torch.randn([batch, G.num_ws, G.w_dim], device=device) for _ in range(calls)]
+
+    failures = 0
+    for name, capture in [('eager', False), ('CUDA graph', True)]:
+        if capture and not (device.type == 'cuda' and hasattr(torch.cuda, 'CUDAGraph')):
+            print(f'  {name}: skipped, needs a CUDA device')
+            continue
+        with torch.no_grad():
+            err = _max_error(G, StaticSynthesis(G, noise_mode='const', capture=capture), ws_list, noise_mode='const')
+        ok = err <= atol
+        failures += not ok
+        print(f'  {name}: {"OK" if ok else "FAILED"}, max error {err:g}')
+    return failures
+
+#----------------------------------------------------------------------------
+
+@click.command()
+@click.option('--device', help='Torch device', default='cuda' if torch.cuda.is_available() else 'cpu', show_default=True)
+@click.option('--res', type=int, help='Generator resolution', default=64, show_default=True)
+@click.option('--batch', type=int, help='Batch size', default=2, show_default=True)
+@click.option('--calls', type=int, help='Consecutive calls to compare', default=3, show_default=True)
+@click.option('--atol', type=float, help='Max abs difference', default=1e-4, show_default=True)
+def main(device: str, res: int, batch: int, calls: int, atol: float):
+    """Check that StaticSynthesis returns the images of G.synthesis with noise_mode='const'.
+
+    The CUDA graph path is only checked on a CUDA device.
+
+    Examples:
+
+    \b
+    python check_static_synthesis.py --res=256
+    """
+    torch.manual_seed(0)
+    print(f'Checking StaticSynthesis on {device}...')
+    failures = check_static_synthesis(torch.device(device), res, batch, calls, atol)
+    if failures:
+        raise click.ClickException(f'{failures} execution modes do not match G.synthesis')
+    print('All execution modes match.')
+
+#----------------------------------------------------------------------------
+
+if __name__ == "__main__":
+    main() # pylint: disable=no-value-for-parameter
+
+#----------------------------------------------------------------------------
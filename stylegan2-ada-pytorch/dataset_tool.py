@@ -6,15 +6,21 @@
 # distribution of this software and related documentation without an express
 # license agreement from NVIDIA CORPORATION is strictly prohibited.
 
+import collections
+import copy
 import functools
 import io
+import itertools
 import json
 import os
 import pickle
 import sys
+import time
 import tarfile
 import gzip
 import zipfile
+import zlib
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from typing import Callable, Optional, Tuple, Union
 
@@ -69,8 +75,7 @@ def open_image_folder(source_dir, *, max_images: Optional[int]):
         for idx, fname in enumerate(input_images):
             arch_fname = os.path.relpath(fname, source_dir)
             arch_fname = arch_fname.replace('\\', '/')
-            img = np.array(PIL.Image.open(fname))
-            yield dict(img=img, label=labels.get(arch_fname))
+            yield dict(path=fname, label=labels.get(arch_fname))
             if idx >= max_idx-1:
                 break
     return max_idx, iterate_images()
@@ -94,20 +99,15 @@ def open_image_zip(source, *, max_images: Optional[int]):
     max_idx = maybe_min(len(input_images), max_images)
 
     def iterate_images():
-        with zipfile.ZipFile(source, mode='r') as z:
-            for idx, fname in enumerate(input_images):
-                with z.open(fname, 'r') as file:
-                    img = PIL.Image.open(file) # type: ignore
-                    img = np.array(img)
-                yield dict(img=img, label=labels.get(fname))
-                if idx >= max_idx-1:
-                    break
+        for idx, fname in enumerate(input_images):
+            yield dict(zip=source, fname=fname, label=labels.get(fname))
+            if idx >= max_idx-1:
+                break
     return max_idx, iterate_images()
 
 #----------------------------------------------------------------------------
 
 def open_lmdb(lmdb_dir: str, *, max_images: Optional[int]):
-    import cv2  # pip install opencv-python
     import lmdb  # pip install lmdb # pylint: disable=import-error
 
     with lmdb.open(lmdb_dir, readonly=True, lock=False).begin(write=False) as txn:
@@ -116,22 +116,27 @@ def open_lmdb(lmdb_dir: str, *, max_images: Optional[int]):
     def iterate_images():
         with lmdb.open(lmdb_dir, readonly=True, lock=False).begin(write=False) as txn:
             for idx, (_key, value) in enumerate(txn.cursor()):
-                try:
-                    try:
-                        img = cv2.imdecode(np.frombuffer(value, dtype=np.uint8), 1)
-                        if img is None:
-                            raise IOError('cv2.imdecode failed')
-                        img = img[:, :, ::-1] # BGR => RGB
-                    except IOError:
-                        img = np.array(PIL.Image.open(io.BytesIO(value)))
-                    yield dict(img=img, label=None)
-                    if idx >= max_idx-1:
-                        break
-                except:
-                    print(sys.exc_info()[1])
+                yield dict(lmdb=bytes(value), label=None)
+                if idx >= max_idx-1:
+                    break
 
     return max_idx, iterate_images()
 
+def decode_lmdb_image(value: bytes) -> Optional[np.ndarray]:
+    import cv2  # pip install opencv-python
+    try:
+        try:
+            img = cv2.imdecode(np.frombuffer(value, dtype=np.uint8), 1)
+            if img is None:
+                raise IOError('cv2.imdecode failed')
+            img = img[:, :, ::-1] # BGR => RGB
+        except IOError:
+            img = np.array(PIL.Image.open(io.BytesIO(value)))
+        return img
+    except:
+        print(sys.exc_info()[1])
+        return None
+
 #----------------------------------------------------------------------------
 
 def open_cifar10(tarball: str, *, max_images: Optional[int]):
@@ -269,16 +274,35 @@ def open_dataset(source, *, max_images: Optional[int]):
 
 #----------------------------------------------------------------------------
 
-def open_dest(dest: str) -> Tuple[str, Callable[[str, Union[bytes, str]], None], Callable[[], None]]:
+def open_dest(dest: str, resume_state: Optional[dict] = None) -> Tuple[str, Callable[[str, Union[bytes, str]], None], Callable[[], None], Callable[[], dict]]:
     dest_ext = file_ext(dest)
 
     if dest_ext == 'zip':
         if os.path.dirname(dest) != '':
             os.makedirs(os.path.dirname(dest), exist_ok=True)
-        zf = zipfile.ZipFile(file=dest, mode='w', compression=zipfile.ZIP_STORED)
+        if resume_state is None:
+            zf = zipfile.ZipFile(file=dest, mode='w', compression=zipfile.ZIP_STORED)
+        else:
+            # Restore the central directory of the checkpoint, which later entries may have overwritten.
+            with open(dest, 'r+b') as f:
+                f.truncate(resume_state['start_dir'])
+                f.seek(resume_state['start_dir'])
+                f.write(resume_state['central_dir'])
+            zf = zipfile.ZipFile(file=dest, mode='a', compression=zipfile.ZIP_STORED)
         def zip_write_bytes(fname: str, data: Union[bytes, str]):
             zf.writestr(fname, data)
-        return '', zip_write_bytes, zf.close
+        def zip_close():
+            zf.close()
+        def zip_checkpoint() -> dict:
+            # Close to write the central directory, then keep appending after the entries.
+            nonlocal zf
+            zf.close()
+            with open(dest, 'rb') as f:
+                f.seek(zf.start_dir)
+                state = dict(start_dir=zf.start_dir, central_dir=f.read())
+            zf = zipfile.ZipFile(file=dest, mode='a', compression=zipfile.ZIP_STORED)
+            return state
+        return '', zip_write_bytes, zip_close, zip_checkpoint
     else:
         # If the output folder already exists, check that is is
         # empty.
@@ -287,7 +311,7 @@ def open_dest(dest: str) -> Tuple[str, Callable[[str, Union[bytes, str]], None],
         # necessary as folder_write_bytes() also mkdirs, but it's better
         # to give an error message earlier in case the dest folder
         # somehow cannot be created.
-        if os.path.isdir(dest) and len(os.listdir(dest)) != 0:
+        if resume_state is None and os.path.isdir(dest) and len(os.listdir(dest)) != 0:
             error('--dest folder must be empty')
         os.makedirs(dest, exist_ok=True)
 
@@ -297,7 +321,136 @@ def open_dest(dest: str) -> Tuple[str, Callable[[str, Union[bytes, str]], None],
                 if isinstance(data, str):
                     data = data.encode('utf8')
                 fout.write(data)
-        return dest, folder_write_bytes, lambda: None
+        return dest, folder_write_bytes, lambda: None, lambda: {} # images after the checkpoint are rewritten
+
+#----------------------------------------------------------------------------
+
+def open_raw_dest(dest: str, resume_state: Optional[dict] = None) -> Tuple[str, Callable[[str, Union[bytes, str]], None], Callable[[str, Tuple], None], Callable[[], None], Callable[[], dict]]:
+    # Sharded raw format read by training.dataset.RawShardDataset: the CHW uint8 pixels of the images
+    # back to back in shard files of about 1 GiB, indexed by shards.json.
+    if resume_state is None and os.path.isdir(dest) and len(os.listdir(dest)) != 0:
+        error('--dest folder must be empty')
+    os.makedirs(dest, exist_ok=True)
+
+    index = dict(shape=None, shard_size=None, fnames=[], crc32=[])
+    shard = None
+    def shard_fname(shard_idx: int) -> str:
+        return os.path.join(dest, f'shard-{shard_idx:05d}.raw')
+
+    if resume_state is not None:
+        # Drop the images written after the checkpoint.
+        index = resume_state['index']
+        shard_idx, shard_offset = divmod(len(index['fnames']), index['shard_size']) if index['shard_size'] else (0, 0)
+        for fname in os.listdir(dest):
+            if fname.startswith('shard-') and int(fname[6:11]) > shard_idx:
+                os.remove(os.path.join(dest, fname))
+        if shard_offset != 0:
+            shard = open(shard_fname(shard_idx), 'r+b')
+            shard.truncate(shard_offset * int(np.prod(index['shape'])))
+            shard.seek(0, os.SEEK_END)
+
+    def save_image(fname: str, encoded: Tuple):
+        nonlocal shard
+        shape, data, crc32 = encoded
+        if index['shape'] is None:
+            index['shape'] = shape
+            index['shard_size'] = max(2**30 // len(data), 1)
+        if len(index['fnames']) % index['shard_size'] == 0:
+            if shard is not None:
+                shard.close()
+            shard = open(shard_fname(len(index['fnames']) // index['shard_size']), 'wb')
+        shard.write(data)
+        index['fnames'].append(fname)
+        index['crc32'].append(crc32)
+
+    def save_bytes(fname: str, data: Union[bytes, str]):
+        with open(fname, 'wb') as fout:
+            fout.write(data.encode('utf8') if isinstance(data, str) else data)
+
+    def close():
+        if shard is not None:
+            shard.close()
+        save_bytes(os.path.join(dest, 'shards.json'), json.dumps(index))
+
+    def checkpoint() -> dict:
+        if shard is not None:
+            shard.flush()
+        return dict(index=copy.deepcopy(index))
+
+    return dest, save_bytes, save_image, close, checkpoint
+
+#----------------------------------------------------------------------------
+# Worker processes: decode, crop/resize and encode the images in parallel.
+
+_worker = dict()
+
+def init_worker(transform: Optional[str], width: Optional[int], height: Optional[int], resize_filter: str, dest_ext: str):
+    PIL.Image.init() # type: ignore
+    _worker['transform_image'] = make_transform(transform, width, height, resize_filter)
+    _worker['encode_image'] = encode_raw_image if dest_ext == 'raw' else encode_png_image
+    _worker['zipfiles'] = dict()
+
+def load_image(image: dict) -> Optional[np.ndarray]:
+    if 'img' in image:
+        return image['img']
+    if 'path' in image:
+        return np.array(PIL.Image.open(image['path']))
+    if 'zip' in image:
+        if image['zip'] not in _worker['zipfiles']:
+            _worker['zipfiles'][image['zip']] = zipfile.ZipFile(image['zip'], mode='r')
+        with _worker['zipfiles'][image['zip']].open(image['fname'], 'r') as file:
+            return np.array(PIL.Image.open(file)) # type: ignore
+    return decode_lmdb_image(image['lmdb'])
+
+def encode_png_image(img: np.ndarray) -> bytes:
+    # Uncompressed PNG.
+    channels = img.shape[2] if img.ndim == 3 else 1
+    img = PIL.Image.fromarray(img, { 1: 'L', 3: 'RGB' }[channels])
+    image_bits = io.BytesIO()
+    img.save(image_bits, format='png', compress_level=0, optimize=False)
+    return image_bits.getvalue()
+
+def encode_raw_image(img: np.ndarray) -> Tuple:
+    img = np.ascontiguousarray(img.transpose(2, 0, 1) if img.ndim == 3 else img[np.newaxis]) # HWC => CHW
+    return list(img.shape), img.tobytes(), zlib.crc32(img.data)
+
+def process_image(image: dict) -> Optional[Tuple[dict, object]]:
+    img = load_image(image)
+    if img is None:
+        return None
+
+    # Apply crop and resize.
+    img = _worker['transform_image'](img)
+
+    # Transform may drop images.
+    if img is None:
+        return None
+
+    channels = img.shape[2] if img.ndim == 3 else 1
+    image_attrs = {
+        'width': img.shape[1],
+        'height': img.shape[0],
+        'channels': channels
+    }
+    return image_attrs, _worker['encode_image'](img)
+
+def process_images(input_iter, workers: int, initargs: tuple):
+    # (image, result of process_image()) in input order, with at most a few images per worker in flight.
+    if workers <= 1:
+        init_worker(*initargs)
+        for image in input_iter:
+            yield image, process_image(image)
+        return
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=initargs) as pool:
+        pending = collections.deque()
+        for image in input_iter:
+            pending.append((image, pool.submit(process_image, image)))
+            if len(pending) >= workers * 4:
+                image, future = pending.popleft()
+                yield image, future.result()
+        while pending:
+            image, future = pending.popleft()
+            yield image, future.result()
 
 #----------------------------------------------------------------------------
 
@@ -310,6 +463,8 @@ def open_dest(dest: str) -> Tuple[str, Callable[[str, Union[bytes, str]], None],
 @click.option('--transform', help='Input crop/resize mode', type=click.Choice(['center-crop', 'center-crop-wide']))
 @click.option('--width', help='Output width', type=int)
 @click.option('--height', help='Output height', type=int)
+@click.option('--workers', help='Processes decoding, transforming and encoding the images', type=int, default=os.cpu_count(), show_default=True)
+@click.option('--checkpoint-interval', help='Seconds between the checkpoints used to resume an interrupted conversion', type=float, default=60, show_default=True)
 def convert_dataset(
     ctx: click.Context,
     source: str,
@@ -318,7 +473,9 @@ def convert_dataset(
     transform: Optional[str],
     resize_filter: str,
     width: Optional[int],
-    height: Optional[int]
+    height: Optional[int],
+    workers: int,
+    checkpoint_interval: float
 ):
     """Convert an image dataset into a dataset archive usable with StyleGAN2 ADA PyTorch.
 
@@ -336,14 +493,21 @@ def convert_dataset(
     \b
     --dest /path/to/dir                 Save output files under /path/to/dir
     --dest /path/to/dataset.zip         Save output files into /path/to/dataset.zip
+    --dest /path/to/dataset.raw         Save raw pixel shards under /path/to/dataset.raw
 
-    The output dataset format can be either an image folder or an uncompressed zip archive.
-    Zip archives makes it easier to move datasets around file servers and clusters, and may
-    offer better training performance on network file systems.
+    The output dataset format can be either an image folder, an uncompressed zip archive or
+    raw pixel shards. Zip archives makes it easier to move datasets around file servers and
+    clusters, and may offer better training performance on network file systems. Raw shards
+    take about as much space as the uncompressed PNGs, but every image is one sequential read
+    that needs no decoding.
 
     Images within the dataset archive will be stored as uncompressed PNG.
     Uncompresed PNGs can be efficiently decoded in the training loop.
 
+    The images are decoded, transformed and encoded by --workers processes, and written
+    in order. An interrupted conversion (e.g. Ctrl-C) is resumed by running the same
+    command again, from the last checkpoint saved in <dest>.resume.pkl.
+
     Class labels are stored in a file called 'dataset.json' that is stored at the
     dataset root folder.  This file has the following structure:
 
@@ -385,58 +549,88 @@ def convert_dataset(
         ctx.fail('--dest output filename or directory must not be an empty string')
 
     num_files, input_iter = open_dataset(source, max_images=max_images)
-    archive_root_dir, save_bytes, close_dest = open_dest(dest)
-
-    transform_image = make_transform(transform, width, height, resize_filter)
-
-    dataset_attrs = None
-
-    labels = []
-    for idx, image in tqdm(enumerate(input_iter), total=num_files):
-        idx_str = f'{idx:08d}'
-        archive_fname = f'{idx_str[:5]}/img{idx_str}.png'
-
-        # Apply crop and resize.
-        img = transform_image(image['img'])
-
-        # Transform may drop images.
-        if img is None:
-            continue
-
-        # Error check to require uniform image attributes across
-        # the whole dataset.
-        channels = img.shape[2] if img.ndim == 3 else 1
-        cur_image_attrs = {
-            'width': img.shape[1],
-            'height': img.shape[0],
-            'channels': channels
-        }
-        if dataset_attrs is None:
-            dataset_attrs = cur_image_attrs
-            width = dataset_attrs['width']
-            height = dataset_attrs['height']
-            if width != height:
-                error(f'Image dimensions after scale and crop are required to be square.  Got {width}x{height}')
-            if dataset_attrs['channels'] not in [1, 3]:
-                error('Input images must be stored as RGB or grayscale')
-            if width != 2 ** int(np.floor(np.log2(width))):
-                error('Image width/height after scale and crop are required to be power-of-two')
-        elif dataset_attrs != cur_image_attrs:
-            err = [f'  dataset {k}/cur image {k}: {dataset_attrs[k]}/{cur_image_attrs[k]}' for k in dataset_attrs.keys()]
-            error(f'Image {archive_fname} attributes must be equal across all images of the dataset.  Got:\n' + '\n'.join(err))
-
-        # Save the image as an uncompressed PNG.
-        img = PIL.Image.fromarray(img, { 1: 'L', 3: 'RGB' }[channels])
-        image_bits = io.BytesIO()
-        img.save(image_bits, format='png', compress_level=0, optimize=False)
-        save_bytes(os.path.join(archive_root_dir, archive_fname), image_bits.getbuffer())
-        labels.append([archive_fname, image['label']] if image['label'] is not None else None)
+    dest_ext = file_ext(dest)
+    make_transform(transform, width, height, resize_filter) # check the options before starting the workers
+    worker_args = (transform, width, height, resize_filter, dest_ext)
+
+    # Resume an interrupted conversion with the same options.
+    resume_fname = dest.rstrip('/\\') + '.resume.pkl'
+    options = dict(source=os.path.abspath(source), max_images=max_images, transform=transform, resize_filter=resize_filter, width=width, height=height)
+    state = None
+    if os.path.isfile(resume_fname):
+        with open(resume_fname, 'rb') as f:
+            state = pickle.load(f)
+        if state['options'] != options:
+            error(f'{resume_fname} is from a conversion with different options, delete it and --dest to start over')
+        print(f'Resuming after {state["num_done"]} of {num_files} images')
+
+    if dest_ext == 'raw':
+        archive_root_dir, save_bytes, save_image, close_dest, checkpoint_dest = open_raw_dest(dest, state['dest'] if state else None)
+    else:
+        archive_root_dir, save_bytes, close_dest, checkpoint_dest = open_dest(dest, state['dest'] if state else None)
+        def save_image(fname: str, image_bits: bytes):
+            save_bytes(os.path.join(archive_root_dir, fname), image_bits)
+
+    num_done = state['num_done'] if state else 0
+    dataset_attrs = state['dataset_attrs'] if state else None
+    labels = state['labels'] if state else []
+
+    def save_checkpoint():
+        temp_fname = resume_fname + '.tmp'
+        with open(temp_fname, 'wb') as f:
+            pickle.dump(dict(options=options, num_done=num_done, dataset_attrs=dataset_attrs, labels=labels, dest=checkpoint_dest()), f)
+        os.replace(temp_fname, resume_fname) # atomic
+
+    # Decode, transform and encode on the workers; check and save the results in order.
+    input_iter = itertools.islice(input_iter, num_done, None)
+    start_time = checkpoint_time = time.time()
+    start_done = num_done
+    try:
+        for idx, (image, result) in tqdm(enumerate(process_images(input_iter, workers, worker_args), start=num_done), initial=num_done, total=num_files, unit='img'):
+            idx_str = f'{idx:08d}'
+            archive_fname = f'{idx_str[:5]}/img{idx_str}.png'
+
+            # Transform may drop images.
+            if result is not None:
+                cur_image_attrs, encoded = result
+
+                # Error check to require uniform image attributes across
+                # the whole dataset.
+                if dataset_attrs is None:
+                    dataset_attrs = cur_image_attrs
+                    width = dataset_attrs['width']
+                    height = dataset_attrs['height']
+                    if width != height:
+                        error(f'Image dimensions after scale and crop are required to be square.  Got {width}x{height}')
+                    if dataset_attrs['channels'] not in [1, 3]:
+                        error('Input images must be stored as RGB or grayscale')
+                    if width != 2 ** int(np.floor(np.log2(width))):
+                        error('Image width/height after scale and crop are required to be power-of-two')
+                elif dataset_attrs != cur_image_attrs:
+                    err = [f'  dataset {k}/cur image {k}: {dataset_attrs[k]}/{cur_image_attrs[k]}' for k in dataset_attrs.keys()]
+                    error(f'Image {archive_fname} attributes must be equal across all images of the dataset.  Got:\n' + '\n'.join(err))
+
+                # Save the image.
+                save_image(archive_fname, encoded)
+                labels.append([archive_fname, image['label']] if image['label'] is not None else None)
+            num_done = idx + 1
+
+            if time.time() - checkpoint_time >= checkpoint_interval:
+                save_checkpoint()
+                checkpoint_time = time.time()
+    except KeyboardInterrupt:
+        save_checkpoint()
+        error(f'Interrupted after {num_done} images, run the same command again to resume')
 
     metadata = {
         'labels': labels if all(x is not None for x in labels) else None
     }
     save_bytes(os.path.join(archive_root_dir, 'dataset.json'), json.dumps(metadata))
     close_dest()
+    if os.path.isfile(resume_fname):
+        os.remove(resume_fname)
+    total_time = time.time() - start_time
+    print(f'Converted {num_done - start_done} images in {total_time:.1f}s ({(num_done - start_done) / max(total_time, 1e-6):.1f} images/s, {workers} workers)')
 
 #----------------------------------------------------------------------------
 
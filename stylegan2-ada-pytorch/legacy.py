@@ -7,13 +7,24 @@
 # license agreement from NVIDIA CORPORATION is strictly prohibited.
 
 import click
+import contextlib
+import json
+import os
 import pickle
 import re
 import copy
+import hashlib
+import struct
 import numpy as np
 import torch
 import dnnlib
 from torch_utils import misc
+from torch_utils import persistence
+
+try:
+    from torch.overrides import TorchFunctionMode
+except ImportError:
+    TorchFunctionMode = None
 
 #----------------------------------------------------------------------------
 
@@ -59,6 +70,173 @@ def load_network_pkl(f, force_fp16=False):
                 data[key] = new
     return data
 
+#----------------------------------------------------------------------------
+# Flat tensor format for inference networks, laid out like safetensors: an
+# 8-byte little-endian header size, a JSON header with the dtype, shape and
+# byte range of every tensor plus the init arguments of the network, and the
+# raw tensor data. Loading memory-maps the file and executes no pickled code,
+# and processes that load the same file share its pages.
+
+_TENSOR_DTYPES = {'F32': torch.float32, 'F16': torch.float16, 'BF16': torch.bfloat16}
+_NUMPY_DTYPES = {'F32': np.float32, 'F16': np.float16, 'BF16': np.int16} # NumPy has no bfloat16.
+
+def convert_generator_fp32(G):
+    """Copy of the generator with FP16 layers and activation clamping disabled, for inference outside of CUDA.
+    The copy is constructed from the current `training.networks` rather than the source code pickled with `G`.
+    """
+    from training import networks # pylint: disable=import-outside-toplevel
+    kwargs = copy.deepcopy(G.init_kwargs)
+    kwargs.synthesis_kwargs = dnnlib.EasyDict(kwargs.get('synthesis_kwargs', {}))
+    kwargs.synthesis_kwargs.num_fp16_res = 0
+    kwargs.synthesis_kwargs.conv_clamp = None
+    with _skip_network_init():
+        new = getattr(networks, type(G).__name__)(*G.init_args, **kwargs).eval().requires_grad_(False)
+    misc.copy_params_and_buffers(G, new, require_all=True)
+    return new
+
+def save_network_tensors(net, path):
+    """Save a network of `training.networks` in the flat tensor format."""
+    assert persistence.is_persistent(net)
+    header = dict()
+    header['__metadata__'] = dict(format='pt', class_name=type(net).__name__,
+        init_args=json.dumps(net.init_args), init_kwargs=json.dumps(net.init_kwargs))
+    tensors = []
+    offset = 0
+    # Store the tensors by decreasing element size, so that every tensor is aligned to its element size
+    # without leaving gaps in the data.
+    named_tensors = sorted(misc.named_params_and_buffers(net), key=lambda item: -item[1].element_size())
+    for name, tensor in named_tensors:
+        tensor = tensor.detach().cpu().contiguous()
+        dtype = {v: k for k, v in _TENSOR_DTYPES.items()}[tensor.dtype]
+        if tensor.dtype == torch.bfloat16:
+            tensor = tensor.view(torch.int16)
+        data = tensor.numpy().tobytes()
+        header[name] = dict(dtype=dtype, shape=list(tensor.shape), data_offsets=[offset, offset + len(data)])
+        tensors.append(data)
+        offset += len(data)
+
+    # Pad the header so that the tensor data is 8-byte aligned, and replace the file atomically.
+    header = json.dumps(header).encode('utf-8')
+    header += b' ' * (-len(header) % 8)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(struct.pack('<Q', len(header)))
+        f.write(header)
+        for data in tensors:
+            f.write(data)
+    os.replace(tmp_path, path)
+
+class _SkipRandomInit(TorchFunctionMode if TorchFunctionMode is not None else object):
+    """Allocate the tensors of torch.randn() without filling them. Torch function modes only apply
+    to the thread that enters them."""
+    def __torch_function__(self, func, types, args=(), kwargs=None):
+        kwargs = dict(kwargs or {})
+        if func is torch.randn:
+            kwargs.pop('generator', None)
+            func = torch.empty
+        return func(*args, **kwargs)
+
+@contextlib.contextmanager
+def _skip_network_init():
+    """Skip the random initialization and the pickleability checks while the current thread constructs
+    networks whose parameters and buffers are all replaced right afterwards. Other threads are not affected.
+    With PyTorch versions that lack torch function modes, the networks are initialized as usual.
+    """
+    with persistence.skip_pickleable_checks():
+        if TorchFunctionMode is None:
+            yield
+        else:
+            with _SkipRandomInit():
+                yield
+
+def load_network_tensors(f, device=None):
+    """Load a network saved by `save_network_tensors()`. The parameters and buffers are copy-on-write
+    views of the memory-mapped file until they are moved to `device`.
+    """
+    from training import networks # pylint: disable=import-outside-toplevel
+    path = dnnlib.util.open_url(f, return_filename=True) if isinstance(f, str) else f.name
+    with open(path, 'rb') as fp:
+        header_size = struct.unpack('<Q', fp.read(8))[0]
+        header = json.loads(fp.read(header_size))
+    meta = header.pop('__metadata__')
+    assert meta['class_name'] in ['Generator', 'MappingNetwork', 'SynthesisNetwork', 'Discriminator']
+    data = np.memmap(path, dtype=np.uint8, mode='c', offset=8 + header_size) if header else None
+
+    # Construct the network without initializing it, then point its tensors to the file.
+    init_args = json.loads(meta['init_args'])
+    init_kwargs = json.loads(meta['init_kwargs'], object_hook=dnnlib.EasyDict)
+    with _skip_network_init():
+        net = getattr(networks, meta['class_name'])(*init_args, **init_kwargs)
+    for name, tensor in misc.named_params_and_buffers(net):
+        info = header[name]
+        begin, end = info['data_offsets']
+        value = torch.from_numpy(data[begin:end].view(_NUMPY_DTYPES[info['dtype']]))
+        value = value.view(_TENSOR_DTYPES[info['dtype']]).reshape(info['shape'])
+        assert value.shape == tensor.shape
+        tensor.data = value
+    net = net.eval().requires_grad_(False)
+    if device is not None:
+        net = net.to(device)
+    return net
+
+def _file_sha256(path):
+    """SHA-256 of the contents of a file. The digest is memoized in the dnnlib cache dir per path, size,
+    mtime and ctime, so that an unchanged file is only read once.
+    """
+    stat = os.stat(path)
+    memo_key = hashlib.md5(repr((os.path.abspath(path), stat.st_size, stat.st_mtime_ns, stat.st_ctime_ns)).encode('utf-8')).hexdigest()
+    memo_file = dnnlib.make_cache_dir_path('generators', 'sha256', memo_key)
+    if os.path.isfile(memo_file):
+        with open(memo_file, 'r') as f:
+            return f.read()
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            sha256.update(chunk)
+    digest = sha256.hexdigest()
+    os.makedirs(os.path.dirname(memo_file), exist_ok=True)
+    tmp_path = f'{memo_file}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w') as f:
+        f.write(digest)
+    os.replace(tmp_path, memo_file)
+    return digest
+
+def load_generator(network, device=None, dtype=torch.float32, cache=True):
+    """Load G_ema of a network pickle or .safetensors file as an inference generator on `device`.
+
+    The generator runs without FP16 layers and activation clamping. With `dtype=torch.bfloat16`, the
+    parameters are stored in BF16 and the synthesis blocks compute in BF16. Conversions are cached as
+    .safetensors files keyed by the SHA-256 of the source file and `dtype`, so that only the first
+    load of a pickle pays for unpickling and converting it, also when the pickle is copied or moved.
+    """
+    assert dtype in [torch.float32, torch.bfloat16]
+    path = dnnlib.util.open_url(network, return_filename=True)
+    if path.endswith('.safetensors') and dtype == torch.float32:
+        G = load_network_tensors(path)
+        if all(tensor.dtype == torch.float32 for tensor in G.parameters()):
+            return G.to(device) if device is not None else G
+
+    # Look up the converted generator.
+    cache_file = None
+    if cache:
+        cache_file = dnnlib.make_cache_dir_path('generators', f'{_file_sha256(path)}-{str(dtype).split(".")[-1]}.safetensors')
+        if os.path.isfile(cache_file):
+            return load_network_tensors(cache_file, device)
+
+    # Convert.
+    if path.endswith('.safetensors'):
+        G = load_network_tensors(path)
+    else:
+        with open(path, 'rb') as f:
+            G = convert_generator_fp32(load_network_pkl(f)['G_ema'])
+    for param in G.parameters():
+        param.data = param.data.to(dtype)
+    if cache_file is None:
+        return G.to(device) if device is not None else G
+    os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+    save_network_tensors(G, cache_file)
+    return load_network_tensors(cache_file, device)
+
 #----------------------------------------------------------------------------
 
 class _TFNetworkStub(dnnlib.EasyDict):
@@ -289,7 +467,7 @@ def convert_tf_discriminator(tf_D):
 
 @click.command()
 @click.option('--source', help='Input pickle', required=True, metavar='PATH')
-@click.option('--dest', help='Output pickle', required=True, metavar='PATH')
+@click.option('--dest', help='Output pickle, or .safetensors file for the FP32 G_ema only', required=True, metavar='PATH')
 @click.option('--force-fp16', help='Force the networks to use FP16', type=bool, default=False, metavar='BOOL', show_default=True)
 def convert_network_pickle(source, dest, force_fp16):
     """Convert legacy network pickle into the native PyTorch format.
@@ -297,19 +475,30 @@ def convert_network_pickle(source, dest, force_fp16):
     The tool is able to load the main network configurations exported using the TensorFlow version of StyleGAN2 or StyleGAN2-ADA.
     It does not support e.g. StyleGAN2-ADA comparison methods, StyleGAN2 configs A-D, or StyleGAN1 networks.
 
-    Example:
+    With a .safetensors destination, only G_ema is kept, converted to FP32 without activation clamping, in a flat
+    tensor file that load_network_tensors() memory-maps without unpickling.
+
+    Examples:
 
     \b
     python legacy.py \\
         --source=https://nvlabs-fi-cdn.nvidia.com/stylegan2/networks/stylegan2-cat-config-f.pkl \\
         --dest=stylegan2-cat-config-f.pkl
+
+    \b
+    python legacy.py \\
+        --source=https://nvlabs-fi-cdn.nvidia.com/stylegan2-ada-pytorch/pretrained/ffhq.pkl \\
+        --dest=ffhq.safetensors
     """
     print(f'Loading "{source}"...')
     with dnnlib.util.open_url(source) as f:
         data = load_network_pkl(f, force_fp16=force_fp16)
     print(f'Saving "{dest}"...')
-    with open(dest, 'wb') as f:
-        pickle.dump(data, f)
+    if dest.endswith('.safetensors'):
+        save_network_tensors(convert_generator_fp32(data['G_ema']), dest)
+    else:
+        with open(dest, 'wb') as f:
+            pickle.dump(data, f)
     print('Done.')
 
 #----------------------------------------------------------------------------
@@ -9,13 +9,20 @@
 import os
 import time
 import hashlib
+import json
 import pickle
 import copy
 import uuid
+import contextlib
 import numpy as np
 import torch
 import dnnlib
 
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
 #----------------------------------------------------------------------------
 
 class MetricOptions:
@@ -132,6 +139,73 @@ class FeatureStats:
 
 #----------------------------------------------------------------------------
 
+class FeatureStore:
+    """Raw features of dataset items keyed on their content (see Dataset.get_item_keys()), for one detector.
+    The features are appended to a memory-mapped float32 file, so that they are computed once per item
+    and shared by all metrics and runs using the same detector. Appends of concurrent processes are
+    serialized with a lock file, and the row of an item never changes once it is in the index."""
+
+    def __init__(self, path):
+        self.path = path
+        self.features_file = os.path.join(path, 'features.bin')
+        self.index_file = os.path.join(path, 'index.json')
+        self.lock_file = os.path.join(path, 'lock')
+        self.num_features = None
+        self.keys = []
+        self._load_index()
+
+    def _load_index(self):
+        if os.path.isfile(self.index_file):
+            with open(self.index_file, 'r') as f:
+                index = json.load(f)
+            self.num_features = index['num_features']
+            self.keys = index['keys']
+        self.rows = {key: row for row, key in enumerate(self.keys)}
+
+    @contextlib.contextmanager
+    def _lock(self):
+        with open(self.lock_file, 'a') as f:
+            if fcntl is not None: # no locking on Windows
+                fcntl.flock(f, fcntl.LOCK_EX)
+            yield # released when the file is closed
+
+    def lookup(self, keys):
+        return np.array([self.rows.get(key, -1) for key in keys], dtype=np.int64) # -1 = missing
+
+    def get_features(self):
+        if len(self.keys) == 0:
+            return np.zeros([0, self.num_features or 0], dtype=np.float32)
+        return np.memmap(self.features_file, dtype=np.float32, mode='r', shape=(len(self.keys), self.num_features))
+
+    def append(self, keys, features):
+        features = np.asarray(features, dtype=np.float32)
+        assert features.ndim == 2 and features.shape[0] == len(keys)
+        os.makedirs(self.path, exist_ok=True)
+        with self._lock():
+            # Pick up the items appended by other processes since the index was loaded, and skip them.
+            self._load_index()
+            new = [i for i, key in enumerate(keys) if key not in self.rows]
+            if len(new) == 0:
+                return
+            keys = [keys[i] for i in new]
+            features = features[new]
+            if self.num_features is None:
+                self.num_features = features.shape[1]
+            assert features.shape[1] == self.num_features
+
+            # Write the features before the index that refers to them, so that an interrupted append is ignored.
+            with open(self.features_file, 'ab') as f:
+                f.truncate(len(self.keys) * self.num_features * 4)
+                f.write(features.tobytes())
+            self.rows.update((key, len(self.keys) + i) for i, key in enumerate(keys))
+            self.keys = self.keys + list(keys)
+            temp_file = self.index_file + '.' + uuid.uuid4().hex
+            with open(temp_file, 'w') as f:
+                json.dump(dict(num_features=self.num_features, keys=self.keys), f)
+            os.replace(temp_file, self.index_file) # atomic
+
+#----------------------------------------------------------------------------
+
 class ProgressMonitor:
     def __init__(self, tag=None, num_items=None, flush_interval=1000, verbose=False, progress_fn=None, pfn_lo=0, pfn_hi=1000, pfn_total=1000):
         self.tag = tag
@@ -181,6 +255,20 @@ def compute_feature_stats_for_dataset(opts, detector_url, detector_kwargs, rel_l
     dataset = dnnlib.util.construct_class_by_name(**opts.dataset_kwargs)
     if data_loader_kwargs is None:
         data_loader_kwargs = dict(pin_memory=True, num_workers=3, prefetch_factor=2)
+    num_items = len(dataset)
+    if max_items is not None:
+        num_items = min(num_items, max_items)
+
+    # Look up the raw features of the items in the feature store of the detector, if the dataset supports it.
+    item_keys = dataset.get_item_keys() if opts.cache else None
+    if item_keys is not None:
+        args = dict(detector_url=detector_url, detector_kwargs=detector_kwargs)
+        md5 = hashlib.md5(repr(sorted(args.items())).encode('utf-8'))
+        store = FeatureStore(dnnlib.make_cache_dir_path('gan-metrics', f'features-{get_feature_detector_name(detector_url)}-{md5.hexdigest()}'))
+        item_keys = item_keys[:num_items]
+        rows = store.lookup(item_keys)
+        return _compute_feature_stats_with_store(opts, dataset, store, item_keys, rows, detector_url, detector_kwargs, rel_lo=rel_lo, rel_hi=rel_hi,
+            batch_size=batch_size, data_loader_kwargs=data_loader_kwargs, **stats_kwargs)
 
     # Try to lookup from cache.
     cache_file = None
@@ -202,16 +290,27 @@ def compute_feature_stats_for_dataset(opts, detector_url, detector_kwargs, rel_l
         if flag:
             return FeatureStats.load(cache_file)
 
-    # Initialize.
-    num_items = len(dataset)
-    if max_items is not None:
-        num_items = min(num_items, max_items)
+    # Compute.
     stats = FeatureStats(max_items=num_items, **stats_kwargs)
-    progress = opts.progress.sub(tag='dataset features', num_items=num_items, rel_lo=rel_lo, rel_hi=rel_hi)
+    _compute_dataset_features(opts, dataset, np.arange(num_items), stats, detector_url, detector_kwargs, rel_lo=rel_lo, rel_hi=rel_hi,
+        batch_size=batch_size, data_loader_kwargs=data_loader_kwargs)
+
+    # Save to cache.
+    if cache_file is not None and opts.rank == 0:
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        temp_file = cache_file + '.' + uuid.uuid4().hex
+        stats.save(temp_file)
+        os.replace(temp_file, cache_file) # atomic
+    return stats
+
+def _compute_dataset_features(opts, dataset, items, stats, detector_url, detector_kwargs, rel_lo, rel_hi, batch_size, data_loader_kwargs):
+    progress = opts.progress.sub(tag='dataset features', num_items=len(items), rel_lo=rel_lo, rel_hi=rel_hi)
+    if len(items) == 0:
+        return
     detector = get_feature_detector(url=detector_url, device=opts.device, num_gpus=opts.num_gpus, rank=opts.rank, verbose=progress.verbose)
 
     # Main loop.
-    item_subset = [(i * opts.num_gpus + opts.rank) % num_items for i in range((num_items - 1) // opts.num_gpus + 1)]
+    item_subset = [int(items[(i * opts.num_gpus + opts.rank) % len(items)]) for i in range((len(items) - 1) // opts.num_gpus + 1)]
     for images, _labels in torch.utils.data.DataLoader(dataset=dataset, sampler=item_subset, batch_size=batch_size, **data_loader_kwargs):
         if images.shape[1] == 1:
             images = images.repeat([1, 3, 1, 1])
@@ -219,12 +318,28 @@ def compute_feature_stats_for_dataset(opts, detector_url, detector_kwargs, rel_l
         stats.append_torch(features, num_gpus=opts.num_gpus, rank=opts.rank)
         progress.update(stats.num_items)
 
-    # Save to cache.
-    if cache_file is not None and opts.rank == 0:
-        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
-        temp_file = cache_file + '.' + uuid.uuid4().hex
-        stats.save(temp_file)
-        os.replace(temp_file, cache_file) # atomic
+def _compute_feature_stats_with_store(opts, dataset, store, item_keys, rows, detector_url, detector_kwargs, rel_lo, rel_hi, batch_size, data_loader_kwargs, chunk_size=4096, **stats_kwargs):
+    # Compute the features of the missing items only, and add them to the store.
+    missing = np.flatnonzero(rows < 0)
+    new_stats = FeatureStats(capture_all=True, max_items=len(missing))
+    _compute_dataset_features(opts, dataset, missing, new_stats, detector_url, detector_kwargs, rel_lo=rel_lo, rel_hi=rel_hi,
+        batch_size=batch_size, data_loader_kwargs=data_loader_kwargs)
+    new_features = new_stats.get_all() if len(missing) > 0 else np.zeros([0, store.num_features], dtype=np.float32)
+    if len(missing) > 0 and opts.rank == 0: # all ranks have all the new features
+        store.append([item_keys[i] for i in missing], new_features)
+
+    # Accumulate the stats in dataset order, reading the stored features in chunks.
+    stored = store.get_features()
+    new_idx = np.full(len(rows), -1, dtype=np.int64)
+    new_idx[missing] = np.arange(len(missing))
+    stats = FeatureStats(max_items=len(rows), **stats_kwargs)
+    for lo in range(0, len(rows), chunk_size):
+        chunk_rows = rows[lo : lo + chunk_size]
+        chunk_new = new_idx[lo : lo + chunk_size]
+        features = np.empty([len(chunk_rows), new_features.shape[1]], dtype=np.float32)
+        features[chunk_rows >= 0] = stored[chunk_rows[chunk_rows >= 0]]
+        features[chunk_new >= 0] = new_features[chunk_new[chunk_new >= 0]]
+        stats.append(features)
     return stats
 
 #----------------------------------------------------------------------------
@@ -11,7 +11,12 @@ Metric for Assessing Generative Models". Matches the original implementation
 by Kynkaanniemi et al. at
 https://github.com/kynkaat/improved-precision-and-recall-metric/blob/master/precision_recall.py"""
 
+import hashlib
+import os
+import uuid
+import numpy as np
 import torch
+import dnnlib
 from . import metric_utils
 
 #----------------------------------------------------------------------------
@@ -31,6 +36,60 @@ def compute_distances(row_features, col_features, num_gpus, rank, col_batch_size
             dist_batches.append(dist_broadcast.cpu() if rank == 0 else None)
     return torch.cat(dist_batches, dim=1)[:, :num_cols] if rank == 0 else None
 
+#----------------------------------------------------------------------------
+# CPU implementation: squared distances as one matrix multiply per block, reduced on the fly
+# so that the full distance matrix is never materialized. The blocks use all intra-op threads.
+
+def _squared_distances(row_features, row_sq, col_features, col_sq):
+    dist = torch.addmm(col_sq.unsqueeze(0), row_features, col_features.t(), alpha=-2)
+    return dist.add_(row_sq.unsqueeze(1)).clamp_min_(0)
+
+def compute_kth_distances_cpu(manifold, nhood_size, row_batch_size, col_batch_size):
+    # Squared distance of every manifold point to its nhood_size-th nearest neighbor, excluding itself.
+    sq = manifold.square().sum(dim=1)
+    kth = []
+    for row_batch, row_sq in zip(manifold.split(row_batch_size), sq.split(row_batch_size)):
+        nearest = None # running nhood_size+1 smallest distances of each row
+        for col_batch, col_sq in zip(manifold.split(col_batch_size), sq.split(col_batch_size)):
+            dist = _squared_distances(row_batch, row_sq, col_batch, col_sq)
+            if nearest is not None:
+                dist = torch.cat([nearest, dist], dim=1)
+            nearest = dist.topk(min(nhood_size + 1, dist.shape[1]), dim=1, largest=False, sorted=False).values
+        kth.append(nearest.max(dim=1).values)
+    return torch.cat(kth)
+
+def compute_in_manifold_cpu(probes, manifold, kth, row_batch_size, col_batch_size):
+    # Whether every probe is within the k-NN radius of any manifold point.
+    probes_sq = probes.square().sum(dim=1)
+    manifold_sq = manifold.square().sum(dim=1)
+    pred = []
+    for row_batch, row_sq in zip(probes.split(row_batch_size), probes_sq.split(row_batch_size)):
+        found = torch.zeros([row_batch.shape[0]], dtype=torch.bool)
+        for col_batch, col_sq, col_kth in zip(manifold.split(col_batch_size), manifold_sq.split(col_batch_size), kth.split(col_batch_size)):
+            rows = (~found).nonzero()[:, 0]
+            if rows.numel() == 0:
+                break
+            dist = _squared_distances(row_batch[rows], row_sq[rows], col_batch, col_sq)
+            found[rows] = (dist <= col_kth.unsqueeze(0)).any(dim=1)
+        pred.append(found)
+    return torch.cat(pred)
+
+def get_real_kth_distances_cpu(opts, real_features, nhood_size, row_batch_size, col_batch_size):
+    # The real manifold is the same for every snapshot, so its radii are cached on the features.
+    cache_file = None
+    if opts.cache:
+        md5 = hashlib.md5(real_features.numpy().tobytes())
+        cache_file = dnnlib.make_cache_dir_path('gan-metrics', f'pr-radii-{md5.hexdigest()}-{nhood_size}.npy')
+        if os.path.isfile(cache_file):
+            return torch.from_numpy(np.load(cache_file))
+    kth = compute_kth_distances_cpu(real_features, nhood_size, row_batch_size, col_batch_size)
+    if cache_file is not None:
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        temp_file = cache_file + '.' + uuid.uuid4().hex + '.npy'
+        np.save(temp_file, kth.numpy())
+        os.replace(temp_file, cache_file) # atomic
+    return kth
+
 #----------------------------------------------------------------------------
 
 def compute_pr(opts, max_real, num_gen, nhood_size, row_batch_size, col_batch_size):
@@ -45,6 +104,16 @@ def compute_pr(opts, max_real, num_gen, nhood_size, row_batch_size, col_batch_si
         opts=opts, detector_url=detector_url, detector_kwargs=detector_kwargs,
         rel_lo=0, rel_hi=1, capture_all=True, max_items=num_gen).get_all_torch().to(torch.float16).to(opts.device)
 
+    # CPU: FP32 features, since FP16 matrix multiplies are slow there.
+    if opts.device.type == 'cpu' and opts.num_gpus == 1:
+        real_features = real_features.to(torch.float32)
+        gen_features = gen_features.to(torch.float32)
+        real_kth = get_real_kth_distances_cpu(opts, real_features, nhood_size, row_batch_size, col_batch_size)
+        gen_kth = compute_kth_distances_cpu(gen_features, nhood_size, row_batch_size, col_batch_size)
+        precision = compute_in_manifold_cpu(gen_features, real_features, real_kth, row_batch_size, col_batch_size)
+        recall = compute_in_manifold_cpu(real_features, gen_features, gen_kth, row_batch_size, col_batch_size)
+        return float(precision.to(torch.float32).mean()), float(recall.to(torch.float32).mean())
+
     results = dict()
     for name, manifold, probes in [('precision', real_features, gen_features), ('recall', gen_features, real_features)]:
         kth = []
@@ -10,21 +10,12 @@ import cv2
 import click
 from time import perf_counter
 
-import dnnlib
 import legacy
 import face_alignment
 
 from torchvision import transforms
 from lpips import LPIPS  # Ensure lpips is installed: pip install lpips
 
-def convert_module_to_float32(module):
-    for name, param in module.named_parameters(recurse=True):
-        if param is not None:
-            param.data = param.data.float()
-    for name, buffer in module.named_buffers(recurse=True):
-        if buffer is not None:
-            buffer.data = buffer.data.float()
-
 def move_module_and_buffers_to_device(module, device):
     module.to(device)
     for name, param in module.named_parameters(recurse=True):
@@ -75,7 +66,6 @@ def project_with_weighted_lpips(
 ):
     assert target.shape[0] == G.img_channels
     G = copy.deepcopy(G).eval().requires_grad_(False).to(device)
-    convert_module_to_float32(G)
     move_module_and_buffers_to_device(G, device)
 
     percept = LPIPS(net='vgg').eval().to(device)
@@ -142,8 +132,7 @@ def run_projection(network_pkl, target_fname, outdir, save_video, seed, num_step
     print('Loading networks from "%s"...' % network_pkl)
     device = torch.device('mps') if torch.backends.mps.is_available() else torch.device('cpu')
 
-    with dnnlib.util.open_url(network_pkl) as fp:
-        G = legacy.load_network_pkl(fp)['G_ema'].requires_grad_(False).to(device)
+    G = legacy.load_generator(network_pkl, device)
 
     target_pil = PIL.Image.open(target_fname).convert('RGB')
     w, h = target_pil.size
@@ -128,8 +128,7 @@ def run_projection(network_pkl, target_fname, outdir, save_video, seed, num_step
     print('Loading networks from "%s"...' % network_pkl)
     device = torch.device('mps') if torch.backends.mps.is_available() else torch.device('cpu')
 
-    with dnnlib.util.open_url(network_pkl) as fp:
-        G = legacy.load_network_pkl(fp)['G_ema'].requires_grad_(False).to(device)
+    G = legacy.load_generator(network_pkl, device)
 
     target_pil = PIL.Image.open(target_fname).convert('RGB')
     w, h = target_pil.size
@@ -165,8 +165,7 @@ def run_projection(
     else torch.device('cpu')
     )
 
-    with dnnlib.util.open_url(network_pkl) as fp:
-        G = legacy.load_network_pkl(fp)['G_ema'].requires_grad_(False).to(device) # type: ignore
+    G = legacy.load_generator(network_pkl, device)
 
     # Load target image.
     target_pil = PIL.Image.open(target_fname).convert('RGB')
@@ -21,6 +21,8 @@ import torch.nn.functional as F
 
 import dnnlib
 import legacy
+import training.networks
+from torch_utils import misc
 
 def project(
     G,
@@ -34,6 +36,8 @@ def project(
     lr_rampup_length           = 0.05,
     noise_ramp_length          = 0.75,
     regularize_noise_weight    = 1e5,
+    coarse_resolution          = 256,   # Synthesize only up to this resolution before the final refinement, None = always full.
+    fine_length                = 0.1,   # Fraction of the steps at the end that synthesize the full resolution.
     verbose                    = False,
     device: torch.device
 ):
@@ -53,6 +57,12 @@ def project(
     w_avg = np.mean(w_samples, axis=0, keepdims=True)      # [1, 1, C]
     w_std = (np.sum((w_samples - w_avg) ** 2) / w_avg_samples) ** 0.5
 
+    # Coarse-to-fine schedule: the blocks above coarse_resolution are skipped until the final refinement.
+    # The truncated image comes from the ToRGB skip of the last block run.
+    if coarse_resolution is None or coarse_resolution >= G.img_resolution or getattr(G.synthesis, f'b{coarse_resolution}').architecture != 'skip':
+        coarse_resolution = G.img_resolution
+    num_coarse_steps = int(num_steps * (1 - fine_length))
+
     # Setup noise inputs.
     noise_bufs = { name: buf for (name, buf) in G.synthesis.named_buffers() if 'noise_const' in name }
 
@@ -90,12 +100,13 @@ def project(
         # Synth images from opt_w.
         w_noise = torch.randn_like(w_opt) * w_noise_scale
         ws = (w_opt + w_noise).repeat([1, G.mapping.num_ws, 1])
-        synth_images = G.synthesis(ws, noise_mode='const')
+        max_resolution = coarse_resolution if step < num_coarse_steps else G.img_resolution
+        synth_images = G.synthesis(ws, noise_mode='const', max_resolution=max_resolution)
 
-        # Downsample image to 256x256 if it's larger than that. VGG was built for 224x224 images.
+        # Resample image to the resolution of the target features, i.e. 256x256 if it's larger than that. VGG was built for 224x224 images.
         synth_images = (synth_images + 1) * (255/2)
-        if synth_images.shape[2] > 256:
-            synth_images = F.interpolate(synth_images, size=(256, 256), mode='area')
+        if synth_images.shape[2] != target_images.shape[2]:
+            synth_images = F.interpolate(synth_images, size=target_images.shape[2:], mode='area')
 
         # Features for synth images.
         synth_features = vgg16(synth_images, resize_images=False, return_lpips=True)
@@ -117,7 +128,7 @@ def project(
         optimizer.zero_grad(set_to_none=True)
         loss.backward()
         optimizer.step()
-        logprint(f'step {step+1:>4d}/{num_steps}: dist {dist:<4.2f} loss {float(loss):<5.2f}')
+        logprint(f'step {step+1:>4d}/{num_steps} ({max_resolution}px): dist {dist:<4.2f} loss {float(loss):<5.2f}')
 
         # Save projected W for each optimization step.
         w_out[step] = w_opt.detach()[0]
@@ -162,7 +173,12 @@ def run_projection(
     print('Loading networks from "%s"...' % network_pkl)
     device = torch.device('cuda')
     with dnnlib.util.open_url(network_pkl) as fp:
-        G = legacy.load_network_pkl(fp)['G_ema'].requires_grad_(False).to(device) # type: ignore
+        G_pkl = legacy.load_network_pkl(fp)['G_ema']
+
+    # Rebuild from the current source code, which supports the coarse-to-fine schedule of project().
+    G = training.networks.Generator(**G_pkl.init_kwargs).eval().requires_grad_(False)
+    misc.copy_params_and_buffers(G_pkl, G, require_all=True)
+    G = G.to(device) # type: ignore
 
     # Load target image.
     target_pil = PIL.Image.open(target_fname).convert('RGB')
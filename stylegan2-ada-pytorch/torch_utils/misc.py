@@ -8,6 +8,8 @@
 
 import re
 import contextlib
+import ctypes
+import sys
 import numpy as np
 import torch
 import warnings
@@ -159,6 +161,26 @@ def copy_params_and_buffers(src_module, dst_module, require_all=False):
         if name in src_tensors:
             tensor.copy_(src_tensors[name].detach()).requires_grad_(tensor.requires_grad)
 
+#----------------------------------------------------------------------------
+# Keep freed CPU memory in the process for reuse. By default, glibc serves
+# large allocations with mmap() and unmaps them when freed, so that repeated
+# forward/backward passes page-fault their activations in again on every call.
+# The setting applies to the whole process and cannot be undone, so it is only
+# meant for dedicated processes such as InMAC/frame/refine.py --retain-memory.
+# Returns False where the allocator cannot be configured (non-glibc systems).
+
+_M_TRIM_THRESHOLD = -1
+_M_MMAP_MAX = -4
+
+def retain_cpu_memory():
+    if not sys.platform.startswith('linux'):
+        return False
+    try:
+        libc = ctypes.CDLL('libc.so.6')
+        return bool(libc.mallopt(_M_MMAP_MAX, 0)) and bool(libc.mallopt(_M_TRIM_THRESHOLD, 2**31 - 1))
+    except (OSError, AttributeError):
+        return False
+
 #----------------------------------------------------------------------------
 # Context manager for easily enabling/disabling DistributedDataParallel
 # synchronization.
@@ -77,15 +77,18 @@ def bias_act(x, b=None, dim=1, act='linear', alpha=None, gain=None, clamp=None,
                 If unsure, consider specifying 1.
         clamp:  Clamp the output values to `[-clamp, +clamp]`, or `None` to disable
                 the clamping (default).
-        impl:   Name of the implementation to use. Can be `"ref"` or `"cuda"` (default).
+        impl:   Name of the implementation to use. Can be `"ref"`, `"cpu"`, or `"cuda"` (default).
+                `"cuda"` selects `"cpu"` on devices other than CUDA, e.g. CPU and MPS.
 
     Returns:
         Tensor of the same shape and datatype as `x`.
     """
     assert isinstance(x, torch.Tensor)
-    assert impl in ['ref', 'cuda']
+    assert impl in ['ref', 'cpu', 'cuda']
     if impl == 'cuda' and x.device.type == 'cuda' and _init():
         return _bias_act_cuda(dim=dim, act=act, alpha=alpha, gain=gain, clamp=clamp).apply(x, b)
+    if impl == 'cpu' or (impl == 'cuda' and x.device.type != 'cuda'):
+        return _bias_act_cpu(x=x, b=b, dim=dim, act=act, alpha=alpha, gain=gain, clamp=clamp)
     return _bias_act_ref(x=x, b=b, dim=dim, act=act, alpha=alpha, gain=gain, clamp=clamp)
 
 #----------------------------------------------------------------------------
@@ -124,6 +127,90 @@ def _bias_act_ref(x, b=None, dim=1, act='linear', alpha=None, gain=None, clamp=N
 
 #----------------------------------------------------------------------------
 
+@misc.profiled_function
+def _bias_act_cpu(x, b=None, dim=1, act='linear', alpha=None, gain=None, clamp=None):
+    """Fast implementation of `bias_act()` using standard PyTorch ops, for devices without the CUDA kernels.
+    """
+    assert isinstance(x, torch.Tensor)
+    assert clamp is None or clamp >= 0
+    spec = activation_funcs[act]
+    alpha = float(alpha if alpha is not None else spec.def_alpha)
+    gain = float(gain if gain is not None else spec.def_gain)
+    clamp = float(clamp if clamp is not None else -1)
+
+    # Only the positively homogeneous activations are fused; the others use the reference.
+    if act not in ['linear', 'relu', 'lrelu'] or gain <= 0:
+        return _bias_act_ref(x=x, b=b, dim=dim, act=act, alpha=alpha, gain=gain, clamp=(clamp if clamp >= 0 else None))
+    if b is not None:
+        assert isinstance(b, torch.Tensor) and b.ndim == 1
+        assert 0 <= dim < x.ndim
+        assert b.shape[0] == x.shape[dim]
+    elif act == 'linear' and gain == 1 and clamp < 0:
+        return x
+    return _bias_act_cpu_op(dim=dim, act=act, alpha=alpha, gain=gain, clamp=clamp).apply(x, b)
+
+#----------------------------------------------------------------------------
+
+_bias_act_cpu_cache = dict()
+
+def _bias_act_cpu_op(dim, act, alpha, gain, clamp):
+    """Bias, activation, gain and clamp evaluated in place on a single output buffer.
+    Since act(v) * gain == act(v * gain) for gain > 0, bias and gain are applied in the same pass.
+    Only the output is saved for the backward pass, which uses the same gradient as the CUDA kernel.
+    """
+    # Lookup from cache.
+    key = (dim, act, alpha, gain, clamp)
+    if key in _bias_act_cpu_cache:
+        return _bias_act_cpu_cache[key]
+
+    class BiasActCpu(torch.autograd.Function):
+        @staticmethod
+        def forward(ctx, x, b): # pylint: disable=arguments-differ
+            if b is not None:
+                b = (b * gain).reshape([-1 if i == dim else 1 for i in range(x.ndim)])
+                y = torch.add(b, x, alpha=gain)
+            else:
+                y = x * gain
+            if act == 'relu':
+                y.relu_()
+            elif act == 'lrelu':
+                torch.nn.functional.leaky_relu_(y, alpha)
+            if clamp >= 0:
+                y.clamp_(-clamp, clamp)
+            ctx.save_for_backward(y)
+            return y
+
+        @staticmethod
+        def backward(ctx, dy): # pylint: disable=arguments-differ
+            y, = ctx.saved_tensors
+            dx = None
+            db = None
+
+            # Masks and slopes from the output, with the same fused kernels as the autograd of the standard ops.
+            # The output is a constant in them, so that the gradient stays differentiable w.r.t. dy.
+            if ctx.needs_input_grad[0] or ctx.needs_input_grad[1]:
+                y = y.detach()
+                dx = dy
+                if clamp >= 0:
+                    dx = torch.ops.aten.hardtanh_backward(dx, y, -clamp, clamp)
+                if act == 'relu':
+                    dx = torch.ops.aten.threshold_backward(dx, y, 0)
+                elif act == 'lrelu':
+                    dx = torch.ops.aten.leaky_relu_backward(dx, y, alpha, True)
+                if gain != 1:
+                    dx = dx * gain
+
+            if ctx.needs_input_grad[1]:
+                db = dx.sum([i for i in range(dx.ndim) if i != dim])
+
+            return dx if ctx.needs_input_grad[0] else None, db
+
+    # Add to cache.
+    _bias_act_cpu_cache[key] = BiasActCpu
+    return BiasActCpu
+
+#----------------------------------------------------------------------------
+
 _bias_act_cuda_cache = dict()
 
 def _bias_act_cuda(dim=1, act='linear', alpha=None, gain=None, clamp=None):
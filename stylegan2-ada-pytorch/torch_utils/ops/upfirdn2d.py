@@ -152,15 +152,18 @@ def upfirdn2d(x, f, up=1, down=1, padding=0, flip_filter=False, gain=1, impl='cu
                      (default: 0).
         flip_filter: False = convolution, True = correlation (default: False).
         gain:        Overall scaling factor for signal magnitude (default: 1).
-        impl:        Implementation to use. Can be `'ref'` or `'cuda'` (default: `'cuda'`).
+        impl:        Implementation to use. Can be `'ref'`, `'cpu'`, or `'cuda'` (default: `'cuda'`).
+                     `'cuda'` selects `'cpu'` on devices other than CUDA, e.g. CPU and MPS.
 
     Returns:
         Tensor of the shape `[batch_size, num_channels, out_height, out_width]`.
     """
     assert isinstance(x, torch.Tensor)
-    assert impl in ['ref', 'cuda']
+    assert impl in ['ref', 'cpu', 'cuda']
     if impl == 'cuda' and x.device.type == 'cuda' and _init():
         return _upfirdn2d_cuda(up=up, down=down, padding=padding, flip_filter=flip_filter, gain=gain).apply(x, f)
+    if impl == 'cpu' or (impl == 'cuda' and x.device.type != 'cuda'):
+        return _upfirdn2d_cpu(x, f, up=up, down=down, padding=padding, flip_filter=flip_filter, gain=gain)
     return _upfirdn2d_ref(x, f, up=up, down=down, padding=padding, flip_filter=flip_filter, gain=gain)
 
 #----------------------------------------------------------------------------
@@ -209,6 +212,70 @@ def _upfirdn2d_ref(x, f, up=1, down=1, padding=0, flip_filter=False, gain=1):
 
 #----------------------------------------------------------------------------
 
+def _upfirdn2d_grouped(x, w, upx, upy, downx, downy, padx0, padx1, pady0, pady1):
+    """Upfirdn of `[N, C, H, W]` with the per-channel convolution (not correlation) kernel `w` of the shape `[C, 1, kh, kw]`.
+    Cropping is done with views, and padding is folded into the convolution where possible.
+    """
+    num_channels, _, kh, kw = w.shape
+    in_height, in_width = x.shape[2:]
+    out_height = (in_height * upy + pady0 + pady1 - kh) // downy + 1
+    out_width = (in_width * upx + padx0 + padx1 - kw) // downx + 1
+
+    if upx == 1 and upy == 1:
+        # Crop, then pad symmetrically inside the strided convolution and skip the excess rows and columns.
+        x = x[:, :, max(-pady0, 0) : in_height - max(-pady1, 0), max(-padx0, 0) : in_width - max(-padx1, 0)]
+        pady0, pady1, padx0, padx1 = max(pady0, 0), max(pady1, 0), max(padx0, 0), max(padx1, 0)
+        py, px = max(pady0, pady1), max(padx0, padx1)
+        if (py - pady0) % downy or (px - padx0) % downx:
+            x = torch.nn.functional.pad(x, [padx0, padx1, pady0, pady1])
+            py = pady0 = px = padx0 = 0
+        x = conv2d_gradfix.conv2d(input=x, weight=w.flip([2, 3]), stride=[downy, downx], padding=[py, px], groups=num_channels)
+        oy, ox = (py - pady0) // downy, (px - padx0) // downx
+        return x[:, :, oy : oy + out_height, ox : ox + out_width]
+
+    # Polyphase upsampling: the strided transposed convolution only evaluates the taps that hit input pixels,
+    # instead of filtering the zero-stuffed image. It yields the full convolution, which is then cropped or padded.
+    x = conv2d_gradfix.conv_transpose2d(input=x, weight=w, stride=[upy, upx], groups=num_channels)
+    sy, sx = kh - 1 - pady0, kw - 1 - padx0
+    ey, ex = sy + (out_height - 1) * downy + 1, sx + (out_width - 1) * downx + 1
+    if sy < 0 or sx < 0 or ey > x.shape[2] or ex > x.shape[3]:
+        x = torch.nn.functional.pad(x, [max(-sx, 0), max(ex - x.shape[3], 0), max(-sy, 0), max(ey - x.shape[2], 0)])
+        sy, sx = max(sy, 0), max(sx, 0)
+    return x[:, :, sy : sy + (out_height - 1) * downy + 1 : downy, sx : sx + (out_width - 1) * downx + 1 : downx]
+
+@misc.profiled_function
+def _upfirdn2d_cpu(x, f, up=1, down=1, padding=0, flip_filter=False, gain=1):
+    """Fast implementation of `upfirdn2d()` using standard PyTorch ops, for devices without the CUDA kernels.
+    Upsampling is fused with the filter, downsampling is a strided convolution, and separable filters
+    are applied as two 1D passes.
+    """
+    # Validate arguments.
+    assert isinstance(x, torch.Tensor) and x.ndim == 4
+    if f is None:
+        f = torch.ones([1, 1], dtype=torch.float32, device=x.device)
+    assert isinstance(f, torch.Tensor) and f.ndim in [1, 2]
+    assert f.dtype == torch.float32 and not f.requires_grad
+    num_channels = x.shape[1]
+    upx, upy = _parse_scaling(up)
+    downx, downy = _parse_scaling(down)
+    padx0, padx1, pady0, pady1 = _parse_padding(padding)
+
+    # Setup filter.
+    f = f * (gain ** (f.ndim / 2))
+    f = f.to(x.dtype)
+    if flip_filter:
+        f = f.flip(list(range(f.ndim)))
+    f = f[np.newaxis, np.newaxis].repeat([num_channels, 1] + [1] * f.ndim)
+
+    # Convolve with the filter.
+    if f.ndim == 4:
+        return _upfirdn2d_grouped(x, f, upx, upy, downx, downy, padx0, padx1, pady0, pady1)
+    x = _upfirdn2d_grouped(x, f.unsqueeze(2), upx, 1, downx, 1, padx0, padx1, 0, 0)
+    x = _upfirdn2d_grouped(x, f.unsqueeze(3), 1, upy, 1, downy, 0, 0, pady0, pady1)
+    return x
+
+#----------------------------------------------------------------------------
+
 _upfirdn2d_cuda_cache = dict()
 
 def _upfirdn2d_cuda(up=1, down=1, padding=0, flip_filter=False, gain=1):
@@ -288,7 +355,7 @@ def filter2d(x, f, padding=0, flip_filter=False, gain=1, impl='cuda'):
                      (default: 0).
         flip_filter: False = convolution, True = correlation (default: False).
         gain:        Overall scaling factor for signal magnitude (default: 1).
-        impl:        Implementation to use. Can be `'ref'` or `'cuda'` (default: `'cuda'`).
+        impl:        Implementation to use. Can be `'ref'`, `'cpu'`, or `'cuda'` (default: `'cuda'`).
 
     Returns:
         Tensor of the shape `[batch_size, num_channels, out_height, out_width]`.
@@ -326,7 +393,7 @@ def upsample2d(x, f, up=2, padding=0, flip_filter=False, gain=1, impl='cuda'):
                      (default: 0).
         flip_filter: False = convolution, True = correlation (default: False).
         gain:        Overall scaling factor for signal magnitude (default: 1).
-        impl:        Implementation to use. Can be `'ref'` or `'cuda'` (default: `'cuda'`).
+        impl:        Implementation to use. Can be `'ref'`, `'cpu'`, or `'cuda'` (default: `'cuda'`).
 
     Returns:
         Tensor of the shape `[batch_size, num_channels, out_height, out_width]`.
@@ -365,7 +432,7 @@ def downsample2d(x, f, down=2, padding=0, flip_filter=False, gain=1, impl='cuda'
                      (default: 0).
         flip_filter: False = convolution, True = correlation (default: False).
         gain:        Overall scaling factor for signal magnitude (default: 1).
-        impl:        Implementation to use. Can be `'ref'` or `'cuda'` (default: `'cuda'`).
+        impl:        Implementation to use. Can be `'ref'`, `'cpu'`, or `'cuda'` (default: `'cuda'`).
 
     Returns:
         Tensor of the shape `[batch_size, num_channels, out_height, out_width]`.
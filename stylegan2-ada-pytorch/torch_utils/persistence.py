@@ -20,6 +20,8 @@ import inspect
 import copy
 import uuid
 import types
+import threading
+import contextlib
 import dnnlib
 
 #----------------------------------------------------------------------------
@@ -29,6 +31,7 @@ _decorators         = set()     # {decorator_class, ...}
 _import_hooks       = []        # [hook_function, ...]
 _module_to_src_dict = dict()    # {module: src, ...}
 _src_to_module_dict = dict()    # {src: module, ...}
+_thread_state       = threading.local() # skip_checks
 
 #----------------------------------------------------------------------------
 
@@ -105,7 +108,8 @@ def persistent_class(orig_class):
             self._init_args = copy.deepcopy(args)
             self._init_kwargs = copy.deepcopy(kwargs)
             assert orig_class.__name__ in orig_module.__dict__
-            _check_pickleable(self.__reduce__())
+            if not getattr(_thread_state, 'skip_checks', False):
+                _check_pickleable(self.__reduce__())
 
         @property
         def init_args(self):
@@ -228,6 +232,22 @@ def _src_to_module(src):
 
 #----------------------------------------------------------------------------
 
+@contextlib.contextmanager
+def skip_pickleable_checks():
+    r"""Context manager that skips the pickleability check of the constructor
+    arguments for persistent objects constructed by the current thread, e.g.
+    when the arguments were already checked before the object was saved.
+    Other threads are not affected.
+    """
+    prev = getattr(_thread_state, 'skip_checks', False)
+    _thread_state.skip_checks = True
+    try:
+        yield
+    finally:
+        _thread_state.skip_checks = prev
+
+#----------------------------------------------------------------------------
+
 def _check_pickleable(obj):
     r"""Check that the given object is pickleable, raising an exception if
     it is not. This function is expected to be considerably more efficient
@@ -70,6 +70,9 @@ class Dataset(torch.utils.data.Dataset):
     def _load_raw_labels(self): # to be overridden by subclass
         raise NotImplementedError
 
+    def _load_raw_keys(self): # to be overridden by subclass
+        return None
+
     def __getstate__(self):
         return dict(self.__dict__, _raw_labels=None)
 
@@ -100,6 +103,14 @@ class Dataset(torch.utils.data.Dataset):
             label = onehot
         return label.copy()
 
+    def get_item_keys(self):
+        # Strings identifying the content of every item, e.g. to cache features computed from it.
+        # None = not supported by the dataset.
+        raw_keys = self._load_raw_keys()
+        if raw_keys is None:
+            return None
+        return [raw_keys[raw_idx] + ('/xflip' if xflip else '') for raw_idx, xflip in zip(self._raw_idx, self._xflip)]
+
     def get_details(self, idx):
         d = dnnlib.EasyDict()
         d.raw_idx = int(self._raw_idx[idx])
@@ -233,4 +244,97 @@ class ImageFolderDataset(Dataset):
         labels = labels.astype({1: np.int64, 2: np.float32}[labels.ndim])
         return labels
 
+    def _load_raw_keys(self):
+        # Zip: size and CRC-32 of the contents. Directory: size and modification time, to avoid reading every file.
+        if self._type == 'zip':
+            infos = [self._get_zipfile().getinfo(fname) for fname in self._image_fnames]
+            return [f'{fname}:{info.file_size}:{info.CRC:08x}' for fname, info in zip(self._image_fnames, infos)]
+        stats = [os.stat(os.path.join(self._path, fname)) for fname in self._image_fnames]
+        return [f'{fname}:{st.st_size}:{st.st_mtime_ns}' for fname, st in zip(self._image_fnames, stats)]
+
+#----------------------------------------------------------------------------
+
+class RawShardDataset(Dataset):
+    # Written by dataset_tool.py --dest=*.raw: the uint8 CHW pixels of the images back to back in shard files,
+    # indexed by shards.json. Every image is one sequential read into a fresh array, with nothing to decode
+    # or copy, which suits network file systems better than small random reads from a zip.
+    def __init__(self,
+        path,                   # Path to the directory containing shards.json.
+        resolution      = None, # Ensure specific resolution, None = highest available.
+        **super_kwargs,         # Additional arguments for the Dataset base class.
+    ):
+        self._path = path
+        self._shard_files = dict()
+        with open(os.path.join(self._path, 'shards.json'), 'r') as f:
+            index = json.load(f)
+        self._image_fnames = index['fnames']
+        self._image_crc32 = index['crc32']
+        self._shard_size = index['shard_size']
+        self._image_nbytes = int(np.prod(index['shape']))
+
+        name = os.path.splitext(os.path.basename(os.path.normpath(self._path)))[0]
+        raw_shape = [len(self._image_fnames)] + list(index['shape'])
+        if resolution is not None and (raw_shape[2] != resolution or raw_shape[3] != resolution):
+            raise IOError('Image files do not match the specified resolution')
+        super().__init__(name=name, raw_shape=raw_shape, **super_kwargs)
+
+    def _get_shard_file(self, shard_idx):
+        if shard_idx not in self._shard_files:
+            self._shard_files[shard_idx] = open(os.path.join(self._path, f'shard-{shard_idx:05d}.raw'), 'rb', buffering=0)
+        return self._shard_files[shard_idx]
+
+    def close(self):
+        try:
+            for f in self._shard_files.values():
+                f.close()
+        finally:
+            self._shard_files = dict()
+
+    def __getstate__(self):
+        return dict(super().__getstate__(), _shard_files=dict())
+
+    def __getitem__(self, idx):
+        image = self._load_raw_image(self._raw_idx[idx]) # not shared, so returned without a copy
+        if self._xflip[idx]:
+            image = image[:, :, ::-1].copy()
+        return image, self.get_label(idx)
+
+    def _load_raw_image(self, raw_idx):
+        shard_idx, shard_offset = divmod(int(raw_idx), self._shard_size)
+        image = np.empty(self._raw_shape[1:], dtype=np.uint8)
+        f = self._get_shard_file(shard_idx)
+        f.seek(shard_offset * self._image_nbytes)
+        buf = memoryview(image).cast('B')
+        while len(buf) > 0: # readinto() may return fewer bytes, e.g. on network filesystems
+            nbytes = f.readinto(buf)
+            if not nbytes:
+                raise IOError(f'Shard {shard_idx} of {self._path} is truncated')
+            buf = buf[nbytes:]
+        return image
+
+    def _load_raw_labels(self):
+        fname = os.path.join(self._path, 'dataset.json')
+        if not os.path.isfile(fname):
+            return None
+        with open(fname, 'r') as f:
+            labels = json.load(f)['labels']
+        if labels is None:
+            return None
+        labels = dict(labels)
+        labels = [labels[fname] for fname in self._image_fnames]
+        labels = np.array(labels)
+        labels = labels.astype({1: np.int64, 2: np.float32}[labels.ndim])
+        return labels
+
+    def _load_raw_keys(self):
+        return [f'{fname}:{self._image_nbytes}:{crc:08x}' for fname, crc in zip(self._image_fnames, self._image_crc32)]
+
+#----------------------------------------------------------------------------
+
+def get_dataset_class_name(path):
+    # Dataset class for the --data option of train.py and calc_metrics.py.
+    if os.path.isfile(os.path.join(path, 'shards.json')):
+        return 'training.dataset.RawShardDataset'
+    return 'training.dataset.ImageFolderDataset'
+
 #----------------------------------------------------------------------------
@@ -282,8 +282,10 @@ class SynthesisLayer(torch.nn.Module):
             self.register_buffer('noise_const', torch.randn([resolution, resolution]))
             self.noise_strength = torch.nn.Parameter(torch.zeros([]))
         self.bias = torch.nn.Parameter(torch.zeros([out_channels]))
+        self.noise_buffer = None
+        self.scaled_noise_buffer = None
 
-    def forward(self, x, w, noise_mode='random', fused_modconv=True, gain=1):
+    def forward(self, x, w, noise_mode='random', fused_modconv=True, gain=1, reuse_noise=False):
         assert noise_mode in ['random', 'const', 'none']
         in_resolution = self.resolution // self.up
         misc.assert_shape(x, [None, self.weight.shape[1], in_resolution, in_resolution])
@@ -291,7 +293,19 @@ class SynthesisLayer(torch.nn.Module):
 
         noise = None
         if self.use_noise and noise_mode == 'random':
-            noise = torch.randn([x.shape[0], 1, self.resolution, self.resolution], device=x.device) * self.noise_strength
+            noise_shape = [x.shape[0], 1, self.resolution, self.resolution]
+            if reuse_noise:
+                # Refill the noise of the previous call in place. Only valid if its backward pass has already run.
+                if self.noise_buffer is None or list(self.noise_buffer.shape) != noise_shape or self.noise_buffer.device != x.device:
+                    self.noise_buffer = torch.empty(noise_shape, device=x.device)
+                    self.scaled_noise_buffer = torch.empty_like(self.noise_buffer)
+                self.noise_buffer.normal_()
+                if torch.is_grad_enabled() and self.noise_strength.requires_grad:
+                    noise = self.noise_buffer * self.noise_strength # out= does not support autograd
+                else:
+                    noise = torch.mul(self.noise_buffer, self.noise_strength, out=self.scaled_noise_buffer)
+            else:
+                noise = torch.randn(noise_shape, device=x.device) * self.noise_strength
         if self.use_noise and noise_mode == 'const':
             noise = self.noise_const * self.noise_strength
 
@@ -380,10 +394,12 @@ class SynthesisBlock(torch.nn.Module):
         misc.assert_shape(ws, [None, self.num_conv + self.num_torgb, self.w_dim])
         w_iter = iter(ws.unbind(dim=1))
         dtype = torch.float16 if self.use_fp16 and not force_fp32 else torch.float32
+        if self.conv1.weight.dtype == torch.bfloat16 and not force_fp32:
+            dtype = torch.bfloat16 # BF16 inference weights, see legacy.load_generator().
         memory_format = torch.channels_last if self.channels_last and not force_fp32 else torch.contiguous_format
         if fused_modconv is None:
             with misc.suppress_tracer_warnings(): # this value will be treated as a constant
-                fused_modconv = (not self.training) and (dtype == torch.float32 or int(x.shape[0]) == 1)
+                fused_modconv = (not self.training) and (dtype != torch.float16 or int(x.shape[0]) == 1)
 
         # Input.
         if self.in_channels == 0:
@@ -454,7 +470,13 @@ class SynthesisNetwork(torch.nn.Module):
                 self.num_ws += block.num_torgb
             setattr(self, f'b{res}', block)
 
-    def forward(self, ws, **block_kwargs):
+    def forward(self, ws, max_resolution=None, **block_kwargs):
+        # max_resolution: Stop after the block of this resolution and return the image of its ToRGB skip
+        # (architecture='skip' only). The ws of the skipped blocks are ignored.
+        if max_resolution is None:
+            max_resolution = self.img_resolution
+        assert max_resolution in self.block_resolutions
+        assert max_resolution == self.img_resolution or getattr(self, f'b{max_resolution}').architecture == 'skip'
         block_ws = []
         with torch.autograd.profiler.record_function('split_ws'):
             misc.assert_shape(ws, [None, self.num_ws, self.w_dim])
@@ -467,6 +489,8 @@ class SynthesisNetwork(torch.nn.Module):
 
         x = img = None
         for res, cur_ws in zip(self.block_resolutions, block_ws):
+            if res > max_resolution:
+                break
             block = getattr(self, f'b{res}')
             x, img = block(x, img, cur_ws, **block_kwargs)
         return img
@@ -0,0 +1,68 @@
+# Copyright (c) 2021, NVIDIA CORPORATION.  All rights reserved.
+#
+# NVIDIA CORPORATION and its licensors retain all intellectual property
+# and proprietary rights in and to this software, related documentation
+# and any modifications thereto.  Any use, reproduction, disclosure or
+# distribution of this software and related documentation without an express
+# license agreement from NVIDIA CORPORATION is strictly prohibited.
+
+"""Execution mode for repeated synthesis calls of a fixed shape, e.g. the
+steps of a projection loop."""
+
+import torch
+from torch_utils import misc
+
+#----------------------------------------------------------------------------
+
+class StaticSynthesis:
+    r"""Calls `G.synthesis()` repeatedly on `ws` of a fixed shape, reusing memory across calls:
+
+    - The noise of `noise_mode='random'` is refilled in place instead of reallocated. It is also
+      scaled into a preallocated buffer, unless the noise strengths require gradients.
+    - On CUDA, calls made without gradients (e.g. under `torch.no_grad()`) are captured once
+      as a CUDA graph and then replayed. The returned image is overwritten by the next call.
+
+    Calls with gradients must run their backward pass before the next call. `G` must be
+    constructed from the current `training.networks`, not unpickled with older source code.
+    On CPU, dedicated processes can also call `misc.retain_cpu_memory()` once at startup, so that
+    the activations of every call are not page-faulted in again.
+    """
+
+    def __init__(self, G, noise_mode='const', capture=True, **synthesis_kwargs):
+        self.G = G
+        self.device = next(G.parameters()).device
+        self.synthesis_kwargs = dict(noise_mode=noise_mode, reuse_noise=True, **synthesis_kwargs)
+        self.capture = capture and self.device.type == 'cuda' and hasattr(torch.cuda, 'CUDAGraph')
+        self.ws_shape = None
+        self.graph = None
+
+    def _capture(self):
+        with torch.inference_mode(False), torch.no_grad():
+            self.static_ws = torch.zeros(self.ws_shape, device=self.device)
+
+            # Warm up on a side stream before capturing, as required by CUDA graphs.
+            stream = torch.cuda.Stream()
+            stream.wait_stream(torch.cuda.current_stream())
+            with torch.cuda.stream(stream):
+                for _ in range(3):
+                    self.G.synthesis(self.static_ws, **self.synthesis_kwargs)
+            torch.cuda.current_stream().wait_stream(stream)
+
+            self.graph = torch.cuda.CUDAGraph()
+            with torch.cuda.graph(self.graph):
+                self.static_img = self.G.synthesis(self.static_ws, **self.synthesis_kwargs)
+
+    def __call__(self, ws):
+        if self.ws_shape is None:
+            self.ws_shape = list(ws.shape)
+        misc.assert_shape(ws, self.ws_shape)
+        if self.capture and not torch.is_grad_enabled():
+            if self.graph is None:
+                self._capture()
+            with torch.inference_mode(False), torch.no_grad():
+                self.static_ws.copy_(ws)
+                self.graph.replay()
+            return self.static_img
+        return self.G.synthesis(ws, **self.synthesis_kwargs)
+
+#----------------------------------------------------------------------------